@@ -0,0 +1,60 @@
+"""
+Measures per-call latency of a backend with a fresh SDK client per call versus the cached client.
+
+Runs against the local stub server, so the numbers are client and connection overhead only.
+
+    python -m benchmarking.client_reuse_latency --calls 200
+"""
+import argparse
+import statistics
+import time
+
+from benchmarking.stub_server import StubServer
+from src.agent.backend.groq_backend import GroqBackend
+
+MESSAGES = [
+    {"role": "system", "content": "You are an agent in a gridworld."},
+    {"role": "user", "content": "Your current position is (0, 0)."},
+]
+
+
+def time_calls(get_client, model: str, calls: int) -> list:
+    latencies = []
+    for _ in range(calls):
+        start = time.perf_counter()
+        get_client().chat.completions.create(messages=MESSAGES, model=model, temperature=0.9)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+def summarize(name: str, latencies: list):
+    latencies = sorted(latencies)
+    p95 = latencies[int(len(latencies) * 0.95) - 1]
+    print(f"{name:>14}: mean {statistics.mean(latencies):7.2f} ms | p50 {statistics.median(latencies):7.2f} ms "
+          f"| p95 {p95:7.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare fresh and cached SDK clients against a local stub.")
+    parser.add_argument("--calls", type=int, default=100, help="Number of calls per mode.")
+    args = parser.parse_args()
+
+    with StubServer() as server:
+        backend = GroqBackend(base_url=server.url)
+        api_key = "stub-key"
+
+        fresh = time_calls(lambda: backend._create_client(api_key), backend.model, args.calls)
+        fresh_connections = len(server.connections)
+
+        server.connections.clear()
+        cached = time_calls(lambda: backend._get_client(api_key), backend.model, args.calls)
+        cached_connections = len(server.connections)
+
+        summarize("fresh client", fresh)
+        summarize("cached client", cached)
+        print(f"TCP connections opened: fresh {fresh_connections}, cached {cached_connections}")
+        GroqBackend.close_clients()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Cost of computing the local view of every agent each episode (ComplexGridworld.observe_all) as the number of agents and
+the grid size grow, against a brute-force scan comparing every agent with every agent and item.
+
+    python -m benchmarking.field_of_view --radius 5 --repeat 3
+"""
+from typing import Dict, List
+import argparse
+import time
+
+import numpy as np
+
+from src.agent.actions import Action
+from src.environments.custom_environments.complex_gridworld_environment import ComplexGridworld, Item
+
+
+class BenchmarkAgent:
+    """The attributes of an Agent that ComplexGridworld reads, without a backend."""
+
+    def __init__(self, agent_id: int, position):
+        self.id = agent_id
+        self.name = f"Agent{agent_id}"
+        self.position = position
+        self.action_space = [Action(name="north")]
+        self.action_names = frozenset(["north"])
+        self.variables = {}
+        self.item = None
+
+
+def build_env(grid_size: int, n_agents: int, obstacle_density: float, seed: int = 0) -> ComplexGridworld:
+    """A square grid with n_agents agents and as many items at random positions, sparse above 256 squares a side."""
+    rng = np.random.default_rng(seed)
+    agent_positions = rng.integers(0, grid_size, size=(n_agents, 2)).tolist()
+    agents = {i: BenchmarkAgent(i, tuple(position)) for i, position in enumerate(agent_positions)}
+    item_positions = {tuple(position) for position in rng.integers(0, grid_size, size=(n_agents, 2)).tolist()}
+
+    occupied = {tuple(position) for position in agent_positions} | item_positions
+    n_obstacles = int(grid_size * grid_size * obstacle_density)
+    obstacles = {tuple(position) for position in rng.integers(0, grid_size, size=(n_obstacles, 2)).tolist()}
+    return ComplexGridworld(
+        grid_size=(grid_size, grid_size),
+        agents=agents,
+        obstacles=list(obstacles - occupied),
+        items={position: [Item("item", (200, 0, 0), "triangle")] for position in item_positions},
+        sparse=grid_size > 256
+    )
+
+
+def brute_force(env: ComplexGridworld, radius: int) -> Dict[int, List]:
+    """Every agent compared with every agent and item, the cost observe_all avoids."""
+    views = {}
+    agent_positions, item_positions = env.agent_positions, env.item_positions
+    for row, agent_id in enumerate(env.agent_ids):
+        near_agents = (np.abs(agent_positions - agent_positions[row]).max(axis=1) <= radius).nonzero()[0]
+        near_items = (np.abs(item_positions - agent_positions[row]).max(axis=1) <= radius).nonzero()[0]
+        views[agent_id] = [near_agents, near_items]
+    return views
+
+
+def milliseconds(function, repeat: int) -> float:
+    """Best of `repeat` calls."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best * 1e3
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cost of observe_all as agents and grid size scale.")
+    parser.add_argument("--radius", type=int, default=5, help="Field of view radius in squares.")
+    parser.add_argument("--repeat", type=int, default=3, help="Calls per measurement, the best is kept.")
+    parser.add_argument("--obstacles", type=float, default=0.05, help="Fraction of the squares that are obstacles.")
+    parser.add_argument("--grid-sizes", type=int, nargs="+", default=[64, 256, 1024])
+    parser.add_argument("--agents", type=int, nargs="+", default=[16, 128, 1024])
+    args = parser.parse_args()
+
+    print(f"radius {args.radius}, {args.obstacles:.0%} obstacles, ms per episode for all agents")
+    print(f"{'grid':>6} {'agents':>7} {'observe_all':>12} {'+ sight':>9} {'brute force':>12}")
+    for grid_size in args.grid_sizes:
+        for n_agents in args.agents:
+            env = build_env(grid_size, n_agents, args.obstacles)
+            indexed = milliseconds(lambda: env.observe_all(args.radius), args.repeat)
+            sight = milliseconds(lambda: env.observe_all(args.radius, line_of_sight=True), args.repeat)
+            scan = milliseconds(lambda: brute_force(env, args.radius), args.repeat)
+            print(f"{grid_size:>6} {n_agents:>7} {indexed:>12.2f} {sight:>9.2f} {scan:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
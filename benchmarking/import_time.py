@@ -0,0 +1,111 @@
+"""
+Measures the import time of the main entry points with `python -X importtime` and checks it against a budget.
+
+Each entry point is imported in a fresh interpreter, several times, and the median is reported along with the
+slowest modules it pulled in. Heavy optional dependencies (provider SDKs, pandas, the GUI) must not be imported
+by any entry point, they are loaded when a provider, a result table or the GUI is actually used.
+
+    python -m benchmarking.import_time --runs 5
+"""
+from typing import Dict, List, Tuple
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+# Budget of each entry point's import, in milliseconds
+IMPORT_BUDGETS_MS = {
+    "run_benchmark": 400,
+    "main": 400,
+    "src.envwrapper.simulator": 350,
+    "src.agent.base_agent": 200,
+}
+
+# Modules only imported on demand
+LAZY_MODULES = ("groq", "together", "openai", "cohere", "pandas", "dearpygui")
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)\s*$")
+
+
+def parse_importtime(output: str) -> List[Tuple[str, int, int, int]]:
+    """
+    Parses the report written to stderr by `python -X importtime`.
+
+    :param output: The stderr of the interpreter.
+    :return: (module, self time in us, cumulative time in us, nesting depth) per imported module, in report order.
+    """
+    modules = []
+    for line in output.splitlines():
+        match = _LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            modules.append((name, int(self_us), int(cumulative_us), (len(indent) - 1) // 2))
+    return modules
+
+
+def measure_import(module: str, python: str = sys.executable) -> List[Tuple[str, int, int, int]]:
+    """Imports a module in a fresh interpreter and returns its parsed importtime report."""
+    result = subprocess.run(
+        [python, "-X", "importtime", "-c", f"import {module}"],
+        cwd=PROJECT_ROOT,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{result.stderr}")
+    return parse_importtime(result.stderr)
+
+
+def total_import_ms(report: List[Tuple[str, int, int, int]]) -> float:
+    """Time spent in the top level imports of a report, in milliseconds."""
+    return sum(cumulative for _, _, cumulative, depth in report if depth == 0) / 1000
+
+
+def lazy_modules_imported(report: List[Tuple[str, int, int, int]]) -> List[str]:
+    """The modules of LAZY_MODULES an import pulled in."""
+    imported = {name.split(".")[0] for name, _, _, _ in report}
+    return [module for module in LAZY_MODULES if module in imported]
+
+
+def check_entry_points(budgets: Dict[str, float], runs: int = 3, top: int = 5) -> bool:
+    """
+    Measures every entry point and prints a report.
+
+    :param budgets: Import budget in milliseconds by module.
+    :param runs: Fresh interpreters per entry point, the median is compared to the budget.
+    :param top: Number of slowest third party / project modules to list per entry point.
+    :return: Whether every entry point is within its budget and imports no lazy module.
+    """
+    ok = True
+    for module, budget in budgets.items():
+        reports = [measure_import(module) for _ in range(runs)]
+        median = statistics.median(total_import_ms(report) for report in reports)
+        eager = lazy_modules_imported(reports[0])
+        within = median <= budget and not eager
+        ok = ok and within
+
+        print(f"{module:>26}: {median:7.1f} ms (budget {budget} ms) {'OK' if within else 'OVER'}")
+        if eager:
+            print(f"{'':>28}imports {', '.join(eager)} eagerly")
+        slowest = sorted((r for r in reports[0] if r[3] <= 1 and r[0] != module), key=lambda r: -r[2])[:top]
+        for name, _, cumulative, _ in slowest:
+            print(f"{'':>28}{name:<40} {cumulative / 1000:7.1f} ms")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the import time of the entry points against a budget.")
+    parser.add_argument("--runs", type=int, default=3, help="Fresh interpreters per entry point.")
+    parser.add_argument("--scale", type=float, default=1.0, help="Multiply every budget, for slower machines.")
+    args = parser.parse_args()
+
+    budgets = {module: budget * args.scale for module, budget in IMPORT_BUDGETS_MS.items()}
+    sys.exit(0 if check_entry_points(budgets, runs=args.runs) else 1)
+
+
+if __name__ == "__main__":
+    main()
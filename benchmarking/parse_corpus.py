@@ -0,0 +1,112 @@
+"""
+Compares the action parsers on the assistant messages stored in raw_data/*.db: parse rate (an action_name could be
+read) and microseconds per parse.
+
+    python -m benchmarking.parse_corpus --repeat 5
+"""
+from typing import Callable, Dict, List
+import argparse
+import ast
+import glob
+import json
+import os
+import re
+import sqlite3
+import time
+
+from src.utils.output_parsing import ActionDecision, extract_json_from_string, parse_json_object
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def legacy_extract_json_from_string(s: str) -> Dict:
+    """extract_json_from_string as it was before the tolerant parser: literal_eval, quote replace, regex."""
+    start_idx = s.find('{')
+    end_idx = s.rfind('}')
+
+    if start_idx == -1 or end_idx == -1:
+        raise ValueError(f"String does not contain valid brackets: {s}")
+
+    s = s[start_idx:end_idx + 1].strip()
+
+    try:
+        return ast.literal_eval(s)
+    except Exception:
+        pass
+
+    try:
+        return json.loads(s.replace("'", '"'))
+    except Exception:
+        pass
+
+    pattern = r"['\"]?(\w+)['\"]?\s*:\s*['\"]?([^,'\"{}]+)['\"]?"
+    return {match[0]: match[1] for match in re.findall(pattern, s)}
+
+
+PARSERS: Dict[str, Callable[[str], Dict]] = {
+    "legacy": legacy_extract_json_from_string,
+    "parse_json_object": parse_json_object,
+    "extract_json_from_string": extract_json_from_string,
+    "ActionDecision": lambda text: {"action_name": ActionDecision.from_response(text).action_name},
+}
+
+
+def load_corpus(pattern: str = os.path.join(PROJECT_ROOT, "raw_data", "*.db")) -> List[str]:
+    """The assistant messages of every simulation database matching the pattern."""
+    corpus = []
+    for db_file in sorted(glob.glob(pattern)):
+        connection = sqlite3.connect(db_file)
+        try:
+            corpus += [row[0] for row in connection.execute("SELECT content FROM episodes WHERE role = 'assistant'")]
+        finally:
+            connection.close()
+    return corpus
+
+
+def parse_rate(parser: Callable[[str], Dict], corpus: List[str]) -> float:
+    """Fraction of the messages an action name is parsed from."""
+    parsed = 0
+    for text in corpus:
+        try:
+            action_name = parser(text).get("action_name")
+        except Exception:
+            continue
+        if action_name and action_name != "invalid":
+            parsed += 1
+    return parsed / len(corpus)
+
+
+def microseconds_per_parse(parser: Callable[[str], Dict], corpus: List[str], repeat: int = 3) -> float:
+    """Best of `repeat` runs over the corpus, per message."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for text in corpus:
+            try:
+                parser(text)
+            except Exception:
+                pass
+        best = min(best, time.perf_counter() - start)
+    return best / len(corpus) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Parse rate and speed of the action parsers on recorded responses.")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs over the corpus per parser, the best is kept.")
+    parser.add_argument("--pattern", type=str, default=os.path.join(PROJECT_ROOT, "raw_data", "*.db"),
+                        help="Glob of the simulation databases.")
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.pattern)
+    if not corpus:
+        print(f"No assistant messages found in {args.pattern}")
+        return
+
+    print(f"{len(corpus)} assistant messages")
+    for name, function in PARSERS.items():
+        print(f"{name:>26}: parse rate {parse_rate(function, corpus):7.2%} | "
+              f"{microseconds_per_parse(function, corpus, args.repeat):8.1f} us/parse")
+
+
+if __name__ == "__main__":
+    main()
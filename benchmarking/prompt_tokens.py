@@ -0,0 +1,83 @@
+"""
+Reports the prompt tokens of each config: per section of the system prompt, per prompt variable, and the system
+and first user message, with and without prompt minification.
+
+The system message is resent with every call (Backend._truncate_messages always keeps it), so its size is paid on
+every turn of every agent. No API calls are made.
+
+    python -m benchmarking.prompt_tokens
+    python -m benchmarking.prompt_tokens --config multi_agent_navigation --sections
+"""
+from typing import Dict
+import argparse
+import copy
+import random
+
+from src.agent.backend import GroqModels, Provider
+from src.agent.prompts import count_tokens, section_token_counts, variable_token_counts
+from src.environments.DEFAULT_CONFIGS import DEFAULT_CONFIGS
+from src.envwrapper.simulator import Simulator, start_simulation
+
+
+def first_turn(config_key: str, minify_prompts: bool, seed: int = 0):
+    """Loads a config and renders the first user message of its first agent."""
+    random.seed(seed)
+    simulator = Simulator(
+        use_db=False,
+        use_gui=False,
+        backend_provider=Provider.GROQ,
+        backend_model=GroqModels.LLAMA_8B,
+        configs=copy.deepcopy(DEFAULT_CONFIGS),
+        minify_prompts=minify_prompts,
+    )
+    env = simulator.load_environment_config(config_key)
+    start_simulation(env)
+    agent = next(iter(env.agents.values()))
+    agent._prepare_step()
+    return agent
+
+
+def prompt_tokens(config_key: str, minify_prompts: bool = False, seed: int = 0) -> Dict:
+    """
+    Token accounting of a config's prompts.
+
+    :return: Tokens of the system and first user message, and per section and variable of the system prompt.
+    """
+    agent = first_turn(config_key, minify_prompts, seed)
+    system, user = agent.messages[0]["content"], agent.messages[1]["content"]
+    sections = section_token_counts(agent.system_prompt)
+    sections["output instructions"] = count_tokens(system) - count_tokens(str(agent.system_prompt))
+    return {
+        "system": count_tokens(system),
+        "user": count_tokens(user),
+        "sections": sections,
+        "system_variables": variable_token_counts(agent.system_prompt),
+        "user_variables": variable_token_counts(agent.user_prompt),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Token accounting of the prompts of each config.")
+    parser.add_argument("--config", type=str, default=None, help="Only report this config.")
+    parser.add_argument("--sections", action="store_true", help="Also list the tokens per section and variable.")
+    args = parser.parse_args()
+
+    config_keys = [args.config] if args.config else list(DEFAULT_CONFIGS)
+    print(f"{'config':>38} | {'system':>13} | {'user':>13} | per turn saved")
+    for config_key in config_keys:
+        full = prompt_tokens(config_key)
+        minified = prompt_tokens(config_key, minify_prompts=True)
+        per_turn = full["system"] + full["user"]
+        saved = per_turn - minified["system"] - minified["user"]
+        print(f"{config_key:>38} | {full['system']:>5} -> {minified['system']:>5} | "
+              f"{full['user']:>5} -> {minified['user']:>5} | {saved:>5} ({saved / per_turn:.0%})")
+
+        if args.sections:
+            for name, counts in (("section", "sections"), ("system variable", "system_variables"),
+                                 ("user variable", "user_variables")):
+                for key, tokens in full[counts].items():
+                    print(f"{'':>40}{name} {key:<26} {tokens:>5} -> {minified[counts].get(key, 0):>5}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,324 @@
+"""
+A local stand-in for an OpenAI-compatible chat completions API, including the files and batches endpoints.
+
+Used to measure backend overhead and to test backend behaviour without calling a real provider.
+"""
+import json
+import threading
+import time
+from email.parser import BytesParser
+from email.policy import default
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_CONTENT = (
+    '{"reflection": "", "rationale": "", "action_name": "skip", '
+    '"action_parameters": {}, "message": "", "add_memory": ""}'
+)
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep connections alive between requests
+    wbufsize = -1  # send headers and body in one write, avoids delayed-ACK stalls on keep-alive connections
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status: int, payload: dict, headers: dict = None):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_json(self) -> dict:
+        length = int(self.headers.get("Content-Length", 0))
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def do_POST(self):
+        server = self.server
+        if self.path.endswith("/files"):
+            self._create_file()
+            return
+        if self.path.endswith("/batches"):
+            self._create_batch()
+            return
+
+        request = self._read_json()
+        with server.lock:
+            server.requests.append(request)
+            server.connections.add(self.client_address)
+
+        if not self.path.endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+            return
+
+        with server.lock:
+            server.in_flight += 1
+            overloaded = (
+                len(server.requests) <= server.fail_first
+                or (server.max_concurrent is not None and server.in_flight > server.max_concurrent)
+            )
+        try:
+            if overloaded:
+                self._send_rate_limited()
+            else:
+                self._send_completion(request)
+        finally:
+            with server.lock:
+                server.in_flight -= 1
+
+    def _send_rate_limited(self):
+        server = self.server
+        with server.lock:
+            server.rejected += 1
+        self._send_json(429, {"error": {
+            "message": f"Rate limit reached. Please try again in {server.retry_after}s.",
+            "type": "requests",
+            "code": "rate_limit_exceeded",
+        }}, headers={
+            "retry-after": str(server.retry_after),
+            "x-ratelimit-remaining-requests": "0",
+            "x-ratelimit-reset-requests": f"{server.retry_after}s",
+        })
+
+    def _send_completion(self, request: dict):
+        server = self.server
+        if server.latency:
+            time.sleep(server.latency)
+
+        if request.get("stream"):
+            self._send_stream(request)
+            return
+
+        self._send_json(200, self._completion_payload(request),
+                        headers={"x-ratelimit-remaining-requests": "100", "x-ratelimit-reset-requests": "1s"})
+
+    def _completion_payload(self, request: dict) -> dict:
+        server = self.server
+        content = server.content
+        return {
+            "id": f"chatcmpl-{len(server.requests)}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "stub"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
+            }],
+            "usage": {
+                "prompt_tokens": sum(len(m.get("content", "")) // 4 for m in request.get("messages", [])),
+                "completion_tokens": len(content) // 4,
+                "total_tokens": 0,
+            },
+        }
+
+    def _send_stream(self, request: dict):
+        """Send the content as server-sent events, `chunk_size` characters per chunk."""
+        server = self.server
+        content = server.content
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        def send_event(data: str):
+            event = f"data: {data}\n\n".encode("utf-8")
+            self.wfile.write(f"{len(event):x}\r\n".encode("ascii") + event + b"\r\n")
+            self.wfile.flush()
+
+        try:
+            for start in range(0, len(content), server.chunk_size):
+                if server.chunk_delay:
+                    time.sleep(server.chunk_delay)
+                send_event(json.dumps({
+                    "id": f"chatcmpl-{len(server.requests)}",
+                    "object": "chat.completion.chunk",
+                    "created": int(time.time()),
+                    "model": request.get("model", "stub"),
+                    "choices": [{
+                        "index": 0,
+                        "delta": {"content": content[start:start + server.chunk_size]},
+                        "finish_reason": None,
+                    }],
+                }))
+            send_event("[DONE]")
+            self.wfile.write(b"0\r\n\r\n")
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            with server.lock:
+                server.aborted_streams += 1
+            self.close_connection = True
+
+
+    def _create_file(self):
+        """Store an uploaded (multipart) batch input file."""
+        server = self.server
+        length = int(self.headers.get("Content-Length", 0))
+        raw = self.rfile.read(length)
+        message = BytesParser(policy=default).parsebytes(
+            f"Content-Type: {self.headers['Content-Type']}\r\n\r\n".encode("utf-8") + raw
+        )
+        fields = {
+            part.get_param("name", header="content-disposition"): part.get_payload(decode=True)
+            for part in message.iter_parts()
+        }
+        with server.lock:
+            file_id = f"file-{len(server.files) + 1}"
+            server.files[file_id] = fields.get("file", b"")
+        self._send_json(200, {
+            "id": file_id,
+            "object": "file",
+            "purpose": fields.get("purpose", b"").decode("utf-8"),
+            "bytes": len(server.files[file_id]),
+        })
+
+    def _create_batch(self):
+        server = self.server
+        request = self._read_json()
+        with server.lock:
+            batch_id = f"batch-{len(server.batches) + 1}"
+            server.batches[batch_id] = {
+                "id": batch_id,
+                "object": "batch",
+                "endpoint": request.get("endpoint"),
+                "input_file_id": request["input_file_id"],
+                "completion_window": request.get("completion_window"),
+                "status": "in_progress",
+                "output_file_id": None,
+                "created_at": time.time(),
+            }
+        self._send_json(200, server.batches[batch_id])
+
+    def _complete_batch(self, batch: dict):
+        """Answer every request of the batch input file and store the results as the output file."""
+        server = self.server
+        lines = []
+        for line in server.files[batch["input_file_id"]].decode("utf-8").splitlines():
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            with server.lock:
+                server.requests.append(item["body"])
+            lines.append(json.dumps({
+                "id": f"batch_req_{len(lines) + 1}",
+                "custom_id": item["custom_id"],
+                "response": {"status_code": 200, "body": self._completion_payload(item["body"])},
+                "error": None,
+            }))
+        with server.lock:
+            output_file_id = f"file-{len(server.files) + 1}"
+            server.files[output_file_id] = "\n".join(lines).encode("utf-8")
+            batch.update(status="completed", output_file_id=output_file_id)
+
+    def do_GET(self):
+        server = self.server
+        parts = self.path.rstrip("/").split("/")
+        if len(parts) >= 2 and parts[-2] == "batches" and parts[-1] in server.batches:
+            batch = server.batches[parts[-1]]
+            if batch["status"] == "in_progress" and time.time() - batch["created_at"] >= server.batch_delay:
+                self._complete_batch(batch)
+            self._send_json(200, batch)
+        elif len(parts) >= 3 and parts[-3] == "files" and parts[-1] == "content" and parts[-2] in server.files:
+            body = server.files[parts[-2]]
+            self.send_response(200)
+            self.send_header("Content-Type", "application/jsonl")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        else:
+            self._send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+
+
+class StubServer:
+    """
+    Runs the stub API on a background thread.
+
+    :param content: Assistant message returned for every chat completion.
+    :param latency: Seconds the server waits before answering.
+    :param max_concurrent: Answer 429 to requests beyond this many in flight at once, None for no limit.
+    :param fail_first: Answer 429 to this many requests first.
+    :param retry_after: Seconds sent back in the retry-after header and error message of a 429.
+    :param chunk_size: Characters per chunk of a streamed completion.
+    :param chunk_delay: Seconds between streamed chunks, i.e. the simulated generation time.
+    :param batch_delay: Seconds a batch job stays in progress before it completes.
+    """
+
+    def __init__(
+            self,
+            content: str = DEFAULT_CONTENT,
+            latency: float = 0.0,
+            host: str = "127.0.0.1",
+            port: int = 0,
+            max_concurrent: int = None,
+            fail_first: int = 0,
+            retry_after: float = 0.1,
+            chunk_size: int = 8,
+            chunk_delay: float = 0.0,
+            batch_delay: float = 0.0
+    ):
+        self.httpd = ThreadingHTTPServer((host, port), _StubHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.content = content
+        self.httpd.latency = latency
+        self.httpd.max_concurrent = max_concurrent
+        self.httpd.fail_first = fail_first
+        self.httpd.retry_after = retry_after
+        self.httpd.in_flight = 0
+        self.httpd.rejected = 0
+        self.httpd.chunk_size = chunk_size
+        self.httpd.chunk_delay = chunk_delay
+        self.httpd.aborted_streams = 0
+        self.httpd.batch_delay = batch_delay
+        self.httpd.files = {}
+        self.httpd.batches = {}
+        self.httpd.requests = []
+        self.httpd.connections = set()
+        self.httpd.lock = threading.Lock()
+        self.thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def requests(self) -> list:
+        return self.httpd.requests
+
+    @property
+    def rejected(self) -> int:
+        """Number of requests answered with a 429."""
+        return self.httpd.rejected
+
+    @property
+    def aborted_streams(self) -> int:
+        """Number of streamed completions the client stopped reading before the end."""
+        return self.httpd.aborted_streams
+
+    @property
+    def batches(self) -> dict:
+        return self.httpd.batches
+
+    @property
+    def connections(self) -> set:
+        """Distinct client (host, port) pairs seen, i.e. the number of TCP connections opened."""
+        return self.httpd.connections
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
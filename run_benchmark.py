@@ -5,7 +5,10 @@ from typing import Union
 from dotenv import load_dotenv
 
 from src.agent.backend import Provider, GroqModels, TogetherModels, LocalModels
-from src.benchmarks.benchmark_main import Benchmark
+from src.agent.backend.base_backend import Backend
+from src.agent.backend.batch_client import BatchClient
+from src.agent.backend.key_store import parse_key_shard
+from src.benchmarks.benchmark_main import Benchmark, list_config_files
 
 
 def main():
@@ -27,6 +30,11 @@ def main():
         type=str,
         help="Run a specific named configuration.",
     )
+    group.add_argument(
+        "--list",
+        action="store_true",
+        help="List the available configurations and exit.",
+    )
 
     # Other arguments
     parser.add_argument(
@@ -74,8 +82,93 @@ def main():
         help="Specify the backend model to use.",
     )
 
+    parser.add_argument(
+        "--escalation_provider",
+        type=provider,
+        choices=list(Provider),
+        default=None,
+        help="Provider of the escalation model (defaults to the backend provider).",
+    )
+    parser.add_argument(
+        "--escalation_model",
+        type=model,
+        choices=list(TogetherModels) + list(GroqModels) + list(LocalModels),
+        default=None,
+        help="Larger model that turns are escalated to when the backend model's output is rejected.",
+    )
+
+    parser.add_argument(
+        "--hedge_budget",
+        type=float,
+        default=None,
+        help="Fraction of requests (e.g. 0.05) that may be re-sent on a second key when slower than the p95 latency.",
+    )
+
+    parser.add_argument(
+        "--fallback_models",
+        type=model,
+        nargs="+",
+        default=None,
+        help="Models (e.g. TogetherModels.LLAMA31_8B) that requests fail over to, in order, when the backend is down.",
+    )
+
+    parser.add_argument(
+        "--coalesce_requests",
+        action="store_true",
+        default=False,
+        help="Let concurrent identical requests from different agents share one provider call and its sampled answer.",
+    )
+
+    parser.add_argument(
+        "--minify_prompts",
+        action="store_true",
+        default=False,
+        help="Strip markdown and whitespace from the prompts and only send the goal in the system prompt.",
+    )
+
+    parser.add_argument(
+        "--batch",
+        action="store_true",
+        default=False,
+        help="Run the simulations of a config in lockstep through the provider's batch API (cheaper, slower).",
+    )
+    parser.add_argument(
+        "--batch_base_url",
+        type=str,
+        default=None,
+        help="Base URL of the batch API, defaults to the backend provider's.",
+    )
+
+    parser.add_argument(
+        "--key_store",
+        type=str,
+        default=None,
+        help="SQLite file shared by all benchmark processes to coordinate API key usage and rate limits.",
+    )
+    parser.add_argument(
+        "--key_shard",
+        type=str,
+        default=None,
+        help="Only use a disjoint subset of the API keys, given as index/count (e.g. 0/3).",
+    )
+
     args = parser.parse_args()
 
+    # Listing only needs the config file names and the providers, not a simulator
+    if args.list:
+        print("Configurations:")
+        for config_key in list_config_files():
+            print(f"  {config_key}")
+        print("Backends:")
+        for backend_provider in Provider:
+            print(f"  {backend_provider.value}: {', '.join(model.value for model in backend_provider.models)}")
+        return
+
+    if args.key_store:
+        Backend.use_shared_key_store(args.key_store)
+    if args.key_shard:
+        Backend.set_key_shard(*parse_key_shard(args.key_shard))
+
     # Initialize the Benchmark object
     benchmark = Benchmark(
         use_db=args.use_db,
@@ -84,6 +177,13 @@ def main():
         num_simulations=args.num_simulations,
         backend_provider=args.backend_provider,
         backend_model=args.backend_model,
+        escalation_provider=args.escalation_provider,
+        escalation_model=args.escalation_model,
+        hedge_budget=args.hedge_budget,
+        fallback_models=[(model_provider(m), m) for m in args.fallback_models] if args.fallback_models else None,
+        batch_client=BatchClient.for_provider(args.backend_provider.value, args.batch_base_url) if args.batch else None,
+        coalesce_requests=args.coalesce_requests,
+        minify_prompts=args.minify_prompts,
     )
 
     # Handle the mutually exclusive options
@@ -102,6 +202,10 @@ def main():
     else:
         print("Error: Unexpected state. Please check the arguments.")
         parser.print_help()
+        return
+
+    for name, stats in benchmark.simulator.get_llm_telemetry().items():
+        print(f"LLM calls to {name}: {stats}")
 
 
 def provider(prov: str) -> Provider:
@@ -112,6 +216,14 @@ def provider(prov: str) -> Provider:
     raise argparse.ArgumentTypeError(f"Invalid provider: {prov}")
 
 
+def model_provider(m) -> Provider:
+    """The provider serving a model enum."""
+    for p in Provider:
+        if isinstance(m, p.models):
+            return p
+    raise argparse.ArgumentTypeError(f"No provider for model: {m}")
+
+
 def model(model_inp: str) -> Union[GroqModels, TogetherModels, LocalModels]:
     """Convert a string to the corresponding model enum."""
     for provider in [GroqModels, TogetherModels, LocalModels]:
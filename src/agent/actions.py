@@ -1,4 +1,4 @@
-from typing import List, Dict, Optional, Any
+from typing import List, Dict, Optional, Any, Tuple
 import yaml
 
 class Action:
@@ -83,6 +83,22 @@ class ActionManager:
         return action.is_valid(grid_size, current_position)
 
 
+def parse_position_parameters(parameters: Dict[str, Any]) -> Optional[Tuple[int, int]]:
+    """Read an (x, y) position from {"x": .., "y": ..} or a [x, y] "position"/"target" parameter."""
+    if not isinstance(parameters, dict):
+        return None
+    try:
+        if "x" in parameters and "y" in parameters:
+            return int(parameters["x"]), int(parameters["y"])
+        for key in ("position", "target", "target_position"):
+            if key in parameters:
+                x, y = parameters[key]
+                return int(x), int(y)
+    except (TypeError, ValueError):
+        return None
+    return None
+
+
 def format_actions(actions: List[Action]) -> str:
     """Format multiple actions with a 'actions:' header."""
     formatted_actions = '\n'.join(f"- {action.format()}" for action in actions)
@@ -1,31 +1,82 @@
 from abc import ABC, abstractmethod
-from typing import Dict, List
-from collections import defaultdict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from contextlib import contextmanager
+from contextvars import ContextVar
 from datetime import datetime, timedelta
+import asyncio
+import threading
 import time
 import logging
 import os
 import re
+import weakref
+
+from src.agent.backend import rate_limiter, telemetry
+from src.agent.backend.concurrency import AIMDController, get_concurrency_controller, parse_reset_duration
+from src.agent.backend.key_store import KeyStateStore, SQLiteKeyStateStore, key_id, parse_key_shard, select_key_shard
+from src.agent.backend.rate_limiter import RateLimiter, get_rate_limiter
+from src.utils.output_parsing import JsonObjectScanner, StreamingDecisionParser
+
+# Called with the action name as soon as it has streamed in, for the calls made in the current thread or task
+_action_listener: ContextVar[Optional[Callable[[str], None]]] = ContextVar("action_listener", default=None)
+
+
+@contextmanager
+def listen_for_action(callback: Optional[Callable[[str], None]]):
+    """
+    Have `callback` called with the action name of the responses streamed inside the block, before the rest of
+    the response has arrived. A retried or escalated call may call it again with a different action.
+    """
+    token = _action_listener.set(callback)
+    try:
+        yield
+    finally:
+        _action_listener.reset(token)
 
 
 class Backend(ABC):
-    _api_call_counts: Dict[str, int] = defaultdict(int)
-    _last_call_time: Dict[str, Dict[str, datetime]] = {}
-    _key_timeout_until: Dict[str, datetime] = defaultdict(lambda: datetime.min)
+    # Call counts, last call times and timeouts of every API key. Replaced by a SQLiteKeyStateStore
+    # (see use_shared_key_store) when several processes share the same keys.
+    _key_store: KeyStateStore = KeyStateStore()
+    # Only use every n-th key, see set_key_shard
+    _key_shard: Optional[Tuple[int, int]] = None
     _loggers: Dict[str, logging.Logger] = {}
 
+    # SDK clients are expensive to build (connection pool, TLS context), so they are shared across calls and agents
+    _clients: Dict[Tuple[str, str, str], Any] = {}
+    _clients_lock = threading.Lock()
+    # Event loop to its async clients keyed by (provider, api key, base url). Entries go with their loop: weakly
+    # referenced, and dropped once the loop is closed (see _loop_entries)
+    _async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[Tuple[str, str, str], Any]]" = \
+        weakref.WeakKeyDictionary()
+    max_connections: int = 20
+    max_keepalive_connections: int = 10
+    keepalive_expiry: float = 60.0
+
+    # Async request bookkeeping, event loop to the semaphore of each api key
+    _key_semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, asyncio.Semaphore]]" = \
+        weakref.WeakKeyDictionary()
+    max_in_flight_per_key: int = 4
+
     def __init__(
             self,
             name: str,
             rate_limit: int = 15,
-            min_delay: int = 5,
             history_length: int = 8,
             api_key_prefix: str = "",
-            verbose: bool = False
+            verbose: bool = False,
+            base_url: str = None
     ):
         self.name = name
+        self.base_url = base_url
+        # Requests per minute, only used when the provider has no entry in rate_limiter.RATE_LIMITS
         self.rate_limit = rate_limit
-        self.min_delay = min_delay
+        # Completion tokens reserved per request before the real usage is known
+        self.expected_completion_tokens = 300
+        # Stream completions and stop reading once the first JSON object is complete
+        self.stream_responses = True
+        self.last_call_stats: Dict[str, Any] = {}
+        self.stream_stats = {"calls": 0, "time_to_action": 0.0, "wasted_tokens": 0}
         self.history_length = history_length
         self.api_key_prefix = api_key_prefix
         self.verbose = verbose
@@ -44,6 +95,137 @@ class Backend(ABC):
         self.logger = Backend._loggers[name]
         self._initialize_api_keys()
 
+    @classmethod
+    def use_shared_key_store(cls, path: str):
+        """
+        Keep key usage, timeouts and rate limit budgets in a SQLite file shared by all processes using it.
+
+        Call before creating backends. Timeouts stored there survive restarts.
+
+        :param path: Path of the SQLite file.
+        """
+        store = SQLiteKeyStateStore(path)
+        Backend._key_store = store
+        rate_limiter.use_shared_store(store)
+
+    @classmethod
+    def set_key_shard(cls, shard_index: int, shard_count: int):
+        """
+        Statically split the API keys of every provider between `shard_count` workers.
+        This worker only uses the keys of shard `shard_index`. Call before creating backends.
+        """
+        select_key_shard([], shard_index, shard_count)  # validates the shard
+        Backend._key_shard = (shard_index, shard_count)
+
+    @classmethod
+    def configure_connection_pool(
+            cls,
+            max_connections: int = None,
+            max_keepalive_connections: int = None,
+            keepalive_expiry: float = None
+    ):
+        """
+        Set the connection pool limits used by clients created from now on.
+
+        :param max_connections: Maximum number of open connections per client.
+        :param max_keepalive_connections: Maximum number of idle connections kept alive per client.
+        :param keepalive_expiry: Seconds an idle connection is kept before it is closed.
+        """
+        if max_connections is not None:
+            Backend.max_connections = max_connections
+        if max_keepalive_connections is not None:
+            Backend.max_keepalive_connections = max_keepalive_connections
+        if keepalive_expiry is not None:
+            Backend.keepalive_expiry = keepalive_expiry
+
+    @classmethod
+    def close_clients(cls):
+        """Close and forget every cached client."""
+        with Backend._clients_lock:
+            for client in Backend._clients.values():
+                close = getattr(client, "close", None)
+                if callable(close):
+                    close()
+            Backend._clients.clear()
+
+    @staticmethod
+    def _loop_entries(cache: weakref.WeakKeyDictionary) -> Dict:
+        """
+        The entries of the running event loop in a per-loop cache. The entries of closed loops are dropped on the way:
+        their values may reference the loop, which would keep it alive in the weak dictionary.
+        """
+        for loop in [loop for loop in list(cache.keys()) if loop.is_closed()]:
+            del cache[loop]
+        return cache.setdefault(asyncio.get_running_loop(), {})
+
+    @classmethod
+    async def aclose_clients(cls):
+        """Close and forget the async clients opened on the running event loop."""
+        clients = Backend._async_clients.pop(asyncio.get_running_loop(), {})
+        for client in clients.values():
+            close = getattr(client, "close", None)
+            if callable(close):
+                result = close()
+                if asyncio.iscoroutine(result):
+                    await result
+
+    def _create_http_client(self):
+        """Create an httpx client with the configured keep-alive and pool limits."""
+        import httpx
+        return httpx.Client(
+            limits=httpx.Limits(
+                max_connections=Backend.max_connections,
+                max_keepalive_connections=Backend.max_keepalive_connections,
+                keepalive_expiry=Backend.keepalive_expiry,
+            ),
+            timeout=httpx.Timeout(60.0, connect=5.0),
+        )
+
+    def _create_async_http_client(self):
+        """Async counterpart of _create_http_client."""
+        import httpx
+        return httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=Backend.max_connections,
+                max_keepalive_connections=Backend.max_keepalive_connections,
+                keepalive_expiry=Backend.keepalive_expiry,
+            ),
+            timeout=httpx.Timeout(60.0, connect=5.0),
+        )
+
+    def _create_client(self, api_key: str):
+        """Construct a new SDK client for the given key. Backends that use a client must implement this."""
+        raise NotImplementedError(f"{type(self).__name__} does not create SDK clients")
+
+    def _get_client(self, api_key: str):
+        """Return the cached client for (provider, api_key, base_url), creating it on first use."""
+        cache_key = (self.name, api_key, self.base_url)
+        client = Backend._clients.get(cache_key)
+        if client is None:
+            with Backend._clients_lock:
+                client = Backend._clients.get(cache_key)
+                if client is None:
+                    client = self._create_client(api_key)
+                    Backend._clients[cache_key] = client
+        return client
+
+    def _create_async_client(self, api_key: str):
+        """Construct a new async SDK client for the given key. Backends with a native agenerate implement this."""
+        raise NotImplementedError(f"{type(self).__name__} does not create async SDK clients")
+
+    def _get_async_client(self, api_key: str):
+        """
+        Return the cached async client for (provider, api_key, base_url) on the running event loop.
+
+        Async connection pools belong to the loop they were opened on, so each loop gets its own client.
+        """
+        clients = Backend._loop_entries(Backend._async_clients)
+        cache_key = (self.name, api_key, self.base_url)
+        client = clients.get(cache_key)
+        if client is None:
+            client = clients[cache_key] = self._create_async_client(api_key)
+        return client
+
     def handle_rate_limit_error(self, key: str, error_message: str):
         """Handle rate limit error for a specific key."""
         self._set_key_timeout(key, error_message)
@@ -58,27 +240,28 @@ class Backend(ABC):
         now = datetime.now()
         return {
             f"{self.api_key_prefix}{i+1}": {
-                "calls": Backend._api_call_counts[key],
-                "last_call": Backend._last_call_time[self.name][key].strftime("%Y-%m-%d %H:%M:%S"),
-                "in_timeout": now < Backend._key_timeout_until[key],
-                "timeout_remaining": max(0, (Backend._key_timeout_until[key] - now).total_seconds()),
+                "calls": Backend._key_store.get_calls(key),
+                "last_call": Backend._key_store.get_last_call(key).strftime("%Y-%m-%d %H:%M:%S"),
+                "in_timeout": now < Backend._key_store.get_timeout(key),
+                "timeout_remaining": max(0, (Backend._key_store.get_timeout(key) - now).total_seconds()),
             }
             for i, key in enumerate(self.api_keys)
         }
 
     def _parse_rate_limit_error(self, error_message: str) -> float:
-        """Extract timeout duration from Groq rate limit error message."""
-        match = re.search(r'try again in (\d+)m([\d.]+)s', error_message)
+        """Extract timeout duration from Groq rate limit error message, e.g. "try again in 1m2.5s" or "in 450ms"."""
+        match = re.search(r'try again in ([\dhms.]+)', error_message)
         if match:
-            minutes, seconds = match.groups()
-            return float(minutes) * 60 + float(seconds)
+            duration = parse_reset_duration(match.group(1).rstrip("."))
+            if duration is not None:
+                return duration
         return 60  # Default timeout if we can't parse the message
 
     def _set_key_timeout(self, key: str, error_message: str):
         """Set a timeout for a specific API key based on the rate limit error."""
         timeout_duration = self._parse_rate_limit_error(error_message)
         timeout_until = datetime.now() + timedelta(seconds=timeout_duration)
-        Backend._key_timeout_until[key] = timeout_until
+        Backend._key_store.set_timeout(key, timeout_until)
         self.logger.warning(f"API key {key} in timeout until {timeout_until}")
 
     def _initialize_api_keys(self):
@@ -90,50 +273,310 @@ class Backend(ABC):
             if not key:
                 break
             self.api_keys.append(key)
-            Backend._last_call_time.setdefault(self.name, {})[key] = datetime.min
             i += 1
 
+        shard = Backend._key_shard
+        if shard is None and os.environ.get("API_KEY_SHARD"):
+            shard = parse_key_shard(os.environ["API_KEY_SHARD"])
+        if shard is not None:
+            self.api_keys = select_key_shard(self.api_keys, *shard)
+
         if not self.api_keys:
             print(f"No valid API keys found with prefix {self.api_key_prefix}")
 
         if self.verbose:
             self.logger.info(f"Number of API keys: {len(self.api_keys)}")
 
-    def _respect_rate_limit(self, key: str):
-        """Implement rate limiting logic."""
-        now = datetime.now()
-        time_since_last_call = (now - Backend._last_call_time[self.name][key]).total_seconds()
-        calls_in_last_minute = Backend._api_call_counts[key]
+    @property
+    def rate_limiter(self) -> RateLimiter:
+        """The limiter shared by every backend instance using this provider and model."""
+        return get_rate_limiter(self.name, getattr(self, "model", None), default_requests_per_minute=self.rate_limit)
 
-        if calls_in_last_minute >= self.rate_limit:
-            time_to_wait = 60 - time_since_last_call
-            if time_to_wait > 0:
-                self.logger.info(f"Rate limiting: Sleeping for {time_to_wait:.2f} seconds")
-                time.sleep(time_to_wait)
-            Backend._api_call_counts[key] = 0
+    def _estimate_tokens(self, messages: List[Dict]) -> int:
+        """Rough prompt plus completion token count of a request, about four characters per token."""
+        prompt_chars = sum(len(str(message.get("content", ""))) for message in self._truncate_messages(messages))
+        return prompt_chars // 4 + self.expected_completion_tokens
 
-        if time_since_last_call < self.min_delay:
-            sleep_time = self.min_delay - time_since_last_call
-            self.logger.info(f"Rate limiting: Sleeping for {sleep_time:.2f} seconds")
-            time.sleep(sleep_time)
+    def _respect_rate_limit(self, key: str, estimated_tokens: int = 0):
+        """Reserve a request and its tokens for the key and sleep until they are available."""
+        delay = self.rate_limiter.reserve(key, estimated_tokens)
+        telemetry.add_time("rate_limit_wait", delay)
+        if delay > 0:
+            self.logger.info(f"Rate limiting: Sleeping for {delay:.2f} seconds")
+            time.sleep(delay)
 
-    def _get_next_api_key(self) -> str:
-        """Get the next available API key with the lowest usage that's not in timeout."""
+    async def _arespect_rate_limit(self, key: str, estimated_tokens: int = 0):
+        """Non-blocking version of _respect_rate_limit."""
+        delay = self.rate_limiter.reserve(key, estimated_tokens)
+        telemetry.add_time("rate_limit_wait", delay)
+        if delay > 0:
+            self.logger.info(f"Rate limiting: Waiting {delay:.2f} seconds")
+            await asyncio.sleep(delay)
+
+    def _record_token_usage(self, key: str, estimated_tokens: int, response):
+        """Replace the token estimate with the usage the provider reported, when it reports one."""
+        usage = getattr(response, "usage", None)
+        total_tokens = getattr(usage, "total_tokens", None)
+        if total_tokens:
+            self.rate_limiter.record_tokens(key, estimated_tokens, total_tokens)
+
+    def _select_api_key(self) -> Tuple[str, float]:
+        """Pick the key with the lowest usage that's not in timeout, and how long to wait before using it."""
         now = datetime.now()
+        timeouts = {k: Backend._key_store.get_timeout(k) for k in self.api_keys}
         available_keys = [
             k for k in self.api_keys
-            if now >= Backend._key_timeout_until[k]
+            if now >= timeouts[k]
         ]
 
-        if not available_keys:
-            # If all keys are in timeout, wait for the one with the shortest timeout
-            next_available_key = min(self.api_keys, key=lambda k: Backend._key_timeout_until[k])
-            wait_time = (Backend._key_timeout_until[next_available_key] - now).total_seconds()
-            self.logger.info(f"All API keys in timeout. Waiting {wait_time:.2f} seconds for next available key.")
+        if available_keys:
+            return min(available_keys, key=Backend._key_store.get_calls), 0.0
+
+        # If all keys are in timeout, wait for the one with the shortest timeout
+        next_available_key = min(self.api_keys, key=lambda k: timeouts[k])
+        wait_time = (timeouts[next_available_key] - now).total_seconds()
+        self.logger.info(f"All API keys in timeout. Waiting {wait_time:.2f} seconds for next available key.")
+        return next_available_key, max(0.0, wait_time)
+
+    def _get_next_api_key(self) -> str:
+        """Get the next available API key with the lowest usage that's not in timeout."""
+        key, wait_time = self._select_api_key()
+        telemetry.add_time("key_wait", wait_time)
+        if wait_time > 0:
             time.sleep(wait_time)
-            return next_available_key
+        return key
+
+    async def _aget_next_api_key(self) -> str:
+        """Non-blocking version of _get_next_api_key."""
+        key, wait_time = self._select_api_key()
+        telemetry.add_time("key_wait", wait_time)
+        if wait_time > 0:
+            await asyncio.sleep(wait_time)
+        return key
+
+    def _key_semaphore(self, key: str) -> asyncio.Semaphore:
+        """Semaphore bounding the in-flight async requests per key, one set per event loop."""
+        semaphores = Backend._loop_entries(Backend._key_semaphores)
+        semaphore = semaphores.get(key)
+        if semaphore is None:
+            semaphore = semaphores[key] = asyncio.Semaphore(self.max_in_flight_per_key)
+        return semaphore
+
+    def _acquire_api_key(self, estimated_tokens: int = 0) -> str:
+        """Pick a key, wait until its rate limit allows the request and record the call."""
+        api_key = self._get_next_api_key()
+        self._respect_rate_limit(api_key, estimated_tokens)
+        self._update_api_call_stats(api_key)
+        telemetry.set_fields(key_id=key_id(api_key))
+        return api_key
+
+    async def _aacquire_api_key(self, estimated_tokens: int = 0) -> str:
+        """Non-blocking version of _acquire_api_key."""
+        api_key = await self._aget_next_api_key()
+        await self._arespect_rate_limit(api_key, estimated_tokens)
+        self._update_api_call_stats(api_key)
+        telemetry.set_fields(key_id=key_id(api_key))
+        return api_key
+
+    @property
+    def concurrency(self) -> AIMDController:
+        """The adaptive concurrency controller shared by every backend of this provider."""
+        return get_concurrency_controller(self.name)
+
+    @staticmethod
+    def _is_overload_error(error: Exception) -> bool:
+        """Whether an error means the provider is overloaded: a 429 or a timeout."""
+        return "429" in str(error) or "timeout" in type(error).__name__.lower() or "timed out" in str(error).lower()
+
+    def _controlled_request(self, request: Callable[[], Any], consume: Callable[[Any], Any] = None):
+        """
+        Run one provider request inside a concurrency slot and report the outcome to the controller.
+
+        `request` may return a raw response (from the SDK's `with_raw_response`), its rate limit headers are then
+        passed to the controller and the parsed response is used.
+
+        :param consume: Applied to the parsed response while the slot is still held, e.g. to read a stream.
+        """
+        queued = time.perf_counter()
+        with self.concurrency.slot():
+            sent = time.perf_counter()
+            telemetry.add_time("queue_wait", sent - queued)
+            telemetry.set_fields(sent_at=sent)
+            try:
+                response = request()
+                headers = None
+                if hasattr(response, "http_response"):  # raw response wrapper
+                    headers = response.headers
+                    response = response.parse()
+                if consume is not None:
+                    response = consume(response)
+                telemetry.set_fields(latency=time.perf_counter() - sent)
+            except Exception as e:
+                if self._is_overload_error(e):
+                    self.concurrency.on_overload(getattr(getattr(e, "response", None), "headers", None))
+                raise
+        self.concurrency.on_success(headers)
+        return response
+
+    async def _acontrolled_request(
+            self,
+            request: Callable[[], Awaitable[Any]],
+            consume: Callable[[Any], Awaitable[Any]] = None
+    ):
+        """Async version of _controlled_request, `request` and `consume` return awaitables."""
+        queued = time.perf_counter()
+        async with self.concurrency.aslot():
+            sent = time.perf_counter()
+            telemetry.add_time("queue_wait", sent - queued)
+            telemetry.set_fields(sent_at=sent)
+            try:
+                response = await request()
+                headers = None
+                if hasattr(response, "http_response"):  # raw response wrapper
+                    headers = response.headers
+                    response = await response.parse()
+                if consume is not None:
+                    response = await consume(response)
+                telemetry.set_fields(latency=time.perf_counter() - sent)
+            except Exception as e:
+                if self._is_overload_error(e):
+                    self.concurrency.on_overload(getattr(getattr(e, "response", None), "headers", None))
+                raise
+        self.concurrency.on_success(headers)
+        return response
+
+    @staticmethod
+    def _chunk_text(chunk) -> str:
+        choices = getattr(chunk, "choices", None)
+        if not choices:
+            return ""
+        return getattr(choices[0].delta, "content", None) or ""
+
+    @staticmethod
+    def _chunk_usage(chunk):
+        """Usage reported in a stream chunk, OpenAI style or in Groq's x_groq field."""
+        usage = getattr(chunk, "usage", None)
+        if usage is None:
+            usage = getattr(getattr(chunk, "x_groq", None), "usage", None)
+        return usage
 
-        return min(available_keys, key=lambda k: Backend._api_call_counts[k])
+    def _read_completion(self, response, started: float, api_key: str, estimated_tokens: int) -> str:
+        """
+        Return the text of a completion, reading a stream only until the first JSON object is complete. The action
+        name is reported to the listener of listen_for_action as soon as it has streamed in.
+
+        Records token usage and the per-call stats in `last_call_stats`.
+        """
+        if hasattr(response, "choices"):
+            self._record_token_usage(api_key, estimated_tokens, response)
+            self._record_call_tokens(response.usage, estimated_tokens, response.choices[0].message.content)
+            return self._record_call_stats(response.choices[0].message.content, started, streamed=False)
+
+        decision = StreamingDecisionParser(on_action=self._on_streamed_action)
+        parts, wasted, usage = [], "", None
+        try:
+            for chunk in response:
+                usage = self._chunk_usage(chunk) or usage
+                text = self._chunk_text(chunk)
+                self._mark_first_token(text)
+                decision.feed(text)
+                end = decision.object_end
+                if end is not None:
+                    parts.append(text[:end])
+                    wasted = text[end:]
+                    break
+                parts.append(text)
+        finally:
+            close = getattr(response, "close", None)
+            if callable(close):
+                close()
+        return self._finish_stream("".join(parts), wasted, usage, started, api_key, estimated_tokens)
+
+    async def _aread_completion(self, response, started: float, api_key: str, estimated_tokens: int) -> str:
+        """Async version of _read_completion."""
+        if hasattr(response, "choices"):
+            self._record_token_usage(api_key, estimated_tokens, response)
+            self._record_call_tokens(response.usage, estimated_tokens, response.choices[0].message.content)
+            return self._record_call_stats(response.choices[0].message.content, started, streamed=False)
+
+        decision = StreamingDecisionParser(on_action=self._on_streamed_action)
+        parts, wasted, usage = [], "", None
+        try:
+            async for chunk in response:
+                usage = self._chunk_usage(chunk) or usage
+                text = self._chunk_text(chunk)
+                self._mark_first_token(text)
+                decision.feed(text)
+                end = decision.object_end
+                if end is not None:
+                    parts.append(text[:end])
+                    wasted = text[end:]
+                    break
+                parts.append(text)
+        finally:
+            close = getattr(response, "close", None)
+            if callable(close):
+                result = close()
+                if asyncio.iscoroutine(result):
+                    await result
+        return self._finish_stream("".join(parts), wasted, usage, started, api_key, estimated_tokens)
+
+    def _finish_stream(self, text: str, wasted: str, usage, started: float, api_key: str,
+                       estimated_tokens: int) -> str:
+        total_tokens = getattr(usage, "total_tokens", None)
+        if not total_tokens:
+            # A stream cut off early never reports usage, estimate it from what was received
+            total_tokens = estimated_tokens - self.expected_completion_tokens + len(text + wasted) // 4
+        self.rate_limiter.record_tokens(api_key, estimated_tokens, total_tokens)
+        self._record_call_tokens(usage, estimated_tokens, text + wasted)
+        telemetry.set_fields(streamed=True)
+        return self._record_call_stats(text, started, streamed=True, wasted=wasted)
+
+    @staticmethod
+    def _on_streamed_action(action_name: str):
+        record = telemetry.current_call()
+        if record is not None and record["time_to_action"] is None and "sent_at" in record:
+            record["time_to_action"] = time.perf_counter() - record["sent_at"]
+        listener = _action_listener.get()
+        if listener is not None:
+            listener(action_name)
+
+    @staticmethod
+    def _mark_first_token(text: str):
+        record = telemetry.current_call()
+        if text and record is not None and record["time_to_first_token"] is None and "sent_at" in record:
+            record["time_to_first_token"] = time.perf_counter() - record["sent_at"]
+
+    def _record_call_tokens(self, usage, estimated_tokens: int, completion: str):
+        """Token counts for telemetry, as reported by the provider or estimated when it did not report them."""
+        prompt_tokens = getattr(usage, "prompt_tokens", None)
+        completion_tokens = getattr(usage, "completion_tokens", None)
+        telemetry.set_fields(
+            prompt_tokens=prompt_tokens if prompt_tokens is not None else estimated_tokens - self.expected_completion_tokens,
+            completion_tokens=completion_tokens if completion_tokens is not None else len(completion or "") // 4,
+        )
+
+    def _record_call_stats(self, text: str, started: float, streamed: bool, wasted: str = None) -> str:
+        """
+        Record time-to-action and wasted completion tokens (text after the JSON object, which the agent drops).
+        """
+        now = time.perf_counter()
+        if wasted is None:
+            end = JsonObjectScanner().feed(text)
+            wasted = text[end:] if end is not None else ""
+            text = text[:end] if end is not None else text
+        self.last_call_stats = {
+            "streamed": streamed,
+            "time_to_action": now - started,
+            "completion_tokens": len(text + wasted) // 4,
+            "wasted_tokens": len(wasted) // 4,
+        }
+        self.stream_stats["calls"] += 1
+        self.stream_stats["time_to_action"] += self.last_call_stats["time_to_action"]
+        self.stream_stats["wasted_tokens"] += self.last_call_stats["wasted_tokens"]
+        if self.verbose:
+            self.logger.info(f"Call stats: {self.last_call_stats}")
+        return text if streamed else text + wasted
 
     def _truncate_messages(self, messages: List[Dict]) -> List[Dict]:
         """Keep system message and last N messages."""
@@ -143,16 +586,32 @@ class Backend(ABC):
 
     def _update_api_call_stats(self, key: str):
         """Update API call statistics."""
-        Backend._api_call_counts[key] += 1
-        Backend._last_call_time[self.name][key] = datetime.now()
+        Backend._key_store.record_call(key)
 
         if self.verbose:
             self.logger.info("=== API Key Usage Stats ===")
             for i, k in enumerate(self.api_keys, 1):
-                self.logger.info(f"{self.api_key_prefix}{i}: {Backend._api_call_counts[k]} calls")
+                self.logger.info(f"{self.api_key_prefix}{i}: {Backend._key_store.get_calls(k)} calls")
             self.logger.info("========================")
 
+    @property
+    def innermost(self) -> "Backend":
+        """The backend making the provider calls, behind the backends wrapping it."""
+        return self
+
+    def record_outcome(self, score: float):
+        """Called once a simulation using this backend has finished. Backends that track outcomes override this."""
+        pass
+
     @abstractmethod
     def generate(self, messages: List[Dict]) -> str:
         """Generate a response for the given messages."""
-        raise NotImplementedError("Subclasses must implement generate()")
\ No newline at end of file
+        raise NotImplementedError("Subclasses must implement generate()")
+
+    async def agenerate(self, messages: List[Dict]) -> str:
+        """
+        Generate a response without blocking the event loop.
+
+        Backends with an async SDK client override this. The default runs generate in a worker thread.
+        """
+        return await asyncio.to_thread(self.generate, messages)
\ No newline at end of file
@@ -0,0 +1,137 @@
+from typing import Dict, Optional
+import json
+import os
+import time
+
+# Base URLs of the OpenAI-compatible batch APIs
+BATCH_BASE_URLS = {
+    "openai": "https://api.openai.com/v1",
+    "together": "https://api.together.xyz/v1",
+    "groq": "https://api.groq.com/openai/v1",
+}
+
+API_KEY_PREFIXES = {
+    "openai": "OPENAI_API_KEY",
+    "together": "TOGETHER_API_KEY",
+    "groq": "GROQ_API_KEY",
+}
+
+
+class BatchClient:
+    """
+    Runs chat completions through an OpenAI-style batch API: upload a JSONL file of requests, create a batch,
+    poll until it has finished and download the results.
+
+    Batch jobs are billed at a discount and do not count against the per-minute rate limits, at the price of
+    latency (the provider may take up to `completion_window` to finish).
+
+    :param base_url: Base URL of the API, e.g. "https://api.openai.com/v1".
+    :param api_key: API key sent as bearer token.
+    :param poll_interval: Seconds between two status checks of a running batch.
+    :param completion_window: Time the provider is given to complete a batch.
+    :param file_purpose: Purpose of the uploaded request file, "batch" for OpenAI and Groq, "batch-api" for Together.
+    """
+
+    TERMINAL_STATUSES = ("completed", "failed", "expired", "cancelled")
+
+    def __init__(
+            self,
+            base_url: str,
+            api_key: str,
+            poll_interval: float = 10.0,
+            completion_window: str = "24h",
+            file_purpose: str = "batch"
+    ):
+        import httpx
+        self.http = httpx.Client(
+            base_url=base_url.rstrip("/") + "/",
+            headers={"Authorization": f"Bearer {api_key}"},
+            timeout=httpx.Timeout(120.0, connect=5.0),
+        )
+        self.poll_interval = poll_interval
+        self.completion_window = completion_window
+        self.file_purpose = file_purpose
+        self.stats = {"batches": 0, "requests": 0, "failed_requests": 0, "wait_time": 0.0}
+
+    @classmethod
+    def for_provider(cls, provider: str, base_url: str = None, **kwargs) -> "BatchClient":
+        """Create a client for a provider, using the first of its API keys from the environment."""
+        if provider not in API_KEY_PREFIXES:
+            raise ValueError(f"No batch API for provider '{provider}', use one of {list(API_KEY_PREFIXES)}")
+        api_key = os.environ.get(f"{API_KEY_PREFIXES[provider]}1", "")
+        if provider == "together":
+            kwargs.setdefault("file_purpose", "batch-api")
+        return cls(base_url or BATCH_BASE_URLS[provider], api_key, **kwargs)
+
+    def submit(self, requests: Dict[str, Dict]) -> str:
+        """
+        Upload the requests and create a batch job.
+
+        :param requests: Chat completion request bodies by custom id.
+        :return: The batch id.
+        """
+        lines = "\n".join(
+            json.dumps({"custom_id": custom_id, "method": "POST", "url": "/v1/chat/completions", "body": body})
+            for custom_id, body in requests.items()
+        )
+        upload = self.http.post(
+            "files",
+            files={"file": ("requests.jsonl", lines.encode("utf-8"), "application/jsonl")},
+            data={"purpose": self.file_purpose},
+        )
+        upload.raise_for_status()
+
+        batch = self.http.post("batches", json={
+            "input_file_id": upload.json()["id"],
+            "endpoint": "/v1/chat/completions",
+            "completion_window": self.completion_window,
+        })
+        batch.raise_for_status()
+        self.stats["batches"] += 1
+        self.stats["requests"] += len(requests)
+        return batch.json()["id"]
+
+    def wait(self, batch_id: str) -> Dict:
+        """Poll a batch until it reaches a terminal status and return it."""
+        start = time.perf_counter()
+        while True:
+            response = self.http.get(f"batches/{batch_id}")
+            response.raise_for_status()
+            batch = response.json()
+            if batch["status"] in self.TERMINAL_STATUSES:
+                self.stats["wait_time"] += time.perf_counter() - start
+                if batch["status"] != "completed":
+                    raise RuntimeError(f"Batch {batch_id} ended with status '{batch['status']}'")
+                return batch
+            time.sleep(self.poll_interval)
+
+    def results(self, batch: Dict) -> Dict[str, Optional[str]]:
+        """
+        Download the results of a completed batch.
+
+        :return: Assistant message by custom id, None for requests that failed.
+        """
+        contents = {}
+        if batch.get("output_file_id"):
+            response = self.http.get(f"files/{batch['output_file_id']}/content")
+            response.raise_for_status()
+            for line in response.text.splitlines():
+                if not line.strip():
+                    continue
+                result = json.loads(line)
+                answer = result.get("response") or {}
+                if answer.get("status_code") == 200:
+                    contents[result["custom_id"]] = answer["body"]["choices"][0]["message"]["content"]
+                else:
+                    contents[result["custom_id"]] = None
+        return contents
+
+    def run(self, requests: Dict[str, Dict]) -> Dict[str, Optional[str]]:
+        """Submit the requests as one batch, wait for it and return the assistant message per custom id."""
+        contents = self.results(self.wait(self.submit(requests)))
+        failed = [custom_id for custom_id in requests if contents.get(custom_id) is None]
+        self.stats["failed_requests"] += len(failed)
+        return {custom_id: contents.get(custom_id) for custom_id in requests}
+
+    def close(self):
+        self.http.close()
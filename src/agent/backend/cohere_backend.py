@@ -1,27 +1,30 @@
 from src.agent.backend.base_backend import Backend
+from src.agent.backend.telemetry import instrumented
 
 
 class CohereBackend(Backend):
-    def __init__(self, model_id: str = "command"):
+    def __init__(self, model_id: str = "command", base_url: str = None):
         super().__init__(
             name="cohere",
             api_key_prefix="COHERE_API_KEY",
             rate_limit=20,
-            min_delay=3,
-            history_length=10
+            history_length=10,
+            base_url=base_url
         )
         self.model = model_id
         self.temperature = 0.9
-        self.client = None
 
-    def generate(self, messages):
+    def _create_client(self, api_key: str):
         from cohere import Client
-        api_key = self._get_next_api_key()
-        self._respect_rate_limit(api_key)
-        self._update_api_call_stats(api_key)
+        kwargs = {"base_url": self.base_url} if self.base_url else {}
+        return Client(client_name="CLIENT", api_key=api_key, httpx_client=self._create_http_client(), **kwargs)
+
+    @instrumented
+    def generate(self, messages):
+        api_key = self._acquire_api_key(self._estimate_tokens(messages))
 
         try:
-            self.client = Client(client_name="CLIENT", api_key=api_key)
+            client = self._get_client(api_key)
 
             # Convert chat format to Cohere format
             chat_history = []
@@ -32,7 +35,7 @@ class CohereBackend(Backend):
             # Get the last message
             last_message = messages[-1]["content"]
 
-            return self.client.chat(
+            return client.chat(
                 message=last_message,
                 chat_history=chat_history,
                 model=self.model,
@@ -0,0 +1,182 @@
+from typing import Dict, Mapping, Optional
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+import asyncio
+import re
+import threading
+import time
+
+
+def parse_reset_duration(value: str) -> Optional[float]:
+    """Parse rate limit reset headers such as "2s", "1m30.5s", "450ms" or "12" into seconds."""
+    if value is None:
+        return None
+    value = str(value).strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    match = re.fullmatch(r"(?:(\d+)h)?(?:(\d+)m(?!s))?(?:([\d.]+)s)?(?:([\d.]+)ms)?", value)
+    if not match or not any(match.groups()):
+        return None
+    hours, minutes, seconds, milliseconds = (float(group) if group else 0.0 for group in match.groups())
+    return hours * 3600 + minutes * 60 + seconds + milliseconds / 1000
+
+
+class AIMDController:
+    """
+    Additive-increase / multiplicative-decrease control of the request pressure on one provider.
+
+    It bounds the number of in-flight requests (`limit`) and, once the provider has pushed back, the request
+    start rate (`rate`, requests per second). Every success grows both additively. A 429 or timeout shrinks them
+    multiplicatively, at most once per `cooldown` seconds so a burst of failures counts as one signal.
+    `x-ratelimit-*` and `retry-after` response headers pause new requests until the provider's window resets.
+    """
+
+    def __init__(
+            self,
+            initial_limit: float = 8,
+            min_limit: float = 1,
+            max_limit: float = 64,
+            increase: float = 1.0,
+            decrease: float = 0.5,
+            rate_increase: float = 0.05,
+            min_rate: float = 0.1,
+            cooldown: float = 1.0,
+            clock=time.monotonic
+    ):
+        self.limit = initial_limit
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.increase = increase
+        self.decrease = decrease
+        self.rate_increase = rate_increase
+        self.min_rate = min_rate
+        self.cooldown = cooldown
+        self.clock = clock
+
+        self.rate: Optional[float] = None  # unpaced until the first overload
+        self.in_flight = 0
+        self.paused_until = 0.0
+        self.next_start = 0.0
+        self.stats = {"successes": 0, "overloads": 0, "decreases": 0}
+
+        self._last_decrease = float("-inf")
+        self._recent_starts = deque(maxlen=32)
+        self._condition = threading.Condition()
+
+    def _observed_rate(self, now: float) -> Optional[float]:
+        if len(self._recent_starts) < 2:
+            return None
+        span = now - self._recent_starts[0]
+        return len(self._recent_starts) / span if span > 0 else None
+
+    def try_acquire(self) -> float:
+        """Take a slot if one is free. Returns 0 on success, otherwise a hint of how long to wait."""
+        with self._condition:
+            now = self.clock()
+            wait = max(self.paused_until - now, self.next_start - now, 0.0)
+            if wait > 0:
+                return wait
+            if self.in_flight >= int(self.limit):
+                return 0.01
+            self.in_flight += 1
+            self._recent_starts.append(now)
+            if self.rate:
+                self.next_start = now + 1 / self.rate
+            return 0.0
+
+    def release(self):
+        with self._condition:
+            self.in_flight -= 1
+            self._condition.notify_all()
+
+    @contextmanager
+    def slot(self):
+        """Hold an in-flight slot for the duration of a blocking request."""
+        while True:
+            wait = self.try_acquire()
+            if wait == 0:
+                break
+            with self._condition:
+                self._condition.wait(timeout=wait)
+        try:
+            yield
+        finally:
+            self.release()
+
+    @asynccontextmanager
+    async def aslot(self):
+        """Hold an in-flight slot for the duration of an async request."""
+        while True:
+            wait = self.try_acquire()
+            if wait == 0:
+                break
+            await asyncio.sleep(min(wait, 0.05))
+        try:
+            yield
+        finally:
+            self.release()
+
+    def on_success(self, headers: Mapping[str, str] = None):
+        with self._condition:
+            self.stats["successes"] += 1
+            self.limit = min(self.max_limit, self.limit + self.increase / self.limit)
+            if self.rate is not None:
+                self.rate += self.rate_increase
+            self._apply_headers(headers)
+            self._condition.notify_all()
+
+    def on_overload(self, headers: Mapping[str, str] = None):
+        """Record a 429 or timeout."""
+        with self._condition:
+            now = self.clock()
+            self.stats["overloads"] += 1
+            if now - self._last_decrease >= self.cooldown:
+                self._last_decrease = now
+                self.stats["decreases"] += 1
+                self.limit = max(self.min_limit, self.limit * self.decrease)
+                current_rate = self.rate or self._observed_rate(now)
+                if current_rate is not None:
+                    self.rate = max(self.min_rate, current_rate * self.decrease)
+            self._apply_headers(headers)
+
+    def _apply_headers(self, headers: Mapping[str, str]):
+        """Pause new requests when the provider says a rate limit window is exhausted."""
+        if not headers:
+            return
+        now = self.clock()
+        retry_after = parse_reset_duration(headers.get("retry-after"))
+        if retry_after:
+            self.paused_until = max(self.paused_until, now + retry_after)
+        for kind in ("requests", "tokens"):
+            remaining = headers.get(f"x-ratelimit-remaining-{kind}")
+            reset = parse_reset_duration(headers.get(f"x-ratelimit-reset-{kind}"))
+            try:
+                exhausted = remaining is not None and float(remaining) <= 0
+            except ValueError:
+                exhausted = False
+            if exhausted and reset:
+                self.paused_until = max(self.paused_until, now + reset)
+
+    def get_status(self) -> Dict:
+        return {
+            "limit": round(self.limit, 2),
+            "rate": round(self.rate, 3) if self.rate is not None else None,
+            "in_flight": self.in_flight,
+            "paused_for": max(0.0, self.paused_until - self.clock()),
+            **self.stats,
+        }
+
+
+_controllers: Dict[str, AIMDController] = {}
+_controllers_lock = threading.Lock()
+
+
+def get_concurrency_controller(provider: str) -> AIMDController:
+    """Return the controller shared by every backend of a provider."""
+    with _controllers_lock:
+        controller = _controllers.get(provider)
+        if controller is None:
+            controller = _controllers[provider] = AIMDController()
+        return controller
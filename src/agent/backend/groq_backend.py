@@ -1,41 +1,93 @@
-from groq import Groq
+import time
+
 from src.agent.backend.base_backend import Backend
+from src.agent.backend import telemetry
+from src.agent.backend.telemetry import instrumented
 
 
 class GroqBackend(Backend):
-    def __init__(self, model_id: str = "llama-3.1-8b-instant"):
+    def __init__(self, model_id: str = "llama-3.1-8b-instant", base_url: str = None):
         super().__init__(
             name="groq",
             api_key_prefix="GROQ_API_KEY",
             rate_limit=15,
-            min_delay=9,
-            history_length=8
+            history_length=8,
+            base_url=base_url
         )
         self.model = model_id
         self.temperature = 0.9
-        self.client = None
 
+    # The SDK's own retries are disabled, 429s are handled here by switching keys and backing off
+    def _create_client(self, api_key: str):
+        from groq import Groq
+        return Groq(api_key=api_key, base_url=self.base_url, http_client=self._create_http_client(), max_retries=0)
+
+    def _create_async_client(self, api_key: str):
+        from groq import AsyncGroq
+        return AsyncGroq(
+            api_key=api_key,
+            base_url=self.base_url,
+            http_client=self._create_async_http_client(),
+            max_retries=0
+        )
+
+    @instrumented
     def generate(self, messages):
+        estimated_tokens = self._estimate_tokens(messages)
         while True:
-            api_key = self._get_next_api_key()
-            self._respect_rate_limit(api_key)
-            self._update_api_call_stats(api_key)
+            api_key = self._acquire_api_key(estimated_tokens)
 
             try:
-                self.client = Groq(api_key=api_key)
-                return self.client.chat.completions.create(
-                    messages=self._truncate_messages(messages),
-                    model=self.model,
-                    temperature=self.temperature
-                ).choices[0].message.content
+                started = time.perf_counter()
+                client = self._get_client(api_key)
+                return self._controlled_request(
+                    lambda: client.chat.completions.with_raw_response.create(
+                        messages=self._truncate_messages(messages),
+                        model=self.model,
+                        temperature=self.temperature,
+                        stream=self.stream_responses
+                    ),
+                    consume=lambda response: self._read_completion(response, started, api_key, estimated_tokens)
+                )
 
             except Exception as e:
                 error_msg = str(e)
                 if "429" in error_msg:
                     self.logger.error(f"Rate limit (429) hit for key {api_key}")
                     self.handle_rate_limit_error(api_key, error_msg)
+                    telemetry.increment("retries")
                     continue  # Try again with a different key
                 if "400" in error_msg:
                     self.logger.error(f"(400) hit for key {api_key}")
                 raise  # Re-raise non-rate-limit errors
 
+    @instrumented
+    async def agenerate(self, messages):
+        estimated_tokens = self._estimate_tokens(messages)
+        while True:
+            api_key = await self._aacquire_api_key(estimated_tokens)
+
+            try:
+                started = time.perf_counter()
+                client = self._get_async_client(api_key)
+                async with self._key_semaphore(api_key):
+                    return await self._acontrolled_request(
+                        lambda: client.chat.completions.with_raw_response.create(
+                            messages=self._truncate_messages(messages),
+                            model=self.model,
+                            temperature=self.temperature,
+                            stream=self.stream_responses
+                        ),
+                        consume=lambda response: self._aread_completion(response, started, api_key, estimated_tokens)
+                    )
+
+            except Exception as e:
+                error_msg = str(e)
+                if "429" in error_msg:
+                    self.logger.error(f"Rate limit (429) hit for key {api_key}")
+                    self.handle_rate_limit_error(api_key, error_msg)
+                    telemetry.increment("retries")
+                    continue  # Try again with a different key
+                if "400" in error_msg:
+                    self.logger.error(f"(400) hit for key {api_key}")
+                raise  # Re-raise non-rate-limit errors
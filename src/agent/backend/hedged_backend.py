@@ -0,0 +1,173 @@
+from typing import Dict, List, Optional, Tuple
+from collections import deque
+import asyncio
+import threading
+import time
+
+from src.agent.backend.base_backend import Backend
+
+
+class LatencyTracker:
+    """
+    Latency quantiles over the last `window` requests of one provider/model.
+
+    :param window: Number of most recent latencies kept.
+    """
+
+    def __init__(self, window: int = 200):
+        self.samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, latency: float):
+        with self._lock:
+            self.samples.append(latency)
+
+    def quantile(self, q: float) -> Optional[float]:
+        with self._lock:
+            if not self.samples:
+                return None
+            ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def __len__(self):
+        return len(self.samples)
+
+
+_trackers: Dict[Tuple[str, str], LatencyTracker] = {}
+_trackers_lock = threading.Lock()
+
+
+def get_latency_tracker(provider: str, model: str = None) -> LatencyTracker:
+    """Return the tracker shared by every backend using this provider and model."""
+    with _trackers_lock:
+        tracker = _trackers.get((provider, model))
+        if tracker is None:
+            tracker = _trackers[(provider, model)] = LatencyTracker()
+        return tracker
+
+
+class HedgedBackend(Backend):
+    """
+    Sends a second copy of a slow request and keeps whichever answer arrives first.
+
+    Once a request has taken longer than the primary's p95 latency, the same messages are sent to the fallback
+    backend, or to the primary again, which then picks its next least-used key. The slower request is cancelled.
+    Hedges are capped at `budget` of all requests so a provider-wide slowdown cannot double the traffic.
+
+    :param primary: Backend serving every request.
+    :param fallback: Backend receiving the hedged copies, defaults to the primary.
+    :param budget: Maximum fraction of requests that may be hedged.
+    :param quantile: Latency quantile after which a request is hedged.
+    :param min_samples: Latencies needed before hedging starts.
+    """
+
+    # Synchronous calls run on one background event loop, so the losing request can be cancelled
+    _loop: Optional[asyncio.AbstractEventLoop] = None
+    _loop_lock = threading.Lock()
+
+    def __init__(
+            self,
+            primary: Backend,
+            fallback: Backend = None,
+            budget: float = 0.05,
+            quantile: float = 0.95,
+            min_samples: int = 20,
+            verbose: bool = False
+    ):
+        self.primary = primary
+        self.fallback = fallback or primary
+        self.budget = budget
+        self.quantile = quantile
+        self.min_samples = min_samples
+        super().__init__(name="hedged", verbose=verbose)
+        self.model = getattr(primary, "model", None)
+
+        self.hedge_stats = {"requests": 0, "hedges": 0, "hedge_wins": 0, "extra_tokens": 0}
+
+    def _initialize_api_keys(self):
+        """The wrapped backends own their API keys."""
+        self.api_keys = []
+
+    @property
+    def innermost(self) -> Backend:
+        return self.primary.innermost
+
+    @property
+    def temperature(self) -> Optional[float]:
+        """Sampling temperature of the primary's requests."""
+        return getattr(self.innermost, "temperature", None)
+
+    @property
+    def latency_tracker(self) -> LatencyTracker:
+        return get_latency_tracker(self.primary.name, getattr(self.primary, "model", None))
+
+    def _hedge_delay(self) -> Optional[float]:
+        """Seconds to wait before hedging the current request, None if it must not be hedged."""
+        if len(self.latency_tracker) < self.min_samples:
+            return None
+        if self.hedge_stats["hedges"] + 1 > self.budget * self.hedge_stats["requests"]:
+            return None
+        return self.latency_tracker.quantile(self.quantile)
+
+    def _record_latency(self, future: asyncio.Future, started: float):
+        """Records the latency of a primary request that succeeded, cancelled losers and errors would skew it."""
+        if not future.cancelled() and future.exception() is None:
+            self.latency_tracker.record(time.perf_counter() - started)
+
+    async def agenerate(self, messages: List[Dict]) -> str:
+        self.hedge_stats["requests"] += 1
+        started = time.perf_counter()
+        first = asyncio.ensure_future(self.primary.agenerate(messages))
+        first.add_done_callback(lambda fut: self._record_latency(fut, started))
+
+        delay = self._hedge_delay()
+        if delay is None:
+            return await first
+        done, _ = await asyncio.wait({first}, timeout=delay)
+        if done:
+            return first.result()
+
+        self.hedge_stats["hedges"] += 1
+        self.hedge_stats["extra_tokens"] += self.primary._estimate_tokens(messages)
+        self.logger.info(f"Hedging request after {delay:.2f}s")
+        second = asyncio.ensure_future(self.fallback.agenerate(messages))
+
+        pending = {first, second}
+        error = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    for other in pending:
+                        other.cancel()
+                    if task is second:
+                        self.hedge_stats["hedge_wins"] += 1
+                    return task.result()
+                error = task.exception()
+        raise error
+
+    @classmethod
+    def _get_loop(cls) -> asyncio.AbstractEventLoop:
+        with cls._loop_lock:
+            if cls._loop is None:
+                cls._loop = asyncio.new_event_loop()
+                threading.Thread(target=cls._loop.run_forever, daemon=True).start()
+            return cls._loop
+
+    def generate(self, messages: List[Dict]) -> str:
+        return asyncio.run_coroutine_threadsafe(self.agenerate(messages), self._get_loop()).result()
+
+    def get_hedge_stats(self) -> Dict:
+        """Hedge rate, how often the hedge won and the estimated extra tokens spent on hedges."""
+        requests = self.hedge_stats["requests"]
+        return {
+            **self.hedge_stats,
+            "hedge_rate": self.hedge_stats["hedges"] / requests if requests else 0.0,
+            "p95_latency": self.latency_tracker.quantile(0.95),
+        }
+
+    def record_outcome(self, score: float):
+        self.primary.record_outcome(score)
+        if self.fallback is not self.primary:
+            self.fallback.record_outcome(score)
+        self.logger.info(f"Hedging: {self.get_hedge_stats()}")
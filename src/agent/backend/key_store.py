@@ -0,0 +1,194 @@
+from typing import Callable, Dict, List, Optional, Tuple
+from collections import defaultdict
+from datetime import datetime
+import hashlib
+import sqlite3
+import threading
+import time
+
+from src.agent.backend.rate_limiter import RateLimiter, TokenBucket
+
+
+def key_id(key: str) -> str:
+    """Stable identifier for an API key, so the raw key never ends up in a shared file."""
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()[:16]
+
+
+def select_key_shard(keys: List[str], shard_index: int, shard_count: int) -> List[str]:
+    """
+    Return the keys owned by one worker when keys are statically split between `shard_count` workers.
+
+    Keys are dealt round-robin, so workers get disjoint subsets of (almost) equal size.
+    """
+    if shard_count < 1 or not 0 <= shard_index < shard_count:
+        raise ValueError(f"Invalid key shard {shard_index}/{shard_count}")
+    return keys[shard_index::shard_count]
+
+
+def parse_key_shard(value: str) -> Tuple[int, int]:
+    """Parse a shard given as "index/count", e.g. "0/3" for the first of three workers."""
+    try:
+        index, count = value.split("/")
+        return int(index), int(count)
+    except ValueError:
+        raise ValueError(f"Key shard must look like 'index/count', got '{value}'")
+
+
+class KeyStateStore:
+    """
+    Per-key call counts, last call times and rate limit timeouts, kept in memory for this process only.
+    """
+
+    def __init__(self):
+        self._calls: Dict[str, int] = defaultdict(int)
+        self._last_call: Dict[str, datetime] = defaultdict(lambda: datetime.min)
+        self._timeout_until: Dict[str, datetime] = defaultdict(lambda: datetime.min)
+        self._lock = threading.Lock()
+
+    def record_call(self, key: str):
+        with self._lock:
+            self._calls[key] += 1
+            self._last_call[key] = datetime.now()
+
+    def get_calls(self, key: str) -> int:
+        return self._calls[key]
+
+    def get_last_call(self, key: str) -> datetime:
+        return self._last_call[key]
+
+    def set_timeout(self, key: str, until: datetime):
+        with self._lock:
+            self._timeout_until[key] = until
+
+    def get_timeout(self, key: str) -> datetime:
+        return self._timeout_until[key]
+
+    def create_rate_limiter(self, limiter_id: str, requests_per_minute: Optional[int],
+                            tokens_per_minute: Optional[int]) -> RateLimiter:
+        return RateLimiter(requests_per_minute, tokens_per_minute)
+
+
+class SQLiteKeyStateStore(KeyStateStore):
+    """
+    Key state shared by every process pointing at the same SQLite file.
+
+    Each update runs in an IMMEDIATE transaction, so SQLite's file lock serializes writers across processes.
+    Timeouts are stored as absolute times and survive restarts. Keys are stored hashed.
+
+    :param path: Path of the SQLite database file, created if missing.
+    """
+
+    def __init__(self, path: str):
+        super().__init__()
+        self.path = path
+        self.connection = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS key_usage (key_id TEXT PRIMARY KEY, calls INTEGER NOT NULL, last_call REAL)"
+        )
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS key_timeouts (key_id TEXT PRIMARY KEY, timeout_until REAL NOT NULL)"
+        )
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS rate_buckets ("
+            "limiter TEXT, key_id TEXT, kind TEXT, level REAL NOT NULL, updated REAL NOT NULL, "
+            "PRIMARY KEY (limiter, key_id, kind))"
+        )
+
+    def _transaction(self, work: Callable):
+        """Run work(cursor) inside an exclusive write transaction."""
+        with self._lock:
+            cursor = self.connection.cursor()
+            cursor.execute("BEGIN IMMEDIATE")
+            try:
+                result = work(cursor)
+                cursor.execute("COMMIT")
+                return result
+            except Exception:
+                cursor.execute("ROLLBACK")
+                raise
+
+    def _fetch_one(self, query: str, params: tuple):
+        with self._lock:
+            return self.connection.execute(query, params).fetchone()
+
+    def record_call(self, key: str):
+        self._transaction(lambda cursor: cursor.execute(
+            "INSERT INTO key_usage (key_id, calls, last_call) VALUES (?, 1, ?) "
+            "ON CONFLICT(key_id) DO UPDATE SET calls = calls + 1, last_call = excluded.last_call",
+            (key_id(key), time.time())
+        ))
+
+    def get_calls(self, key: str) -> int:
+        row = self._fetch_one("SELECT calls FROM key_usage WHERE key_id = ?", (key_id(key),))
+        return row[0] if row else 0
+
+    def get_last_call(self, key: str) -> datetime:
+        row = self._fetch_one("SELECT last_call FROM key_usage WHERE key_id = ?", (key_id(key),))
+        return datetime.fromtimestamp(row[0]) if row and row[0] else datetime.min
+
+    def set_timeout(self, key: str, until: datetime):
+        self._transaction(lambda cursor: cursor.execute(
+            "INSERT INTO key_timeouts (key_id, timeout_until) VALUES (?, ?) "
+            "ON CONFLICT(key_id) DO UPDATE SET timeout_until = MAX(timeout_until, excluded.timeout_until)",
+            (key_id(key), until.timestamp())
+        ))
+
+    def get_timeout(self, key: str) -> datetime:
+        row = self._fetch_one("SELECT timeout_until FROM key_timeouts WHERE key_id = ?", (key_id(key),))
+        return datetime.fromtimestamp(row[0]) if row else datetime.min
+
+    def update_buckets(self, limiter_id: str, key: str, buckets: Tuple[Optional[TokenBucket], ...],
+                       update: Callable):
+        """
+        Load the stored levels into `buckets`, run update(*buckets, now) and write the levels back, atomically.
+
+        :param buckets: Freshly created (full) buckets, ordered as ("requests", "tokens"), None if unlimited.
+        """
+        kinds = ("requests", "tokens")
+        identifier = key_id(key)
+
+        def work(cursor):
+            now = time.time()
+            rows = cursor.execute(
+                "SELECT kind, level, updated FROM rate_buckets WHERE limiter = ? AND key_id = ?",
+                (limiter_id, identifier)
+            ).fetchall()
+            stored = {kind: (level, updated) for kind, level, updated in rows}
+            for kind, bucket in zip(kinds, buckets):
+                if bucket is not None and kind in stored:
+                    bucket.level, bucket.updated = stored[kind]
+
+            result = update(*buckets, now)
+
+            for kind, bucket in zip(kinds, buckets):
+                if bucket is not None:
+                    cursor.execute(
+                        "INSERT OR REPLACE INTO rate_buckets (limiter, key_id, kind, level, updated) "
+                        "VALUES (?, ?, ?, ?, ?)",
+                        (limiter_id, identifier, kind, bucket.level, bucket.updated)
+                    )
+            return result
+
+        return self._transaction(work)
+
+    def create_rate_limiter(self, limiter_id: str, requests_per_minute: Optional[int],
+                            tokens_per_minute: Optional[int]) -> RateLimiter:
+        return SharedRateLimiter(self, limiter_id, requests_per_minute, tokens_per_minute)
+
+    def close(self):
+        self.connection.close()
+
+
+class SharedRateLimiter(RateLimiter):
+    """A RateLimiter whose buckets live in a SQLiteKeyStateStore, so all processes draw from one budget."""
+
+    def __init__(self, store: SQLiteKeyStateStore, limiter_id: str, requests_per_minute: Optional[int],
+                 tokens_per_minute: Optional[int] = None):
+        # Wall clock time, monotonic clocks are not comparable between processes
+        super().__init__(requests_per_minute, tokens_per_minute, clock=time.time)
+        self.store = store
+        self.limiter_id = limiter_id
+
+    def _with_buckets(self, key: str, update: Callable):
+        return self.store.update_buckets(self.limiter_id, key, self._new_buckets(self.clock()), update)
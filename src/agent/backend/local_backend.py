@@ -1,5 +1,7 @@
 from src.agent.backend.base_backend import Backend
+from src.agent.backend.telemetry import instrumented
 from enum import Enum
+import time
 
 
 class LocalModels(Enum):
@@ -18,26 +20,47 @@ class LocalBackend(Backend):
             name="local",
             api_key_prefix="LOCAL_API_KEY",  # Not really needed but kept for consistency
             rate_limit=1000,  # High limit since it's local
-            min_delay=0.1
+            base_url=base_url
         )
         self.model = model_id
-        self.base_url = base_url
         self.temperature = 0.7
-        self.client = None
 
-    def generate(self, messages):
+    def _create_client(self, api_key: str):
         from openai import OpenAI
+        return OpenAI(base_url=self.base_url, api_key=api_key, http_client=self._create_http_client())
+
+    def _create_async_client(self, api_key: str):
+        from openai import AsyncOpenAI
+        return AsyncOpenAI(base_url=self.base_url, api_key=api_key, http_client=self._create_async_http_client())
+
+    @instrumented
+    def generate(self, messages):
         try:
-            self.client = OpenAI(
-                base_url=self.base_url,
-                api_key="lm-studio"
+            started = time.perf_counter()
+            client = self._get_client("lm-studio")
+
+            response = client.chat.completions.create(
+                messages=self._truncate_messages(messages),
+                model=self.model,
+                temperature=self.temperature,
+                stream=self.stream_responses
             )
+            return self._read_completion(response, started, "lm-studio", self._estimate_tokens(messages))
+        except Exception as e:
+            self.logger.error(f"Local inference error: {str(e)}")
+            raise
 
-            return self.client.chat.completions.create(
+    @instrumented
+    async def agenerate(self, messages):
+        try:
+            started = time.perf_counter()
+            response = await self._get_async_client("lm-studio").chat.completions.create(
                 messages=self._truncate_messages(messages),
                 model=self.model,
-                temperature=self.temperature
-            ).choices[0].message.content
+                temperature=self.temperature,
+                stream=self.stream_responses
+            )
+            return await self._aread_completion(response, started, "lm-studio", self._estimate_tokens(messages))
         except Exception as e:
             self.logger.error(f"Local inference error: {str(e)}")
-            raise
\ No newline at end of file
+            raise
@@ -0,0 +1,242 @@
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple
+import random
+import threading
+import time
+
+from src.agent.backend.base_backend import Backend
+
+
+class CircuitBreaker:
+    """
+    Stops sending requests to a backend that keeps failing.
+
+    Closed: requests pass. After `failure_threshold` consecutive errors the breaker opens and rejects requests.
+    After `reset_timeout` seconds it is half-open and lets a single probe through, which closes it on success
+    and opens it again on failure.
+
+    :param failure_threshold: Consecutive errors that open the breaker.
+    :param reset_timeout: Seconds an open breaker waits before allowing a probe.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 3, reset_timeout: float = 30.0, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return self.CLOSED
+        if self.clock() - self.opened_at >= self.reset_timeout:
+            return self.HALF_OPEN
+        return self.OPEN
+
+    def allow_request(self) -> bool:
+        with self._lock:
+            state = self.state
+            if state == self.CLOSED:
+                return True
+            if state == self.HALF_OPEN and not self.probing:
+                self.probing = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.consecutive_failures = 0
+            self.opened_at = None
+            self.probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.consecutive_failures += 1
+            if self.probing or self.consecutive_failures >= self.failure_threshold:
+                self.opened_at = self.clock()
+            self.probing = False
+
+    def release_probe(self):
+        """Ends a request that neither succeeded nor failed, e.g. cancelled, so the next request may probe."""
+        with self._lock:
+            self.probing = False
+
+
+_breakers: Dict[Tuple[str, Optional[str], Optional[str]], CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_circuit_breaker(provider: str, model: str = None, base_url: str = None, failure_threshold: int = 3,
+                        reset_timeout: float = 30.0) -> CircuitBreaker:
+    """
+    Return the breaker shared by every backend sending requests to this provider, model and base url, so an outage
+    seen by one agent protects the others. The thresholds of the first caller apply.
+    """
+    with _breakers_lock:
+        breaker = _breakers.get((provider, model, base_url))
+        if breaker is None:
+            breaker = _breakers[(provider, model, base_url)] = CircuitBreaker(failure_threshold, reset_timeout)
+        return breaker
+
+
+class MultiBackend(Backend):
+    """
+    Spreads requests over several (provider, model) backends and fails over when one of them is down.
+
+    With strategy "ordered" every request goes to the first healthy backend in the list. With "weighted" the
+    first backend tried is drawn at random, proportionally to its weight divided by its average latency, so
+    faster backends take more of the load. Either way a failing request is retried on the next healthy backend.
+    Each backend has a CircuitBreaker, shared with every MultiBackend using the same provider and model, so an outage
+    costs a few errors in total instead of one per request of every agent.
+
+    :param backends: Backends to use, in order of preference.
+    :param weights: Relative share of requests per backend for the "weighted" strategy, defaults to equal.
+    :param strategy: "ordered" or "weighted".
+    :param failure_threshold: Consecutive errors after which a backend is taken out of rotation.
+    :param reset_timeout: Seconds before a failed backend is probed again.
+    :param call_log_size: Number of most recent calls kept in call_log.
+    """
+
+    def __init__(
+            self,
+            backends: List[Backend],
+            weights: List[float] = None,
+            strategy: str = "ordered",
+            failure_threshold: int = 3,
+            reset_timeout: float = 30.0,
+            call_log_size: int = 1000,
+            verbose: bool = False
+    ):
+        if not backends:
+            raise ValueError("MultiBackend needs at least one backend")
+        if strategy not in ("ordered", "weighted"):
+            raise ValueError(f"Unknown strategy '{strategy}', use 'ordered' or 'weighted'")
+        if weights is not None and len(weights) != len(backends):
+            raise ValueError("Need one weight per backend")
+
+        self.backends = backends
+        self.weights = weights or [1.0] * len(backends)
+        self.strategy = strategy
+        super().__init__(name="multi", verbose=verbose)
+        self.model = getattr(backends[0], "model", None)
+
+        self.breakers = [
+            get_circuit_breaker(backend.name, getattr(backend, "model", None), getattr(backend, "base_url", None),
+                                failure_threshold, reset_timeout)
+            for backend in backends
+        ]
+        self.backend_stats = [{"calls": 0, "failures": 0, "latency": 0.0} for _ in backends]
+        # Label of the backend that answered the last call, and of the most recent calls
+        self.last_backend: Optional[str] = None
+        self.call_log: Deque[str] = deque(maxlen=call_log_size)
+
+    def _initialize_api_keys(self):
+        """The wrapped backends own their API keys."""
+        self.api_keys = []
+
+    @property
+    def innermost(self) -> Backend:
+        return self.backends[0].innermost
+
+    @property
+    def temperature(self) -> Optional[float]:
+        """Sampling temperature of the first backend's requests."""
+        return getattr(self.innermost, "temperature", None)
+
+    def backend_label(self, index: int) -> str:
+        backend = self.backends[index]
+        return f"{backend.name}:{getattr(backend, 'model', '')}"
+
+    def _average_latency(self, index: int) -> float:
+        stats = self.backend_stats[index]
+        successes = stats["calls"] - stats["failures"]
+        return stats["latency"] / successes if successes else 1.0
+
+    def _candidate_order(self) -> List[int]:
+        """Indices of the backends in the order they should be tried for the next request."""
+        order = list(range(len(self.backends)))
+        if self.strategy == "weighted":
+            scores = [self.weights[i] / max(self._average_latency(i), 1e-3) for i in order]
+            first = random.choices(order, weights=scores)[0]
+            order.remove(first)
+            order.sort(key=lambda i: scores[i], reverse=True)
+            order.insert(0, first)
+        return order
+
+    def _record(self, index: int, latency: float, error: Exception = None):
+        stats = self.backend_stats[index]
+        stats["calls"] += 1
+        if error is None:
+            stats["latency"] += latency
+            self.breakers[index].record_success()
+            self.last_backend = self.backend_label(index)
+            self.call_log.append(self.last_backend)
+        else:
+            stats["failures"] += 1
+            self.breakers[index].record_failure()
+            self.logger.warning(f"{self.backend_label(index)} failed, failing over: {error}")
+
+    def generate(self, messages: List[Dict]) -> str:
+        last_error = None
+        for index in self._candidate_order():
+            if not self.breakers[index].allow_request():
+                continue
+            start = time.perf_counter()
+            try:
+                response = self.backends[index].generate(messages)
+            except Exception as e:
+                self._record(index, time.perf_counter() - start, e)
+                last_error = e
+                continue
+            except BaseException:
+                # Cancelled, e.g. the losing request of a hedge, the breaker must not wait for its probe forever
+                self.breakers[index].release_probe()
+                raise
+            self._record(index, time.perf_counter() - start)
+            return response
+        raise RuntimeError("No healthy backend available") from last_error
+
+    async def agenerate(self, messages: List[Dict]) -> str:
+        last_error = None
+        for index in self._candidate_order():
+            if not self.breakers[index].allow_request():
+                continue
+            start = time.perf_counter()
+            try:
+                response = await self.backends[index].agenerate(messages)
+            except Exception as e:
+                self._record(index, time.perf_counter() - start, e)
+                last_error = e
+                continue
+            except BaseException:
+                # Cancelled, e.g. the losing request of a hedge, the breaker must not wait for its probe forever
+                self.breakers[index].release_probe()
+                raise
+            self._record(index, time.perf_counter() - start)
+            return response
+        raise RuntimeError("No healthy backend available") from last_error
+
+    def get_backend_stats(self) -> Dict[str, Dict]:
+        """Calls, failures, breaker state and mean latency per backend."""
+        return {
+            self.backend_label(i): {
+                "calls": stats["calls"],
+                "failures": stats["failures"],
+                "state": self.breakers[i].state,
+                "avg_latency": self._average_latency(i) if stats["calls"] > stats["failures"] else None,
+            }
+            for i, stats in enumerate(self.backend_stats)
+        }
+
+    def record_outcome(self, score: float):
+        for backend in self.backends:
+            backend.record_outcome(score)
+        for name, stats in self.get_backend_stats().items():
+            self.logger.info(f"{name}: {stats}")
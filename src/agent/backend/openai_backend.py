@@ -1,33 +1,70 @@
+import time
+
 from src.agent.backend.base_backend import Backend
+from src.agent.backend.telemetry import instrumented
 
 
 class OpenAIBackend(Backend):
-    def __init__(self, model_id: str = "gpt-3.5-turbo"):
+    def __init__(self, model_id: str = "gpt-3.5-turbo", base_url: str = None):
         super().__init__(
             name="openai",
             api_key_prefix="OPENAI_API_KEY",
             rate_limit=3500,  # RPM for most models
-            min_delay=0.05,   # 50ms between requests
-            history_length=10
+            history_length=10,
+            base_url=base_url
         )
         self.model = model_id
         self.temperature = 0.9
-        self.client = None
 
-    def generate(self, messages):
+    def _create_client(self, api_key: str):
         from openai import OpenAI
-        api_key = self._get_next_api_key()
-        self._respect_rate_limit(api_key)
-        self._update_api_call_stats(api_key)
+        return OpenAI(api_key=api_key, base_url=self.base_url, http_client=self._create_http_client())
+
+    def _create_async_client(self, api_key: str):
+        from openai import AsyncOpenAI
+        return AsyncOpenAI(api_key=api_key, base_url=self.base_url, http_client=self._create_async_http_client())
+
+    @instrumented
+    def generate(self, messages):
+        estimated_tokens = self._estimate_tokens(messages)
+        api_key = self._acquire_api_key(estimated_tokens)
+
+        try:
+            started = time.perf_counter()
+            client = self._get_client(api_key)
+            return self._controlled_request(
+                lambda: client.chat.completions.with_raw_response.create(
+                    messages=self._truncate_messages(messages),
+                    model=self.model,
+                    temperature=self.temperature,
+                    stream=self.stream_responses
+                ),
+                consume=lambda response: self._read_completion(response, started, api_key, estimated_tokens)
+            )
+        except Exception as e:
+            if "429" in str(e):
+                self.logger.error(f"Rate limit (429) hit for {self.api_key_prefix}")
+            raise
+
+    @instrumented
+    async def agenerate(self, messages):
+        estimated_tokens = self._estimate_tokens(messages)
+        api_key = await self._aacquire_api_key(estimated_tokens)
 
         try:
-            self.client = OpenAI(api_key=api_key)
-            return self.client.chat.completions.create(
-                messages=self._truncate_messages(messages),
-                model=self.model,
-                temperature=self.temperature
-            ).choices[0].message.content
+            started = time.perf_counter()
+            client = self._get_async_client(api_key)
+            async with self._key_semaphore(api_key):
+                return await self._acontrolled_request(
+                    lambda: client.chat.completions.with_raw_response.create(
+                        messages=self._truncate_messages(messages),
+                        model=self.model,
+                        temperature=self.temperature,
+                        stream=self.stream_responses
+                    ),
+                    consume=lambda response: self._aread_completion(response, started, api_key, estimated_tokens)
+                )
         except Exception as e:
             if "429" in str(e):
                 self.logger.error(f"Rate limit (429) hit for {self.api_key_prefix}")
-            raise
\ No newline at end of file
+            raise
@@ -0,0 +1,163 @@
+from typing import Callable, Dict, Optional, Tuple
+import threading
+import time
+
+# (requests per minute, tokens per minute) per provider and model, None means unlimited.
+# Groq numbers are the free tier limits, which apply per model and API key.
+RATE_LIMITS: Dict[str, Dict[str, Tuple[Optional[int], Optional[int]]]] = {
+    "groq": {
+        "default": (30, 6000),
+        "llama-3.1-8b-instant": (30, 20000),
+        "llama-3.1-70b-versatile": (30, 6000),
+        "llama-3.2-90b-vision-preview": (15, 7000),
+        "gemma-7b-it": (30, 15000),
+    },
+    "together": {
+        "default": (600, 180000),
+    },
+    "openai": {
+        "default": (3500, 90000),
+    },
+    "cohere": {
+        "default": (20, None),
+    },
+    "local": {
+        "default": (None, None),
+    },
+}
+
+
+class TokenBucket:
+    """
+    A bucket holding up to `capacity` units that refills continuously at `refill_rate` units per second.
+
+    Reservations are taken immediately and may push the level below zero, later callers then wait for the debt
+    to refill. This keeps reserve() non-blocking, so the same bucket serves threads and coroutines.
+    """
+
+    def __init__(self, capacity: float, refill_rate: float, now: float):
+        self.capacity = capacity
+        self.refill_rate = refill_rate
+        self.level = capacity
+        self.updated = now
+
+    def _refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.refill_rate)
+        self.updated = now
+
+    def reserve(self, amount: float, now: float) -> float:
+        """Take `amount` units and return the seconds until they are actually available."""
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        wait = max(0.0, (amount - self.level) / self.refill_rate)
+        self.level -= amount
+        return wait
+
+    def adjust(self, amount: float, now: float):
+        """Take (positive) or give back (negative) units after the fact, e.g. once real token usage is known."""
+        self._refill(now)
+        self.level = min(self.capacity, self.level - amount)
+
+
+class RateLimiter:
+    """
+    Per-key request and token budgets for one provider/model.
+
+    :param requests_per_minute: Requests allowed per key per minute, None for no limit.
+    :param tokens_per_minute: Prompt plus completion tokens allowed per key per minute, None for no limit.
+    :param clock: Monotonic clock in seconds, replaceable in tests.
+    """
+
+    def __init__(
+            self,
+            requests_per_minute: Optional[int],
+            tokens_per_minute: Optional[int] = None,
+            clock: Callable[[], float] = time.monotonic
+    ):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.clock = clock
+        self._buckets: Dict[str, Tuple[Optional[TokenBucket], Optional[TokenBucket]]] = {}
+        self._lock = threading.Lock()
+
+    def _new_buckets(self, now: float) -> Tuple[Optional[TokenBucket], Optional[TokenBucket]]:
+        request_bucket = token_bucket = None
+        if self.requests_per_minute:
+            request_bucket = TokenBucket(self.requests_per_minute, self.requests_per_minute / 60, now)
+        if self.tokens_per_minute:
+            token_bucket = TokenBucket(self.tokens_per_minute, self.tokens_per_minute / 60, now)
+        return request_bucket, token_bucket
+
+    def _with_buckets(self, key: str, update: Callable):
+        """
+        Run update(request_bucket, token_bucket, now) atomically on the key's buckets and return its result.
+
+        Subclasses keeping the buckets elsewhere (e.g. shared between processes) override this.
+        """
+        with self._lock:
+            now = self.clock()
+            buckets = self._buckets.get(key)
+            if buckets is None:
+                buckets = self._buckets[key] = self._new_buckets(now)
+            return update(*buckets, now)
+
+    def reserve(self, key: str, estimated_tokens: int = 0) -> float:
+        """
+        Reserve one request and `estimated_tokens` tokens for the key.
+
+        :return: Seconds the caller has to wait before sending the request.
+        """
+        def take(request_bucket, token_bucket, now):
+            wait = 0.0
+            if request_bucket is not None:
+                wait = max(wait, request_bucket.reserve(1, now))
+            if token_bucket is not None and estimated_tokens:
+                wait = max(wait, token_bucket.reserve(estimated_tokens, now))
+            return wait
+
+        return self._with_buckets(key, take)
+
+    def record_tokens(self, key: str, estimated_tokens: int, actual_tokens: int):
+        """Correct a reservation once the provider reports how many tokens the call really used."""
+        def correct(request_bucket, token_bucket, now):
+            if token_bucket is not None:
+                token_bucket.adjust(actual_tokens - estimated_tokens, now)
+
+        self._with_buckets(key, correct)
+
+
+_limiters: Dict[Tuple[str, str], RateLimiter] = {}
+_limiters_lock = threading.Lock()
+_shared_store = None
+
+
+def use_shared_store(store):
+    """
+    Keep the bucket state of every limiter created from now on in `store` (see key_store.SQLiteKeyStateStore),
+    so several processes using the same keys share one budget. Pass None to go back to per-process limiters.
+    """
+    global _shared_store
+    with _limiters_lock:
+        _shared_store = store
+        _limiters.clear()
+
+
+def get_rate_limiter(provider: str, model: str = None, default_requests_per_minute: int = None) -> RateLimiter:
+    """
+    Return the shared limiter for a provider/model, created from RATE_LIMITS on first use.
+
+    :param default_requests_per_minute: Used when the provider has no configured limits.
+    """
+    with _limiters_lock:
+        limiter = _limiters.get((provider, model))
+        if limiter is None:
+            provider_limits = RATE_LIMITS.get(provider, {})
+            requests_per_minute, tokens_per_minute = provider_limits.get(
+                model, provider_limits.get("default", (default_requests_per_minute, None))
+            )
+            if _shared_store is not None:
+                limiter = _shared_store.create_rate_limiter(f"{provider}:{model}", requests_per_minute, tokens_per_minute)
+            else:
+                limiter = RateLimiter(requests_per_minute, tokens_per_minute)
+            _limiters[(provider, model)] = limiter
+        return limiter
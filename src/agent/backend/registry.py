@@ -0,0 +1,29 @@
+from typing import Dict, Tuple, Type
+import importlib
+
+# Module and class of each provider's backend, by Provider name. A backend module imports its provider's SDK,
+# so it is only imported once a provider is actually used.
+BACKEND_CLASSES: Dict[str, Tuple[str, str]] = {
+    "GROQ": ("src.agent.backend.groq_backend", "GroqBackend"),
+    "TOGETHER": ("src.agent.backend.togetherai_backend", "TogetherBackend"),
+    "LOCAL": ("src.agent.backend.local_backend", "LocalBackend"),
+    "cohere": ("src.agent.backend.cohere_backend", "CohereBackend"),
+    "openai": ("src.agent.backend.openai_backend", "OpenAIBackend"),
+}
+
+_loaded: Dict[str, Type] = {}
+
+
+def get_backend_class(name: str) -> Type:
+    """
+    The backend class of a provider, importing its module on first use.
+
+    :param name: Provider name, e.g. Provider.GROQ.name.
+    :return: The Backend subclass.
+    """
+    if name not in _loaded:
+        if name not in BACKEND_CLASSES:
+            raise KeyError(f"No backend for provider '{name}', use one of {list(BACKEND_CLASSES)}")
+        module_name, class_name = BACKEND_CLASSES[name]
+        _loaded[name] = getattr(importlib.import_module(module_name), class_name)
+    return _loaded[name]
@@ -0,0 +1,109 @@
+from typing import Callable, Dict, List, Optional
+from collections import defaultdict
+import time
+
+from src.agent.backend.base_backend import Backend
+
+
+class RouterBackend(Backend):
+    """
+    Cascading router in front of a list of backends ordered from cheapest to most capable.
+
+    Every turn goes to the first tier. If the validator rejects the response (it returns a reason string),
+    the same messages are sent to the next tier. The last tier's response is always accepted.
+    """
+
+    def __init__(
+            self,
+            tiers: List[Backend],
+            validator: Callable[[str], Optional[str]] = None,
+            verbose: bool = False
+    ):
+        if not tiers:
+            raise ValueError("RouterBackend needs at least one tier")
+
+        self.tiers = tiers
+        self.validator = validator
+        super().__init__(name="router", verbose=verbose)
+
+        self.tier_stats = [
+            {
+                "calls": 0,
+                "accepted": 0,
+                "escalations": 0,
+                "latency": 0.0,
+                "scores": [],
+                "escalation_reasons": defaultdict(int),
+            }
+            for _ in self.tiers
+        ]
+        self.last_tier = None
+        self._tiers_used = set()
+
+    def _initialize_api_keys(self):
+        """The tiers own their API keys, the router does not need any."""
+        self.api_keys = []
+
+    def tier_name(self, level: int) -> str:
+        backend = self.tiers[level]
+        return f"{backend.name}:{getattr(backend, 'model', '')}"
+
+    def _accept(self, level: int, response: str, latency: float) -> bool:
+        """Record a tier's answer and decide whether it is accepted or escalated."""
+        stats = self.tier_stats[level]
+        stats["latency"] += latency
+        stats["calls"] += 1
+        self._tiers_used.add(level)
+
+        reason = None
+        if self.validator is not None and level < len(self.tiers) - 1:
+            reason = self.validator(response)
+
+        if reason is None:
+            stats["accepted"] += 1
+            self.last_tier = level
+            return True
+
+        stats["escalations"] += 1
+        stats["escalation_reasons"][reason] += 1
+        self.logger.info(f"Escalating from {self.tier_name(level)} to {self.tier_name(level + 1)}: {reason}")
+        return False
+
+    def generate(self, messages: List[Dict]) -> str:
+        for level, backend in enumerate(self.tiers):
+            start = time.perf_counter()
+            response = backend.generate(messages)
+            if self._accept(level, response, time.perf_counter() - start):
+                return response
+
+    async def agenerate(self, messages: List[Dict]) -> str:
+        for level, backend in enumerate(self.tiers):
+            start = time.perf_counter()
+            response = await backend.agenerate(messages)
+            if self._accept(level, response, time.perf_counter() - start):
+                return response
+
+    def record_outcome(self, score: float):
+        """Attribute the final simulation score to every tier that answered a turn during it."""
+        for level in self._tiers_used:
+            self.tier_stats[level]["scores"].append(score)
+        self._tiers_used = set()
+
+        for name, stats in self.get_tier_stats().items():
+            self.logger.info(f"{name}: {stats}")
+
+    def get_tier_stats(self) -> Dict[str, Dict]:
+        """Escalation rate, mean latency and mean simulation score per tier."""
+        summary = {}
+        for level, stats in enumerate(self.tier_stats):
+            calls = stats["calls"]
+            scores = stats["scores"]
+            summary[self.tier_name(level)] = {
+                "calls": calls,
+                "accepted": stats["accepted"],
+                "escalation_rate": stats["escalations"] / calls if calls else 0.0,
+                "avg_latency": stats["latency"] / calls if calls else 0.0,
+                "avg_score": sum(scores) / len(scores) if scores else None,
+                "escalation_reasons": dict(stats["escalation_reasons"]),
+            }
+        return summary
@@ -0,0 +1,180 @@
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+import asyncio
+import hashlib
+import json
+import threading
+
+from src.agent.backend.base_backend import Backend
+
+
+def request_fingerprint(provider: str, model: str, temperature: float, messages: List[Dict]) -> str:
+    """Hash of everything that determines a completion request."""
+    payload = json.dumps([provider, model, temperature, messages], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+# Result of a shared async call whose leader was cancelled, its waiters run the call again
+_LEADER_CANCELLED = object()
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Makes concurrent calls with the same key share one execution.
+
+    The first caller of a key runs the function, callers arriving while it is in flight wait for its result
+    (or exception) instead of running it again. Once the call has finished the key is forgotten, so results are
+    never cached beyond the calls that overlapped.
+    """
+
+    def __init__(self):
+        self._calls: Dict[str, _Call] = {}
+        self._async_calls: Dict[Tuple[int, str], asyncio.Future] = {}
+        self._lock = threading.Lock()
+        self.stats = {"calls": 0, "executions": 0, "coalesced": 0}
+
+    def do(self, key: str, function: Callable[[], Any]) -> Any:
+        with self._lock:
+            self.stats["calls"] += 1
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.stats["executions"] += 1
+            else:
+                self.stats["coalesced"] += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = function()
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    async def ado(self, key: str, function: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Async version of do, calls are shared between tasks of the same event loop. When the task running the call
+        is cancelled, e.g. it lost a hedge, a waiting task runs it instead of the waiters being cancelled too.
+        """
+        loop = asyncio.get_running_loop()
+        loop_key = (id(loop), key)
+        retry = False
+        while True:
+            with self._lock:
+                if not retry:
+                    self.stats["calls"] += 1
+                future = self._async_calls.get(loop_key)
+                leader = future is None
+                if leader:
+                    future = self._async_calls[loop_key] = loop.create_future()
+                    self.stats["executions"] += 1
+                    if retry:
+                        self.stats["coalesced"] -= 1
+                elif not retry:
+                    self.stats["coalesced"] += 1
+
+            if not leader:
+                # shield, a cancelled waiter must not cancel the shared call
+                result = await asyncio.shield(future)
+                if result is _LEADER_CANCELLED:
+                    retry = True
+                    continue
+                return result
+
+            try:
+                result = await function()
+                future.set_result(result)
+                return result
+            except asyncio.CancelledError:
+                future.set_result(_LEADER_CANCELLED)
+                raise
+            except BaseException as e:
+                future.set_exception(e)
+                future.exception()  # mark retrieved when nobody else was waiting
+                raise
+            finally:
+                with self._lock:
+                    del self._async_calls[loop_key]
+
+
+_default_group = SingleFlight()
+
+
+class SingleFlightBackend(Backend):
+    """
+    Coalesces concurrent identical requests (same provider, model, temperature and messages), across every agent,
+    into one provider call whose answer all of them receive.
+
+    Sampled requests (temperature above 0) are only coalesced with `coalesce_sampled`, since identical prompts
+    would otherwise get independent samples.
+
+    :param backend: Backend doing the actual calls.
+    :param group: SingleFlight shared by the backends whose requests may be coalesced, defaults to a global one.
+    :param coalesce_sampled: Also coalesce requests with a non-zero temperature.
+    """
+
+    def __init__(self, backend: Backend, group: SingleFlight = None, coalesce_sampled: bool = False,
+                 verbose: bool = False):
+        self.backend = backend
+        self.group = group or _default_group
+        self.coalesce_sampled = coalesce_sampled
+        super().__init__(name="single_flight", verbose=verbose)
+        self.model = getattr(backend, "model", None)
+
+    def _initialize_api_keys(self):
+        """The wrapped backend owns the API keys."""
+        self.api_keys = []
+
+    @property
+    def innermost(self) -> Backend:
+        return self.backend.innermost
+
+    @property
+    def temperature(self) -> Optional[float]:
+        return getattr(self.innermost, "temperature", None)
+
+    def _fingerprint(self, messages: List[Dict]):
+        """The request's fingerprint, None when it must not be coalesced."""
+        # Hedged and multi backends only wrap the backend whose provider, model and temperature make the request
+        backend = self.innermost
+        temperature = getattr(backend, "temperature", None)
+        if temperature and not self.coalesce_sampled:
+            return None
+        return request_fingerprint(backend.name, getattr(backend, "model", None), temperature,
+                                   backend._truncate_messages(messages))
+
+    def generate(self, messages: List[Dict]) -> str:
+        fingerprint = self._fingerprint(messages)
+        if fingerprint is None:
+            return self.backend.generate(messages)
+        return self.group.do(fingerprint, lambda: self.backend.generate(messages))
+
+    async def agenerate(self, messages: List[Dict]) -> str:
+        fingerprint = self._fingerprint(messages)
+        if fingerprint is None:
+            return await self.backend.agenerate(messages)
+        return await self.group.ado(fingerprint, lambda: self.backend.agenerate(messages))
+
+    def get_coalescing_stats(self) -> Dict[str, int]:
+        """Requests seen, provider calls made and requests served by another request's call, for the group."""
+        return dict(self.group.stats)
+
+    def record_outcome(self, score: float):
+        self.backend.record_outcome(score)
+        self.logger.info(f"Request coalescing: {self.get_coalescing_stats()}")
@@ -0,0 +1,195 @@
+"""
+Per-call LLM telemetry.
+
+Every provider call made through a backend method decorated with `instrumented` produces one record with the time
+spent waiting for a key, for the rate limiter and for a concurrency slot, the request latency, time to first
+token, token counts, the (hashed) key used and the number of retries. The record of the call in progress is kept in
+a context variable, so concurrent calls on threads or asyncio tasks never mix up their numbers.
+
+Records are tagged with the turn they were made for (see TelemetryCollector.collect), so concurrent agents each get
+the calls of their own turn. The collector keeps only the most recent records for its summary.
+"""
+from typing import Any, Dict, Hashable, Iterator, List, Optional
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+import asyncio
+import functools
+import threading
+import time
+
+TIMING_FIELDS = ("queue_wait", "key_wait", "rate_limit_wait", "latency", "time_to_first_token", "time_to_action",
+                 "total_time")
+
+_current_call: ContextVar[Optional[Dict[str, Any]]] = ContextVar("llm_call", default=None)
+_current_turn: ContextVar[Optional[Hashable]] = ContextVar("llm_turn", default=None)
+
+
+def current_call() -> Optional[Dict[str, Any]]:
+    """The record of the call running in this thread or task, None outside of an instrumented call."""
+    return _current_call.get()
+
+
+def add_time(field: str, seconds: float):
+    record = _current_call.get()
+    if record is not None:
+        record[field] = record.get(field, 0.0) + seconds
+
+
+def set_fields(**fields):
+    record = _current_call.get()
+    if record is not None:
+        record.update(fields)
+
+
+def increment(field: str):
+    record = _current_call.get()
+    if record is not None:
+        record[field] = record.get(field, 0) + 1
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    """Nearest-rank percentile, q between 0 and 100."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(q / 100 * len(ordered))) - 1))]
+
+
+class TelemetryCollector:
+    """
+    Keeps the records of the most recent calls in memory and summarizes them per provider/model.
+
+    :param max_records: Number of most recent records kept for the summary.
+    """
+
+    def __init__(self, max_records: int = 10000):
+        self.records = deque(maxlen=max_records)
+        self._turns: Dict[Hashable, List[Dict[str, Any]]] = {}
+        self._lock = threading.Lock()
+
+    def add(self, record: Dict[str, Any]):
+        with self._lock:
+            self.records.append(record)
+            calls = self._turns.get(record.get("turn"))
+            if calls is not None:
+                calls.append(record)
+
+    @contextmanager
+    def collect(self, turn_id: Hashable) -> Iterator[List[Dict[str, Any]]]:
+        """
+        Tags the calls made in this context with turn_id and gathers their records.
+
+        :param turn_id: Identifies the turn among the turns collected at the same time, e.g. (sim_id, episode, agent).
+        :return: The list the records of the turn's calls are appended to as they finish.
+        """
+        calls: List[Dict[str, Any]] = []
+        with self._lock:
+            self._turns[turn_id] = calls
+        token = _current_turn.set(turn_id)
+        try:
+            yield calls
+        finally:
+            _current_turn.reset(token)
+            with self._lock:
+                self._turns.pop(turn_id, None)
+
+    def reset(self):
+        with self._lock:
+            self.records.clear()
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        """p50/p95/p99 of every timing and token count, per "provider:model"."""
+        groups: Dict[str, List[Dict[str, Any]]] = {}
+        with self._lock:
+            for record in self.records:
+                groups.setdefault(f"{record['provider']}:{record['model']}", []).append(record)
+
+        summary = {}
+        for name, records in groups.items():
+            stats = {
+                "calls": len(records),
+                "errors": sum(1 for r in records if r.get("error")),
+                "retries": sum(r.get("retries", 0) for r in records),
+                "prompt_tokens": sum(r.get("prompt_tokens") or 0 for r in records),
+                "completion_tokens": sum(r.get("completion_tokens") or 0 for r in records),
+            }
+            for field in TIMING_FIELDS + ("prompt_tokens", "completion_tokens"):
+                values = [r[field] for r in records if r.get(field) is not None]
+                stats[field] = {f"p{q}": percentile(values, q) for q in (50, 95, 99)}
+            summary[name] = stats
+        return summary
+
+
+_collector = TelemetryCollector()
+
+
+def get_collector() -> TelemetryCollector:
+    return _collector
+
+
+def _new_record(backend) -> Dict[str, Any]:
+    return {
+        "provider": backend.name,
+        "model": getattr(backend, "model", None),
+        "key_id": None,
+        "queue_wait": 0.0,
+        "key_wait": 0.0,
+        "rate_limit_wait": 0.0,
+        "latency": None,
+        "time_to_first_token": None,
+        "time_to_action": None,
+        "total_time": None,
+        "prompt_tokens": None,
+        "completion_tokens": None,
+        "retries": 0,
+        "streamed": False,
+        "error": None,
+        "timestamp": time.time(),
+        "turn": _current_turn.get(),
+    }
+
+
+def _finish_record(record: Dict[str, Any], start: float):
+    record["total_time"] = time.perf_counter() - start
+    record.pop("sent_at", None)
+    if record["time_to_first_token"] is None and not record["streamed"]:
+        # Without streaming the first token arrives with the whole response
+        record["time_to_first_token"] = record["latency"]
+    if record["time_to_action"] is None and not record["streamed"]:
+        record["time_to_action"] = record["latency"]
+    _collector.add(record)
+
+
+def instrumented(method):
+    """Record telemetry for a backend's generate or agenerate."""
+    if asyncio.iscoroutinefunction(method):
+        @functools.wraps(method)
+        async def async_wrapper(self, messages, *args, **kwargs):
+            record = _new_record(self)
+            token = _current_call.set(record)
+            start = time.perf_counter()
+            try:
+                return await method(self, messages, *args, **kwargs)
+            except BaseException as e:
+                record["error"] = type(e).__name__
+                raise
+            finally:
+                _current_call.reset(token)
+                _finish_record(record, start)
+        return async_wrapper
+
+    @functools.wraps(method)
+    def wrapper(self, messages, *args, **kwargs):
+        record = _new_record(self)
+        token = _current_call.set(record)
+        start = time.perf_counter()
+        try:
+            return method(self, messages, *args, **kwargs)
+        except BaseException as e:
+            record["error"] = type(e).__name__
+            raise
+        finally:
+            _current_call.reset(token)
+            _finish_record(record, start)
+    return wrapper
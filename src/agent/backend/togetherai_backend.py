@@ -1,35 +1,73 @@
+import time
+
 from src.agent.backend.base_backend import Backend
+from src.agent.backend.telemetry import instrumented
 
 
 class TogetherBackend(Backend):
-    def __init__(self, model_id: str = "mistralai/Mixtral-8x7B-Instruct-v0.1"):
+    def __init__(self, model_id: str = "mistralai/Mixtral-8x7B-Instruct-v0.1", base_url: str = None):
         super().__init__(
             name="together",
             api_key_prefix="TOGETHER_API_KEY",
             rate_limit=1000,
-            min_delay=1,
-            history_length=7
+            history_length=7,
+            base_url=base_url
         )
         self.model = model_id
         self.temperature = 0.9
-        self.client = None
 
-    def generate(self, messages):
+    def _create_client(self, api_key: str):
+        # The Together SDK keeps its own requests session, reusing the client reuses its connections
         from together import Together
-        api_key = self._get_next_api_key()
-        self._respect_rate_limit(api_key)
-        self._update_api_call_stats(api_key)
+        return Together(api_key=api_key, base_url=self.base_url)
+
+    def _create_async_client(self, api_key: str):
+        from together import AsyncTogether
+        return AsyncTogether(api_key=api_key, base_url=self.base_url)
+
+    @instrumented
+    def generate(self, messages):
+        estimated_tokens = self._estimate_tokens(messages)
+        api_key = self._acquire_api_key(estimated_tokens)
 
         try:
-            self.client = Together(api_key=api_key)
-            return self.client.chat.completions.create(
-                messages=self._truncate_messages(messages),
-                model=self.model,
-                temperature=self.temperature,
-                max_tokens=1024
-            ).choices[0].message.content
+            started = time.perf_counter()
+            client = self._get_client(api_key)
+            return self._controlled_request(
+                lambda: client.chat.completions.create(
+                    messages=self._truncate_messages(messages),
+                    model=self.model,
+                    temperature=self.temperature,
+                    max_tokens=1024,
+                    stream=self.stream_responses
+                ),
+                consume=lambda response: self._read_completion(response, started, api_key, estimated_tokens)
+            )
         except Exception as e:
             if "429" in str(e):
                 self.logger.error(f"Rate limit (429) hit for {self.api_key_prefix}")
             raise
 
+    @instrumented
+    async def agenerate(self, messages):
+        estimated_tokens = self._estimate_tokens(messages)
+        api_key = await self._aacquire_api_key(estimated_tokens)
+
+        try:
+            started = time.perf_counter()
+            client = self._get_async_client(api_key)
+            async with self._key_semaphore(api_key):
+                return await self._acontrolled_request(
+                    lambda: client.chat.completions.create(
+                        messages=self._truncate_messages(messages),
+                        model=self.model,
+                        temperature=self.temperature,
+                        max_tokens=1024,
+                        stream=self.stream_responses
+                    ),
+                    consume=lambda response: self._aread_completion(response, started, api_key, estimated_tokens)
+                )
+        except Exception as e:
+            if "429" in str(e):
+                self.logger.error(f"Rate limit (429) hit for {self.api_key_prefix}")
+            raise
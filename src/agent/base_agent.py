@@ -1,13 +1,14 @@
-from typing import List, Dict, Tuple
-from src.agent.backend.groq_backend import GroqBackend
-from src.utils.output_parsing import extract_json_from_string
-from src.agent.actions import format_actions, Action
-from src.agent.backend.cohere_backend import CohereBackend
-from src.agent.backend.togetherai_backend import TogetherBackend
-from src.agent.backend.openai_backend import OpenAIBackend
+from typing import Callable, List, Dict, Optional, Tuple
+from src.utils.output_parsing import ActionDecision, extract_json_from_string
+from src.agent.actions import format_actions, parse_position_parameters, Action
 from src.agent.backend import Provider
-from src.agent.backend.local_backend import LocalBackend
-from src.agent.prompts import PromptTemplate
+from src.agent.backend.base_backend import listen_for_action
+from src.agent.backend.registry import get_backend_class
+from src.agent.backend.router_backend import RouterBackend
+from src.agent.backend.hedged_backend import HedgedBackend
+from src.agent.backend.multi_backend import MultiBackend
+from src.agent.backend.single_flight import SingleFlightBackend
+from src.agent.prompts import PromptTemplate, minify_prompt
 
 DEFAULT_SYSTEM_PROMPT = """[ Introduction ]
 You are an intelligent Agent in a novel simulated gridworld environment. Your goal is to reach a score of 100 by the end of the simulation (you have a limited amount of episodes to complete the objective). 
@@ -62,6 +63,12 @@ Here is an example of the expected format:
 
 Remember, you must always output a JSON response following this structure."""
 
+# Variables whose values are prompt text, minified along with the templates
+MINIFIED_VARIABLES = ("goal", "actions")
+
+# Stands in for the goal in the user prompt when it is already in the system prompt
+GOAL_REFERENCE = "(see the goal in the system prompt)"
+
 DEFAULT_USER_PROMPT = """
 [observation]
 
@@ -99,16 +106,25 @@ class Agent:
             enforce_json_output: bool = False,
             backend_provider: Provider = Provider.GROQ,
             backend_model: str = "llama3-70b-8192",
+            escalation_provider: Provider = None,
+            escalation_model: str = None,
+            hedge_budget: float = None,
+            fallback_models: List[Tuple[Provider, str]] = None,
+            coalesce_requests: bool = False,
+            minify_prompts: bool = False,
             debug: bool = False,
     ):
         self.id = agent_id
         self.name = name
         self.action_space = action_space
+        # Checked for every decision, computed once per action space
+        self.action_names = frozenset(action.name for action in action_space)
         self.variables = variables
         self.enforce_json_output = enforce_json_output
         self.position = start_position
         self.color = color
         self.debug = debug
+        self.minify_prompts = minify_prompts
 
         self.messages = []
 
@@ -126,26 +142,53 @@ class Agent:
 
         if backend_provider not in valid_backends:
             raise KeyError(f"Must use one of {valid_backends} as backend")
+        if escalation_provider is not None and escalation_provider not in valid_backends:
+            raise KeyError(f"Must use one of {valid_backends} as escalation backend")
+        for fallback_provider, _ in fallback_models or []:
+            if fallback_provider not in valid_backends:
+                raise KeyError(f"Must use one of {valid_backends} as fallback backend")
         try:
             self.backend_model = backend_model.value
         except:
             self.backend_model = backend_model
 
-        self.backend_map = {
-            "GROQ": GroqBackend,
-            "cohere": CohereBackend,
-            "TOGETHER": TogetherBackend,
-            "openai": OpenAIBackend,
-            "LOCAL": LocalBackend
-        }
-
-        self.backend = self.backend_map[backend_provider.name](model_id=self.backend_model)
+        # Provider SDKs are only imported for the providers this agent uses
+        self.backend = get_backend_class(backend_provider.name)(model_id=self.backend_model)
+
+        # Fail over to the fallback models, in order, while the backend model's provider is down
+        if fallback_models:
+            self.backend = MultiBackend([self.backend] + [
+                get_backend_class(fallback_provider.name)(model_id=getattr(fallback_model, "value", fallback_model))
+                for fallback_provider, fallback_model in fallback_models
+            ])
+
+        # Requests slower than the model's p95 are sent again on another key, for at most hedge_budget of them
+        if hedge_budget:
+            self.backend = HedgedBackend(self.backend, budget=hedge_budget)
+
+        # Identical requests in flight at the same time, from any agent, share one provider call. The providers sample
+        # at a non-zero temperature, so opting in also shares sampled answers between identical requests
+        if coalesce_requests:
+            self.backend = SingleFlightBackend(self.backend, coalesce_sampled=True)
+
+        # With an escalation model, turns go to the backend model first and are escalated when rejected
+        if escalation_model is not None:
+            escalation_model = getattr(escalation_model, "value", escalation_model)
+            escalation_provider = escalation_provider or backend_provider
+            self.backend = RouterBackend(
+                tiers=[self.backend, get_backend_class(escalation_provider.name)(model_id=escalation_model)],
+                validator=self.validate_response
+            )
 
         self.user_prompt = None
         self.output_instructions = None
+        self.system_prompt = None
 
         self.last_user_message = None
         self.last_assistant_message = None
+        self.last_decision = None
+        # Decision parsed while validating a response, reused when that response becomes the turn's answer
+        self._validated_decision = None
 
     def create_system_prompt(self, prompt_name: str):
         raise ValueError("Use a Yaml, this method is outdated")
@@ -180,9 +223,23 @@ class Agent:
         if self.output_instructions == "NONE":
             raise ValueError("must set output instructions first, use agent.set_output_instructions(output_instructions: str) or agent.use_default_output_instructions()")
 
-        system_prompt = PromptTemplate(initial_data=system_prompt)
-        system_prompt.set_variables(self.variables)
-        self.messages.insert(0, {"role": "system", "content": str(system_prompt) + "\n" + self.output_instructions})
+        output_instructions = self.output_instructions
+        variables = self.variables
+        if self.minify_prompts:
+            system_prompt = minify_prompt(system_prompt)
+            output_instructions = minify_prompt(output_instructions)
+            variables = self._minified_variables()
+
+        self.system_prompt = PromptTemplate(initial_data=system_prompt)
+        self.system_prompt.set_variables(variables)
+        self.messages.insert(0, {"role": "system", "content": str(self.system_prompt) + "\n" + output_instructions})
+
+    def _minified_variables(self) -> Dict:
+        """The agent's variables with the prompt text among them minified."""
+        return {
+            var: minify_prompt(value) if var in MINIFIED_VARIABLES and isinstance(value, str) else value
+            for var, value in self.variables.items()
+        }
 
     def use_default_system_prompt(self):
         self.set_system_prompt(DEFAULT_SYSTEM_PROMPT)
@@ -200,13 +257,16 @@ class Agent:
         """
         Sets the user prompt format.
         """
+        if self.minify_prompts:
+            user_prompt = minify_prompt(user_prompt)
         self.user_prompt = PromptTemplate(initial_data=user_prompt)
 
     def use_default_user_prompt(self):
-        self.user_prompt = PromptTemplate(initial_data=DEFAULT_USER_PROMPT)
+        self.set_user_prompt(DEFAULT_USER_PROMPT)
 
     def set_action_space(self, action_space: [Action]):
         self.action_space = action_space
+        self.action_names = frozenset(action.name for action in action_space)
         actions_description = format_actions(self.action_space)
         self.variables["actions"] = actions_description
 
@@ -216,10 +276,46 @@ class Agent:
     def set_agent_color(self, color: Tuple):
         self.color = color
 
-    def step(self):
+    def validate_response(self, response: str):
         """
-        Takes an observation, generates a response using the backend,
-        and adds the response to the conversation history.
+        Checks a raw model response against the action space and the agent's current state.
+
+        :param response: The raw text returned by the backend.
+        :return: None if the response is usable, otherwise the reason it was rejected.
+        """
+        try:
+            action_dict = extract_json_from_string(response)
+        except ValueError:
+            return "unparseable"
+        if not action_dict:
+            return "unparseable"
+
+        decision = ActionDecision.from_dict(action_dict, raw=response)
+        self._validated_decision = decision
+        action_name = decision.action_name
+        if not decision.validate(self.action_names):
+            return "invalid action"
+
+        grid_size = self.variables.get("grid_size")
+        if grid_size is None or self.position is None:
+            return None
+
+        if action_name in ("north", "south", "east", "west"):
+            if not Action(name=action_name).is_valid(grid_size, self.position):
+                return "moves out of bounds"
+        elif action_name == "goto":
+            target = parse_position_parameters(decision.action_parameters)
+            if target is None:
+                return "invalid action parameters"
+            x, y = target
+            if not (0 <= x < grid_size[0] and 0 <= y < grid_size[1]):
+                return "goto target out of bounds"
+
+        return None
+
+    def _prepare_step(self):
+        """
+        Fills the user prompt with the current observation, position and inbox and adds it to the conversation.
         """
         self.variables["observation"] = self.observation
         self.variables["x_position"] = self.position[0]
@@ -240,33 +336,76 @@ class Agent:
 
         self.inbox.clear()
 
-        self.user_prompt.set_variables(self.variables)
+        variables = self.variables
+        if self.minify_prompts:
+            # The system message is always sent, the goal need not be repeated in every user message
+            variables = self._minified_variables()
+            system_message = self.messages[0] if self.messages else {}
+            if variables.get("goal") and system_message.get("role") == "system" \
+                    and str(variables["goal"]) in system_message["content"]:
+                variables["goal"] = GOAL_REFERENCE
+
+        self.user_prompt.set_variables(variables)
 
         # Add user observation to messages
         self.add_user_message(str(self.user_prompt))
 
-        # Generate response from backend
-        response = self.backend.generate(self.messages)
-
+    def _finish_step(self, response: str) -> ActionDecision:
+        """
+        Adds the backend's response to the conversation and parses the action out of it.
+        """
         # Add agent's response to messages
         self.add_agent_message(response)
 
-        action_dict = extract_json_from_string(response)
+        decision = self._validated_decision
+        self._validated_decision = None
+        if decision is None or decision.raw != response:
+            decision = ActionDecision.from_response(response)
+            decision.validate(self.action_names)
 
-        # Extract the action name from the agent's response
-        action_name = action_dict.get("action_name", "invalid")
-
-        new_memory = action_dict.get("add_memory", None)
-        if new_memory:
-            self.variables["memory"] += f"\n {new_memory}\n"
+        if decision.add_memory:
+            self.variables["memory"] += f"\n {decision.add_memory}\n"
 
         if self.debug:
-            print(f"Agent {self.id} Action: {action_name}")
-            print(f"Rationale: {action_dict.get('rationale', 'No rationale provided.')}\n")
+            print(f"Agent {self.id} Action: {decision.action_name}")
+            print(f"Rationale: {decision.rationale or 'No rationale provided.'}\n")
+
+        self.last_decision = decision
+        return decision
+
+    def _valid_action_listener(self, on_action: Optional[Callable[[str], None]]) -> Optional[Callable[[str], None]]:
+        """Wraps on_action so it is only called with names of the agent's action space."""
+        if on_action is None:
+            return None
+
+        def listener(action_name: str):
+            if action_name in self.action_names:
+                on_action(action_name)
+        return listener
+
+    def step(self, on_action: Callable[[str], None] = None) -> ActionDecision:
+        """
+        Takes an observation, generates a response using the backend,
+        and adds the response to the conversation history.
 
-        return action_dict
+        :param on_action: Called with the action name as soon as it has streamed in, before the rest of the
+                          response. The returned decision is authoritative, e.g. after an escalation.
+        """
+        self._prepare_step()
 
+        # Generate response from backend
+        with listen_for_action(self._valid_action_listener(on_action)):
+            response = self.backend.generate(self.messages)
 
+        return self._finish_step(response)
 
+    async def astep(self, on_action: Callable[[str], None] = None) -> ActionDecision:
+        """
+        Same as step, but awaits the backend so many agents can run concurrently in one event loop.
+        """
+        self._prepare_step()
 
+        with listen_for_action(self._valid_action_listener(on_action)):
+            response = await self.backend.agenerate(self.messages)
 
+        return self._finish_step(response)
@@ -488,4 +488,74 @@ class PromptLoader:
         return [
             file.stem  # Get the filename without extension
             for file in self.prompt_dir.glob("*.txt")
-        ]
\ No newline at end of file
+        ]
+
+def count_tokens(text: str) -> int:
+    """
+    Token count of a text, with tiktoken's cl100k encoding when it is installed, otherwise about four characters
+    per token like Backend._estimate_tokens.
+    """
+    try:
+        import tiktoken
+    except ImportError:
+        return (len(text) + 3) // 4
+    return len(tiktoken.get_encoding("cl100k_base").encode(text))
+
+
+def minify_prompt(text: str, min_duplicate_length: int = 40) -> str:
+    """
+    Removes formatting that costs tokens without telling the model anything.
+
+    Drops markdown emphasis (**bold**, ***important***), the padding in [ headers ], trailing whitespace, repeated
+    spaces and blank lines, halves the indentation, and removes lines repeating an earlier line of the text.
+
+    :param text: Prompt text, a template or a variable's value.
+    :param min_duplicate_length: Only lines at least this long are removed as duplicates, so short lines like
+                                 closing braces are kept.
+    :return: The minified text.
+    """
+    text = re.sub(r"\*{2,3}([^*\n]+?)\*{2,3}", r"\1", text)
+    text = re.sub(r"\[\s+([^\]\n]*?)\s+\]", r"[\1]", text)
+
+    lines = []
+    seen = set()
+    for line in text.splitlines():
+        stripped = line.strip()
+        if not stripped:
+            if lines and lines[-1] != "":
+                lines.append("")
+            continue
+        key = stripped.lower()
+        if len(stripped) >= min_duplicate_length:
+            if key in seen:
+                continue
+            seen.add(key)
+        indent = (len(line) - len(line.lstrip(" "))) // 2
+        lines.append(" " * indent + re.sub(r"[ \t]{2,}", " ", stripped))
+
+    return "\n".join(lines).strip("\n")
+
+
+def section_token_counts(template: PromptTemplate) -> Dict[str, int]:
+    """
+    Tokens of each section of a template, with its variables filled in.
+
+    :return: Token count by section tag.
+    """
+    template.sync_variables_to_sections()
+    return {tag: count_tokens(section.get_content()) for tag, section in template.sections.items()}
+
+
+def variable_token_counts(template: PromptTemplate) -> Dict[str, int]:
+    """
+    Tokens each variable adds to the rendered template, counting every place it appears.
+
+    :return: Token count by variable name.
+    """
+    counts = {}
+    for section in template.sections.values():
+        for var, value in section.variables.items():
+            occurrences = section._content.count(f"{section.left_delimiter_char}{var}{section.right_delimiter_char}")
+            if occurrences:
+                counts[var] = counts.get(var, 0) + occurrences * count_tokens(str(value))
+    return counts
@@ -1,21 +1,60 @@
-import random
 from typing import Optional, Dict, Any, Callable
 
-import pandas as pd
 import os
+import numpy as np
 import yaml
-from numpy.ma.extras import average
-from pandas.core.interchange.dataframe_protocol import DataFrame
 
 from src.agent.backend import Provider, GroqModels
+from src.agent.backend.batch_client import BatchClient
 from src.envwrapper.simulator import Simulator
-from src.environments.DEFAULT_CONFIGS import *
+from src.environments.DEFAULT_CONFIGS import DEFAULT_CONFIGS
+
+
+CONFIGS_DIRECTORY = os.path.join(os.path.dirname(__file__), "..", "..", "configs")
 
 
 def get_default_configs():
     return DEFAULT_CONFIGS
 
 
+def task_completed(env) -> bool:
+    """
+    Whether the simulation completed its task: every scoring task is done, or without tasks (a termination
+    callback) the score reached 100, give or take the rounding of weighted scores.
+    """
+    if env.tasks:
+        return all(task.done for task in env.tasks)
+    return env.score >= 100 - 1e-6
+
+
+def simulation_efficiency(env) -> float:
+    """
+    Optimal moves over the moves all agents made, NaN unless the simulation completed its task: a run that gave up
+    after a few moves would otherwise look more efficient than the optimum.
+    """
+    total_steps = sum(agent.variables.get("steps_taken", 0) for agent in env.agents.values())
+    if not task_completed(env) or env.optimal_steps is None or total_steps == 0:
+        return float("nan")
+    return env.optimal_steps / total_steps
+
+
+def list_config_files(configs_directory: str = CONFIGS_DIRECTORY) -> Dict[str, str]:
+    """
+    The yaml config files of a directory, without loading them.
+
+    :param configs_directory: Directory of the config files.
+    :return: The path of each config file by config key, the file name without its extension.
+    """
+    if not os.path.exists(configs_directory):
+        raise FileNotFoundError(f"Config directory not found: {configs_directory}")
+
+    return {
+        filename.split(".")[0]: os.path.join(configs_directory, filename)
+        for filename in sorted(os.listdir(configs_directory))
+        if filename.endswith(".yaml") or filename.endswith(".yml")
+    }
+
+
 class Benchmark:
     """
     A class to manage and execute benchmark simulations, creating the simulator internally.
@@ -24,15 +63,33 @@ class Benchmark:
     BACKEND_MODEL = GroqModels.LLAMA_8B
 
     def __init__(self, use_db: bool = False, use_gui: bool = False, output_dir: str = "./", num_simulations: int = 5,
-                 backend_model: Optional[str] = GroqModels.LLAMA_8B, backend_provider: Optional[str] = Provider.GROQ):
+                 backend_model: Optional[str] = GroqModels.LLAMA_8B, backend_provider: Optional[str] = Provider.GROQ,
+                 escalation_model: Optional[str] = None, escalation_provider: Optional[str] = None,
+                 hedge_budget: Optional[float] = None, fallback_models: Optional[list] = None,
+                 batch_client: Optional[BatchClient] = None, coalesce_requests: bool = False,
+                 minify_prompts: bool = False):
         """
         Initializes the Benchmark class and constructs the simulator.
 
         :param use_db: Whether to use a database.
         :param use_gui: Whether to use a GUI.
         :param output_dir: Directory to save benchmark results.
+        :param escalation_model: Optional larger model that rejected turns are escalated to.
+        :param escalation_provider: Provider of the escalation model, defaults to backend_provider.
+        :param hedge_budget: Fraction of slow requests that may be hedged on a second key, None to disable hedging.
+        :param fallback_models: (provider, model) pairs that requests fail over to when the backend is down.
+        :param batch_client: Run the simulations of each config in lockstep through this batch API client.
+        :param coalesce_requests: Let concurrent identical requests share one provider call (and its sampled answer).
+        :param minify_prompts: Send minified prompts, without markdown, extra whitespace or the goal in every turn.
         """
         self.configs = {}
+        self.escalation_model = escalation_model
+        self.escalation_provider = escalation_provider
+        self.hedge_budget = hedge_budget
+        self.fallback_models = fallback_models
+        self.batch_client = batch_client
+        self.coalesce_requests = coalesce_requests
+        self.minify_prompts = minify_prompts
         self.init_configs()
         self.use_db = use_db
         self.use_gui = use_gui
@@ -42,7 +99,10 @@ class Benchmark:
         self.BACKEND_MODEL = backend_model
         os.makedirs(self.output_dir, exist_ok=True)
         self.simulator = Simulator(use_db=self.use_db, use_gui=self.use_gui, configs=self.configs,
-                                   backend_model=self.BACKEND_MODEL, backend_provider=self.BACKEND_PROVIDER)
+                                   backend_model=self.BACKEND_MODEL, backend_provider=self.BACKEND_PROVIDER,
+                                   escalation_model=escalation_model, escalation_provider=escalation_provider,
+                                   hedge_budget=hedge_budget, fallback_models=fallback_models,
+                                   coalesce_requests=coalesce_requests, minify_prompts=minify_prompts)
         self.termination_functions = {}
 
     def initialize_stats_dataframe(self, agent_name: str):
@@ -52,12 +112,15 @@ class Benchmark:
         :param agent_name: The name of the agent.
         :return: A pandas DataFrame with columns for metrics.
         """
+        import pandas as pd
         return pd.DataFrame({
             "Agent Name": [agent_name],
             "Steps Taken": [0],
             "Score": [0],
             "Messages Sent": [""],
-            "SimNum": [0]
+            "SimNum": [0],
+            "Optimal Steps": [None],
+            "Efficiency": [float("nan")]
         })
 
     def run(self, config_keys: list, save_to_csv: bool = True):
@@ -116,37 +179,43 @@ class Benchmark:
         :param config_key: The key of the configuration to run.
         :return: A pandas DataFrame with collected stats.
         """
-        scores = self.simulator.run(config_key, num_simulations=self.num_simulations)
+        scores = self.simulator.run(config_key, num_simulations=self.num_simulations, batch_client=self.batch_client)
 
         stats_data = []
 
-        envs = self.simulator.env_map
-        for env_name, sims in envs.items():
-            for sim_num, env in sims.items():
-                for agent_id, agent in env.agents.items():
-                    steps_taken = agent.variables.get("steps_taken", 0)
-                    messages_sent = [
-                        msg.get("content", "")
-                        for msg in agent.messages
-                        if msg.get("role", "") == "assistant"
-                    ]
-
-                    # Append stats for the current agent
-                    stats_data.append({
-                        "Agent Name": agent.name,
-                        "Steps Taken": steps_taken,
-                        "Score": scores[sim_num],
-                        "Messages Sent": ";".join(messages_sent),
-                        "SimNum": sim_num,
-                    })
-
-        # Create a DataFrame from the collected stats
+        # env_map keeps the simulations of the configs run before, only this config's are reported
+        for sim_num, env in self.simulator.env_map.get(config_key, {}).items():
+            efficiency = simulation_efficiency(env)
+
+            for agent_id, agent in env.agents.items():
+                steps_taken = agent.variables.get("steps_taken", 0)
+                messages_sent = [
+                    msg.get("content", "")
+                    for msg in agent.messages
+                    if msg.get("role", "") == "assistant"
+                ]
+
+                # Append stats for the current agent
+                stats_data.append({
+                    "Agent Name": agent.name,
+                    "Steps Taken": steps_taken,
+                    "Score": scores[sim_num],
+                    "Messages Sent": ";".join(messages_sent),
+                    "SimNum": sim_num,
+                    "Optimal Steps": env.optimal_steps,
+                    "Efficiency": efficiency,
+                })
+
+        # Create a DataFrame from the collected stats, pandas is only imported once there are results
+        import pandas as pd
         stats_df = pd.DataFrame(stats_data)
 
         # Calculate average steps and scores per agent
         avg_metrics = stats_df.groupby("Agent Name").agg(
             Avg_Steps=("Steps Taken", "mean"),
             Avg_Score=("Score", "mean"),
+            # nanmean, over the simulations that completed their task
+            Avg_Efficiency=("Efficiency", lambda x: np.nanmean(x) if x.notna().any() else float("nan")),
             Messages=("Messages Sent", lambda x: " || ".join(x))  # Combine all messages for each agent
         ).reset_index()
 
@@ -160,23 +229,9 @@ class Benchmark:
         :param termination_func: Function to terminate simulation after a simulation has finished.
         :return: A dictionary representing the simulation configuration.
         """
-        random_vars = config.get("random_variables", {})
-        num_agents = config.get("num_agents")
-
-        # Resolve random variables
-        if isinstance(num_agents, str):
-            try:
-                # Safely evaluate the num_agents expression
-                num_agents = eval(random_vars.get("num_agents", "1"), {"random": random})
-            except Exception as e:
-                raise ValueError(f"Error evaluating num_agents: {e}")
-
-        # Set default termination function
-        if termination_func is None:
-            if num_agents > 1:
-                termination_func = align_alphabetically_task_scoring_function
-            else:
-                termination_func = single_agent_navigation_scoring_function
+        if termination_func is None and "scoring" not in config:
+            raise ValueError(f"{path} has no scoring section, declare one (see src.environments.scoring_spec) or pass "
+                             f"a termination_func")
 
         # Return the simulation configuration
         return {
@@ -184,6 +239,12 @@ class Benchmark:
             "termination_condition": termination_func,
             "backend_provider": self.BACKEND_PROVIDER,
             "backend_model": self.BACKEND_MODEL,
+            "escalation_provider": self.escalation_provider,
+            "escalation_model": self.escalation_model,
+            "hedge_budget": self.hedge_budget,
+            "fallback_models": self.fallback_models,
+            "coalesce_requests": self.coalesce_requests,
+            "minify_prompts": self.minify_prompts,
         }
 
     def init_configs(self):
@@ -191,32 +252,21 @@ class Benchmark:
         Initializes the configs dictionaries.
         :return: A dictionary of configs.
         """
-        file_directory = os.path.dirname(__file__)
-
-        configs_directory = os.path.join(file_directory, "..", "..", "configs")
-
-        if not os.path.exists(configs_directory):
-            raise FileNotFoundError(f"Config directory not found: {configs_directory}")
-
         default_configs = get_default_configs()
 
-        for filename in os.listdir(configs_directory):
-            if filename.endswith(".yaml") or filename.endswith(".yml"):
-                config_file = os.path.join(configs_directory, filename)
-
-                with open(config_file, "r") as file:
-                    config = yaml.safe_load(file)
+        for config_key, config_file in list_config_files().items():
+            with open(config_file, "r") as file:
+                config = yaml.safe_load(file)
 
-                config_key = os.path.basename(config_file).split(".")[0]
-                if config_key in default_configs:
-                    config = default_configs[config_key]
-                    config["yaml_file"] = config_file
-                    self.configs[config_key] = config
-                    continue
+            if config_key in default_configs:
+                config = default_configs[config_key]
+                config["yaml_file"] = config_file
+                self.configs[config_key] = config
+                continue
 
-                self.configs[config_key] = self.build_simulation_config(
-                    config, config_file
-                )
+            self.configs[config_key] = self.build_simulation_config(
+                config, config_file
+            )
 
     def set_termination_condition(self, config_key: str, termination_condition: Callable):
         if config_key in self.configs:
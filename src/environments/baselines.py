@@ -0,0 +1,60 @@
+from collections import deque
+from typing import Dict, Optional
+
+from src.environments.custom_environments.complex_gridworld_environment import ComplexGridworld
+
+
+class ScriptedBaseline:
+    """
+    A policy without a model: every agent follows its waypoints of the scoring spec's plan along the shortest routes
+    of the map's distance fields, picking and dropping items where the plan says. Its score and steps are the
+    reference the agents are benchmarked against.
+
+    :param env: An environment loaded with a scoring section, its plan is made from the current state.
+    """
+
+    def __init__(self, env: ComplexGridworld):
+        if env.scoring_spec is None:
+            raise ValueError("The scripted baseline needs an environment with a scoring section")
+        self.env = env
+        self.waypoints = {agent_id: deque(waypoints) for agent_id, waypoints in env.scoring_spec.plan(env).items()}
+        self.steps: Dict[int, int] = {agent_id: 0 for agent_id in env.agents}
+
+    def act(self, agent_id: int) -> str:
+        """The agent's next action, skip once its waypoints are done or cannot be reached."""
+        waypoints = self.waypoints.get(agent_id)
+        position = tuple(self.env.agents[agent_id].position)
+        while waypoints:
+            target, action = waypoints[0]
+            if position != target:
+                move = self.env.map_analysis.next_step(position, target)
+                if move is None:
+                    waypoints.clear()
+                    break
+                return move[0]
+            waypoints.popleft()
+            if action is not None:
+                return action
+        return "skip"
+
+    def run(self, max_episodes: Optional[int] = None) -> float:
+        """
+        Plays the agents' turns in order until the environment terminates or the episodes run out.
+
+        :param max_episodes: Episodes to play, defaults to the environment's max_episodes.
+        :return: The final score.
+        """
+        env = self.env
+        max_episodes = env.max_episodes if max_episodes is None else max_episodes
+        for _ in range(max_episodes):
+            for agent_id in env.agents:
+                action = self.act(agent_id)
+                observation = env.step(agent_id, action)
+                if observation.event == "moved" or (observation.event == "terminated" and observation.position):
+                    self.steps[agent_id] += 1
+                if env.terminated:
+                    return env.score
+            if env.check_termination():
+                env.terminated = True
+                return env.score
+        return env.score
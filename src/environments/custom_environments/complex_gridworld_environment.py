@@ -1,6 +1,10 @@
 import numpy as np
-from typing import Tuple, Dict, List
+from collections import deque
+from typing import Tuple, Dict, List, Optional
 from src.agent.base_agent import Agent  # Make sure you have the correct import path for your Agent class
+from src.agent.actions import parse_position_parameters
+from src.environments.map_analysis import MapAnalysis, analyze_map, shortest_path
+from src.environments.spatial_index import SpatialIndex, SparseCells, add_at
 
 
 class Item:
@@ -10,9 +14,18 @@ class Item:
         self.shape = shape
         self.allowed_agent_id = allowed_agent_id
 
+    def __setattr__(self, name, value):
+        # Any change invalidates the cached text
+        object.__setattr__(self, "_repr", None)
+        object.__setattr__(self, name, value)
+
     def __repr__(self):
-        agent_str = f", allowed_agent_id={self.allowed_agent_id}" if self.allowed_agent_id is not None else ""
-        return f"Item(type={self.item_type}, color={self.color}, shape={self.shape}{agent_str})"
+        if self._repr is None:
+            agent_str = f", allowed_agent_id={self.allowed_agent_id}" if self.allowed_agent_id is not None else ""
+            object.__setattr__(
+                self, "_repr", f"Item(type={self.item_type}, color={self.color}, shape={self.shape}{agent_str})"
+            )
+        return self._repr
 
     def can_be_picked_up_by(self, env: 'ComplexGridworld', agent_id: int) -> bool:
         if self.allowed_agent_id is None:
@@ -23,6 +36,154 @@ class Item:
         return agent_id == self.allowed_agent_id
 
 
+class SquareContents:
+    """
+    The items of a square at one point in time. The text listing them is rendered once, and again only if one of the
+    items changed since.
+    """
+    __slots__ = ("items", "_reprs", "_text")
+
+    def __init__(self, items: Tuple[Item, ...] = ()):
+        self.items = tuple(items)
+        self._reprs = None
+        self._text = None
+
+    def text(self) -> str:
+        reprs = tuple(repr(item) for item in self.items)
+        if self._text is None or any(new is not old for new, old in zip(reprs, self._reprs)):
+            self._reprs = reprs
+            self._text = ", ".join(reprs)
+        return self._text
+
+
+EMPTY_SQUARE = SquareContents()
+
+
+class Observation:
+    """
+    What a step did: the event, the agent's position (and the one it came from), whether it was blocked and the items
+    on its square. The text shown to the agent is rendered on first use, str(observation), and cached. It compares
+    equal to that text and supports `in` and string concatenation.
+    """
+    __slots__ = ("event", "agent_name", "action", "position", "previous_position", "blocked", "contents", "message",
+                 "_text")
+
+    def __init__(self, event: str, agent_name: str = None, action: str = None, position: Tuple[int, int] = None,
+                 previous_position: Tuple[int, int] = None, blocked: bool = False,
+                 contents: Optional[SquareContents] = None, message: str = ""):
+        self.event = event
+        self.agent_name = agent_name
+        self.action = action
+        self.position = position
+        self.previous_position = previous_position
+        self.blocked = blocked
+        self.contents = contents
+        self.message = message
+        self._text = None
+
+    @property
+    def items(self) -> Tuple[Item, ...]:
+        return self.contents.items if self.contents is not None else ()
+
+    def _render(self) -> str:
+        event = self.event
+        if event == "terminated":
+            text = "The environment has reached a termination condition."
+        elif event == "moved":
+            text = f"Agent {self.agent_name} moved '{self.action}' from {self.previous_position} to {self.position}."
+            if self.message:
+                text += "\n" + self.message
+        elif event == "edge":
+            text = (f"Agent {self.agent_name} tried to move '{self.action}', but it cannot move further in that "
+                    f"direction.")
+        elif event == "skipped":
+            text = "You skipped your turn."
+        elif event == "picked":
+            text = "You pick up the item"
+        elif event == "pick_denied":
+            text = f"You (Agent {self.agent_name}) are not authorized to pick up this item"
+        elif event == "no_item":
+            text = "No item here"
+        elif event == "dropped":
+            text = "You drop off the item"
+        elif event == "not_holding":
+            text = "You are not holding any item"
+        elif event == "obstacle":
+            text = "Cannot move into obstacle."
+        else:
+            text = self.message
+
+        if self.contents is not None:
+            x, y = self.position
+            if self.contents.items:
+                text += f"\nYou are in square ({x}, {y}). There are items here: {self.contents.text()}."
+            else:
+                text += f"\nYou are in square ({x}, {y}). There are no items here."
+        return text
+
+    def __str__(self):
+        if self._text is None:
+            self._text = self._render()
+        return self._text
+
+    def __repr__(self):
+        return (f"Observation(event={self.event!r}, position={self.position}, blocked={self.blocked}, "
+                f"items={list(self.items)})")
+
+    def __eq__(self, other):
+        if isinstance(other, Observation):
+            return str(self) == str(other)
+        if isinstance(other, str):
+            return str(self) == other
+        return NotImplemented
+
+    def __hash__(self):
+        return hash(str(self))
+
+    def __contains__(self, text: str):
+        return text in str(self)
+
+    def __add__(self, other):
+        return str(self) + other
+
+    def __radd__(self, other):
+        return other + str(self)
+
+
+class LocalView:
+    """
+    What an agent sees around it under partial observability: the other agents and the items within radius squares of
+    its position, see ComplexGridworld.observe_all. The text shown to the agent is rendered on first use and cached.
+    """
+    __slots__ = ("agent_name", "position", "radius", "agents", "items", "_text")
+
+    def __init__(self, agent_name: str, position: Tuple[int, int], radius: int,
+                 agents: List[Tuple[str, Tuple[int, int]]], items: List[Tuple[Tuple[int, int], Item]]):
+        self.agent_name = agent_name
+        self.position = position
+        self.radius = radius
+        # (name, position) of the other agents and (position, item) of the items in view, sorted by position
+        self.agents = agents
+        self.items = items
+        self._text = None
+
+    def _render(self) -> str:
+        if not self.agents and not self.items:
+            return f"Within {self.radius} squares of {self.position} you see no other agents and no items."
+        lines = [f"Within {self.radius} squares of {self.position} you see:"]
+        lines += [f"- Agent {name} at {position}" for name, position in self.agents]
+        lines += [f"- {item!r} at {position}" for position, item in self.items]
+        return "\n".join(lines)
+
+    def __str__(self):
+        if self._text is None:
+            self._text = self._render()
+        return self._text
+
+    def __repr__(self):
+        return f"LocalView(agent={self.agent_name!r}, position={self.position}, radius={self.radius})"
+
+
 class Square:
     def __init__(self, obstacle: bool = False, items: List[Item] = None):
         self.obstacle = obstacle
@@ -30,7 +191,7 @@ class Square:
         self.items = items if items else []
 
     def is_empty(self):
-        return not self.obstacle and self.agents is None and not self.items
+        return not self.obstacle and not self.agents and not self.items
 
     def has_items(self):
         return bool(self.items)
@@ -39,39 +200,234 @@ class Square:
         return self.items.pop() if self.items else None
 
 
+class SquareItems(list):
+    """The items of one square of a ComplexGridworld. Changes are written through to the grid's item arrays."""
+
+    def __init__(self, env: 'ComplexGridworld', x: int, y: int):
+        super().__init__(env.items_at(x, y))
+        self._env = env
+        self._position = (x, y)
+
+    def _sync(self):
+        self._env.set_items(*self._position, list(self))
+
+    def append(self, item):
+        super().append(item)
+        self._sync()
+
+    def extend(self, items):
+        super().extend(items)
+        self._sync()
+
+    def insert(self, index, item):
+        super().insert(index, item)
+        self._sync()
+
+    def remove(self, item):
+        super().remove(item)
+        self._sync()
+
+    def pop(self, index=-1):
+        item = super().pop(index)
+        self._sync()
+        return item
+
+    def clear(self):
+        super().clear()
+        self._sync()
+
+    def __setitem__(self, index, value):
+        super().__setitem__(index, value)
+        self._sync()
+
+    def __delitem__(self, index):
+        super().__delitem__(index)
+        self._sync()
+
+    def __iadd__(self, items):
+        self.extend(items)
+        return self
+
+
+class SquareView(Square):
+    """
+    A Square backed by the arrays of a ComplexGridworld. Reading and assigning obstacle, agents and items works as on
+    a Square, but the state lives in the grid's arrays.
+    """
+
+    def __init__(self, env: 'ComplexGridworld', x: int, y: int):
+        self._env = env
+        self.x = x
+        self.y = y
+
+    @property
+    def obstacle(self) -> bool:
+        return bool(self._env.obstacles[self.x, self.y])
+
+    @obstacle.setter
+    def obstacle(self, value: bool):
+        self._env.obstacles[self.x, self.y] = value
+        self._env.obstacles_changed()
+
+    @property
+    def agents(self) -> List[Agent]:
+        return self._env.agents_at(self.x, self.y)
+
+    @agents.setter
+    def agents(self, value):
+        raise AttributeError("The agents of a square follow their positions, use ComplexGridworld.move_agent")
+
+    @property
+    def items(self) -> SquareItems:
+        return SquareItems(self._env, self.x, self.y)
+
+    @items.setter
+    def items(self, items: List[Item]):
+        self._env.set_items(self.x, self.y, items)
+
+    def has_items(self):
+        return bool(self._env.item_counts[self.x, self.y])
+
+    def pick_up_item(self):
+        return self._env.pop_item(self.x, self.y)
+
+    def __repr__(self):
+        return f"SquareView(({self.x}, {self.y}), obstacle={self.obstacle}, items={self.items})"
+
+
+class GridColumn:
+    """The squares of one x coordinate, so env.grid[x][y] and env[x][y] keep working."""
+
+    def __init__(self, env: 'ComplexGridworld', x: int):
+        self._env = env
+        self.x = x
+
+    def __getitem__(self, y: int) -> SquareView:
+        if y < 0:
+            y += self._env.grid_size[1]
+        return self._env[self.x, y]
+
+    def __setitem__(self, y: int, square: Square):
+        self._env[self.x, y] = square
+
+    def __len__(self):
+        return self._env.grid_size[1]
+
+    def __iter__(self):
+        return (self[y] for y in range(len(self)))
+
+
+class GridColumns:
+    """env.grid, the columns of the grid made on access, so a lookup costs the same on any grid size."""
+
+    def __init__(self, env: 'ComplexGridworld'):
+        self._env = env
+
+    def __getitem__(self, x: int) -> GridColumn:
+        if x < 0:
+            x += self._env.grid_size[0]
+        if not 0 <= x < self._env.grid_size[0]:
+            raise IndexError(f"Column {x} is out of bounds for grid size {self._env.grid_size}")
+        return GridColumn(self._env, x)
+
+    def __len__(self):
+        return self._env.grid_size[0]
+
+    def __iter__(self):
+        return (GridColumn(self._env, x) for x in range(len(self)))
+
+
 class ComplexGridworld:
+    """
+    Grid world with obstacles, items and agents moving one square per step.
+
+    The state is held in arrays indexed by (x, y):
+
+    - obstacles: bool bitmap of blocked squares.
+    - occupancy: number of agents on each square, agent_positions holds one (x, y) row per agent in agent_ids order.
+    - item_counts: number of items on each square, item_positions / item_types / item_owners hold one row per item
+      lying on the grid, item_objects holds the Item objects in the same order.
+
+    With sparse=True the three bitmaps are SparseCells (only the non-zero squares are stored), for large grids
+    with few occupied squares. In both modes the agents and items of each square are kept in a dict of occupied
+    squares and in SpatialIndex bucket grids, so square lookups are O(1) and range queries visit only nearby points.
+
+    Squares are available as SquareView objects through env[x, y] and env.grid[x][y].
+    """
+
     def __init__(
             self,
             grid_size: Tuple[int, int] = (10, 10),  # (width, height)
             agents: Dict[int, Agent] = None,
             obstacles: List[Tuple[int, int]] = None,  # List of (x,y) positions
-            items: Dict[Tuple[int, int], List[Item]] = None  # Dict of (x,y) positions to items
+            items: Dict[Tuple[int, int], List[Item]] = None,  # Dict of (x,y) positions to items
+            sparse: bool = False,
+            bucket_size: int = 8
     ):
-        self.grid_size = grid_size
-        self.grid = [[Square() for _ in range(grid_size[1])] for _ in range(grid_size[0])]
+        """
+        :param sparse: Store the bitmaps as dicts of their non-zero squares instead of dense arrays.
+        :param bucket_size: Side of the buckets of the spatial indexes, in squares.
+        """
+        self.grid_size = tuple(grid_size)
+        self.sparse = sparse
         self.agents = agents if agents else {}
 
         self.termination_callbacks = []
+        # Event-driven scoring tasks, see src.environments.scoring
+        self.tasks = []
+        # The compiled scoring section of the config, if it has one (src.environments.scoring_spec)
+        self.scoring_spec = None
         self.terminated = False
 
+        # Active goto routes, keyed by agent id: {"target": (x, y), "path": deque of (x, y)}
+        self.goto_plans = {}
+
+        self.obstacles = self._new_cells(bool)
+        # Columns view of the squares, env.grid[x][y]
+        self._grid = GridColumns(self)
+        # Distance fields of the obstacle map, see the map_analysis property
+        self._map_analysis: Optional[MapAnalysis] = None
+        self.occupancy = self._new_cells(np.int32)
+        self.item_counts = self._new_cells(np.int32)
+
+        # Agent ids and items per occupied square, bottom to top, and bucket grids for range queries
+        self._square_agents: Dict[Tuple[int, int], Dict[int, None]] = {}
+        self._square_items: Dict[Tuple[int, int], List[Item]] = {}
+        self.agent_index = SpatialIndex(bucket_size)
+        self.item_index = SpatialIndex(bucket_size)
+
+        self.item_type_codes: Dict[str, int] = {}
+        # Types of the items agents can pick, a deliver_items task adds the type it counts
+        self.pickable_item_types = {"item"}
+        self.item_objects: List[Item] = []
+        # Rows are preallocated and removed by moving the last row into the gap, the properties show the used rows
+        self._item_rows: Dict[int, int] = {}
+        self._item_positions = np.empty((8, 2), dtype=np.int64)
+        self._item_types = np.empty(8, dtype=np.int32)
+        self._item_owners = np.empty(8, dtype=np.int64)
+        # SquareContents per square with items, dropped whenever the square's items change
+        self._square_contents: Dict[Tuple[int, int], SquareContents] = {}
+
         # Initialize agent positions
-        for agent_id, agent in self.agents.items():
-            x, y = agent.position
-            self.grid[x][y].agents.append(agent)
+        self._index_agents()
 
         # Place obstacles
         if obstacles:
-            for (x, y) in obstacles:
-                self.grid[x][y].obstacle = True
+            xs, ys = zip(*obstacles)
+            self.obstacles[list(xs), list(ys)] = True
 
         # Place items with validation
         if items:
             for (x, y), item_list in items.items():
                 if not (0 <= x < grid_size[0] and 0 <= y < grid_size[1]):
                     raise ValueError(f"Item position ({x}, {y}) is out of bounds for grid size {grid_size}")
-                self.grid[x][y].items.extend(item_list)
+                self.add_items(x, y, item_list)
 
         self.max_episodes = 0
+        # {"radius": int, "line_of_sight": bool} when the agents only see their surroundings, None to see everything
+        self.field_of_view = None
+        # Moves of the scoring spec's plan from the initial state, the benchmarks' reference (ScoringSpec.optimal_steps)
+        self.optimal_steps = None
         self.variables = {"group_messages": []}
         self.score = 0
         self.db_manager = None
@@ -79,69 +435,447 @@ class ComplexGridworld:
         self.sim_id = 0
         self.name = None
 
+    def _new_cells(self, dtype):
+        if self.sparse:
+            return SparseCells(self.grid_size, dtype)
+        return np.zeros(self.grid_size, dtype=dtype)
+
+    @property
+    def item_positions(self) -> np.ndarray:
+        return self._item_positions[:len(self.item_objects)]
+
+    @property
+    def item_types(self) -> np.ndarray:
+        return self._item_types[:len(self.item_objects)]
+
+    @property
+    def item_owners(self) -> np.ndarray:
+        return self._item_owners[:len(self.item_objects)]
+
+    @property
+    def grid(self) -> GridColumns:
+        return self._grid
+
     def __getitem__(self, key):
         """Support both single index and tuple index access."""
         if isinstance(key, tuple):
             x, y = key
             # Add bounds checking
             if 0 <= x < self.grid_size[0] and 0 <= y < self.grid_size[1]:
-                return self.grid[x][y]
+                return SquareView(self, x, y)
             raise IndexError(f"Position ({x}, {y}) is out of bounds for grid size {self.grid_size}")
-        return self.grid[key]
-
-    def __setitem__(self, key, value):
-        """Support both single index and tuple index assignment."""
-        if isinstance(key, tuple):
-            x, y = key
-            # Add bounds checking
-            if 0 <= x < self.grid_size[0] and 0 <= y < self.grid_size[1]:
-                self.grid[x][y] = value
-            else:
-                raise IndexError(f"Position ({x}, {y}) is out of bounds for grid size {self.grid_size}")
-        else:
-            self.grid[key] = value
+        if key < 0:
+            key += self.grid_size[0]
+        return GridColumn(self, key)
+
+    def __setitem__(self, key, value: Square):
+        """Support tuple index assignment. The obstacle flag and items of the square are copied into the grid."""
+        if not isinstance(key, tuple):
+            raise TypeError("Assign squares with env[x, y] = Square(...)")
+        x, y = key
+        # Add bounds checking
+        if not (0 <= x < self.grid_size[0] and 0 <= y < self.grid_size[1]):
+            raise IndexError(f"Position ({x}, {y}) is out of bounds for grid size {self.grid_size}")
+        self.obstacles[x, y] = value.obstacle
+        self.obstacles_changed()
+        self.set_items(x, y, list(value.items))
+
+    def _index_agents(self):
+        """Rebuilds the agent position array, occupancy bitmap and agent indexes from the agents' positions."""
+        self.agent_ids = list(self.agents)
+        self.agent_rows = {agent_id: row for row, agent_id in enumerate(self.agent_ids)}
+        self.agent_positions = np.array(
+            [tuple(agent.position) for agent in self.agents.values()], dtype=np.int64
+        ).reshape(-1, 2)
+        self.occupancy[:] = 0
+        add_at(self.occupancy, self.agent_positions[:, 0], self.agent_positions[:, 1], 1)
+
+        self._square_agents = {}
+        self.agent_index = SpatialIndex(self.agent_index.bucket_size)
+        for agent_id, (x, y) in zip(self.agent_ids, self.agent_positions.tolist()):
+            self._square_agents.setdefault((x, y), {})[agent_id] = None
+            self.agent_index.insert(agent_id, (x, y))
 
     def reset(self):
         """Resets the environment to its initial state."""
-        for row in range(self.grid_size[0]):
-            for col in range(self.grid_size[1]):
-                self.grid[row][col].agents = []
-
-        for agent_id, agent in self.agents.items():
-            row, col = agent.position
-            self.grid[row][col].agents = agent
-
+        self._index_agents()
         return None
 
-    def step(self, agent_id: int, action: str) -> str:
-        """Execute a step for the specified agent."""
-        if len(self.termination_callbacks) == 0:
-            raise ValueError("must have at least one termination callback")
-
-        if all(callback(self) for callback in self.termination_callbacks):
+    def agents_at(self, x: int, y: int) -> List[Agent]:
+        """The agents standing on a square."""
+        return [self.agents[agent_id] for agent_id in self._square_agents.get((x, y), ())]
+
+    def agents_within(self, x: int, y: int, radius: int) -> List[Agent]:
+        """The agents within Chebyshev radius of (x, y), found through the agent index."""
+        return [self.agents[agent_id] for agent_id in self.agent_index.query(x, y, radius)]
+
+    def move_agent(self, agent_id: int, position: Tuple[int, int]):
+        """Moves an agent to a square, keeping the position array, occupancy bitmap, indexes and agent.position in sync."""
+        row = self.agent_rows[agent_id]
+        old_x, old_y = self.agent_positions[row].tolist()
+        new_x, new_y = position
+        self.occupancy[old_x, old_y] -= 1
+        self.occupancy[new_x, new_y] += 1
+        self.agent_positions[row] = (new_x, new_y)
+
+        square = self._square_agents[(old_x, old_y)]
+        del square[agent_id]
+        if not square:
+            del self._square_agents[(old_x, old_y)]
+        self._square_agents.setdefault((new_x, new_y), {})[agent_id] = None
+        self.agent_index.move(agent_id, (new_x, new_y))
+
+        self.agents[agent_id].position = (new_x, new_y)
+        self._emit("on_move", agent_id, (old_x, old_y), (new_x, new_y))
+
+    def occupied(self, positions) -> np.ndarray:
+        """Whether an agent stands on each of the (x, y) positions."""
+        positions = np.asarray(positions, dtype=np.int64).reshape(-1, 2)
+        return self.occupancy[positions[:, 0], positions[:, 1]] > 0
+
+    def item_type_code(self, item_type: str) -> int:
+        return self.item_type_codes.setdefault(item_type, len(self.item_type_codes))
+
+    def add_items(self, x: int, y: int, items: List[Item]):
+        """Puts items on top of a square."""
+        if not items:
+            return
+        first_row = len(self.item_objects)
+        last_row = first_row + len(items)
+        if last_row > len(self._item_types):
+            capacity = max(2 * len(self._item_types), last_row)
+            self._item_positions = np.resize(self._item_positions, (capacity, 2))
+            self._item_types = np.resize(self._item_types, capacity)
+            self._item_owners = np.resize(self._item_owners, capacity)
+
+        self._item_positions[first_row:last_row] = (x, y)
+        self._item_types[first_row:last_row] = [self.item_type_code(item.item_type) for item in items]
+        self._item_owners[first_row:last_row] = [
+            -1 if item.allowed_agent_id is None else item.allowed_agent_id for item in items
+        ]
+        for row, item in enumerate(items, first_row):
+            if id(item) in self._item_rows:
+                raise ValueError(f"{item} already lies on the grid")
+            self._item_rows[id(item)] = row
+            self.item_index.insert(id(item), (x, y))
+        self.item_objects.extend(items)
+
+        self._square_items.setdefault((x, y), []).extend(items)
+        self.item_counts[x, y] += len(items)
+        self._square_contents.pop((x, y), None)
+
+    def _remove_item(self, item: Item):
+        """Takes an item off the grid. The last row moves into its row, so this is O(1)."""
+        row = self._item_rows.pop(id(item))
+        x, y = self._item_positions[row].tolist()
+        last_row = len(self.item_objects) - 1
+        if row != last_row:
+            last_item = self.item_objects[last_row]
+            self.item_objects[row] = last_item
+            self._item_positions[row] = self._item_positions[last_row]
+            self._item_types[row] = self._item_types[last_row]
+            self._item_owners[row] = self._item_owners[last_row]
+            self._item_rows[id(last_item)] = row
+        self.item_objects.pop()
+        self.item_index.remove(id(item))
+
+        square = self._square_items[(x, y)]
+        # Usually the top item, search from the end
+        for index in range(len(square) - 1, -1, -1):
+            if square[index] is item:
+                del square[index]
+                break
+        if not square:
+            del self._square_items[(x, y)]
+        self.item_counts[x, y] -= 1
+        self._square_contents.pop((x, y), None)
+
+    def items_at(self, x: int, y: int) -> List[Item]:
+        """The items on a square, bottom to top."""
+        return list(self._square_items.get((x, y), ()))
+
+    def items_within(self, x: int, y: int, radius: int) -> List[Tuple[Tuple[int, int], Item]]:
+        """(position, item) of the items within Chebyshev radius of (x, y), found through the item index."""
+        found = []
+        for item_id in self.item_index.query(x, y, radius):
+            row = self._item_rows[item_id]
+            found.append((tuple(self._item_positions[row].tolist()), self.item_objects[row]))
+        return found
+
+    def line_of_sight(self, start: Tuple[int, int], end: Tuple[int, int]) -> bool:
+        """
+        Whether no obstacle lies on the Bresenham line between two squares, the squares themselves excluded. The line
+        is traced from the smaller of the two positions, so the result does not depend on the direction.
+        """
+        (x, y), (end_x, end_y) = sorted((tuple(start), tuple(end)))
+        dx, dy = abs(end_x - x), -abs(end_y - y)
+        step_x = 1 if x < end_x else -1
+        step_y = 1 if y < end_y else -1
+        error = dx + dy
+        # Both take an (x, y) tuple and skip the cost of indexing the arrays square by square
+        blocked = self.obstacles.cells.__contains__ if self.sparse else self.obstacles.item
+        while (x, y) != (end_x, end_y):
+            doubled = 2 * error
+            if doubled >= dy:
+                error += dy
+                x += step_x
+            if doubled <= dx:
+                error += dx
+                y += step_y
+            if (x, y) != (end_x, end_y) and blocked((x, y)):
+                return False
+        return True
+
+    def _sight_test(self, line_of_sight: bool):
+        """A sees(a, b) function for one observation pass, caching the line of sight of each pair of squares."""
+        if not line_of_sight:
+            return lambda a, b: True
+        cache: Dict[Tuple[Tuple[int, int], Tuple[int, int]], bool] = {}
+
+        def sees(a, b):
+            if a == b:
+                return True
+            key = (a, b) if a <= b else (b, a)
+            visible = cache.get(key)
+            if visible is None:
+                visible = cache[key] = self.line_of_sight(a, b)
+            return visible
+
+        return sees
+
+    def _local_views(self, square: Tuple[int, int], agent_ids, radius: int, sees, nearby_agent_ids,
+                     nearby_item_ids) -> Dict[int, LocalView]:
+        """The views of the agents standing on one square from the index keys found around it."""
+        agent_positions = self.agent_index.positions
+        nearby_agents = sorted(
+            (agent_positions[other_id], other_id) for other_id in nearby_agent_ids
+            if sees(square, agent_positions[other_id])
+        )
+        item_positions = self.item_index.positions
+        nearby_items = [
+            (item_positions[item_id], self.item_objects[self._item_rows[item_id]])
+            for item_id in nearby_item_ids if sees(square, item_positions[item_id])
+        ]
+        nearby_items.sort(key=lambda pair: pair[0])
+        return {
+            agent_id: LocalView(self.agents[agent_id].name, square, radius,
+                                [(self.agents[other_id].name, position) for position, other_id in nearby_agents
+                                 if other_id != agent_id],
+                                nearby_items)
+            for agent_id in agent_ids
+        }
+
+    def observe(self, agent_id: int, radius: int, line_of_sight: bool = False) -> LocalView:
+        """
+        The agents and items within Chebyshev radius of an agent.
+
+        :param radius: How many squares the agent sees in every direction.
+        :param line_of_sight: Hide what an obstacle stands in front of.
+        """
+        x, y = square = self.agent_index.positions[agent_id]
+        return self._local_views(square, (agent_id,), radius, self._sight_test(line_of_sight),
+                                 self.agent_index.query(x, y, radius), self.item_index.query(x, y, radius))[agent_id]
+
+    def observe_all(self, radius: int, line_of_sight: bool = False) -> Dict[int, LocalView]:
+        """
+        The local view of every agent, computed in one pass over the occupied squares: the index queries of all the
+        squares are batched with SpatialIndex.query_many, agents sharing a square share its view, and each pair of
+        squares has its line of sight traced at most once.
+
+        :param radius: How many squares the agents see in every direction.
+        :param line_of_sight: Hide what an obstacle stands in front of.
+        :return: Agent id to its LocalView.
+        """
+        sees = self._sight_test(line_of_sight)
+        squares = list(self._square_agents)
+        nearby_agents = self.agent_index.query_many(squares, radius)
+        nearby_items = self.item_index.query_many(squares, radius)
+        views = {}
+        for square, agent_ids, agent_keys, item_keys in zip(squares, self._square_agents.values(), nearby_agents,
+                                                            nearby_items):
+            views.update(self._local_views(square, agent_ids, radius, sees, agent_keys, item_keys))
+        return views
+
+    def set_items(self, x: int, y: int, items: List[Item]):
+        """Replaces the items on a square."""
+        for item in self._square_items.get((x, y), [])[::-1]:
+            self._remove_item(item)
+        self.add_items(x, y, items)
+
+    def pop_item(self, x: int, y: int) -> Optional[Item]:
+        """Takes the top item off a square."""
+        square = self._square_items.get((x, y))
+        if not square:
+            return None
+        item = square[-1]
+        self._remove_item(item)
+        return item
+
+    def item_type_counts(self, item_type: str) -> np.ndarray:
+        """Number of items of a type on each square, as a grid_size array."""
+        code = self.item_type_codes.get(item_type)
+        positions = self.item_positions[self.item_types == code]
+        if self.sparse:
+            counts = SparseCells(self.grid_size, np.int64)
+            counts.add_at(positions[:, 0], positions[:, 1], 1)
+            return counts
+        flat = positions[:, 0] * self.grid_size[1] + positions[:, 1]
+        return np.bincount(flat, minlength=self.obstacles.size).reshape(self.grid_size)
+
+    def has_item_type(self, positions, item_type: str) -> np.ndarray:
+        """Whether an item of the type lies on each of the (x, y) positions."""
+        positions = np.asarray(positions, dtype=np.int64).reshape(-1, 2)
+        return self.item_type_counts(item_type)[positions[:, 0], positions[:, 1]] > 0
+
+    def state_snapshot(self) -> Dict:
+        """The agent and item positions as plain lists, the state format of scoring_spec.Trajectory."""
+        codes = {code: item_type for item_type, code in self.item_type_codes.items()}
+        items = {}
+        for position, code in zip(self.item_positions.tolist(), self.item_types.tolist()):
+            items.setdefault(codes[code], []).append(position)
+        return {
+            "agent_names": [self.agents[agent_id].name for agent_id in self.agent_ids],
+            "agents": self.agent_positions.tolist(),
+            "items": items,
+        }
+
+    def place_markers(self, positions, item_factory):
+        """Puts item_factory() on each of the positions that has no items yet."""
+        positions = np.asarray(positions, dtype=np.int64).reshape(-1, 2)
+        positions = np.unique(positions, axis=0)
+        for x, y in positions[self.item_counts[positions[:, 0], positions[:, 1]] == 0]:
+            self.add_items(int(x), int(y), [item_factory()])
+
+    def in_bounds(self, x: int, y: int) -> bool:
+        return 0 <= x < self.grid_size[0] and 0 <= y < self.grid_size[1]
+
+    @property
+    def map_analysis(self) -> MapAnalysis:
+        """
+        The distance fields of the obstacle map, shared with every environment on the same map
+        (src.environments.map_analysis).
+        """
+        if self._map_analysis is None:
+            self._map_analysis = analyze_map(self.obstacles)
+        return self._map_analysis
+
+    def obstacles_changed(self):
+        """Drops the distance fields after obstacles were changed directly in the obstacles array."""
+        self._map_analysis = None
+
+    def plan_path(self, start: Tuple[int, int], goal: Tuple[int, int]) -> Optional[List[Tuple[int, int]]]:
+        """
+        Shortest route from start to goal that avoids obstacles. Read from the goal's distance field when the map
+        has one (the scenario's targets and items), else found by a breadth-first search that stops at the goal.
+
+        :param start: (x, y) position to plan from.
+        :param goal: (x, y) position to reach.
+        :return: The list of positions to visit after start (empty if already there), or None if unreachable.
+        """
+        if not self.in_bounds(*goal) or self.obstacles[tuple(goal)]:
+            return None
+        if self._map_analysis is not None:
+            return self._map_analysis.path(start, goal)
+        # Searching the obstacles in place, a sparse grid is never copied to a dense bitmap just for a goto
+        return shortest_path(self.obstacles, start, goal)
+
+    def has_pending_goto(self, agent_id: int) -> bool:
+        """Whether the agent is still travelling along a goto route."""
+        return agent_id in self.goto_plans
+
+    def cancel_goto(self, agent_id: int):
+        self.goto_plans.pop(agent_id, None)
+
+    def _next_goto_direction(self, agent, action_parameters: Dict = None):
+        """
+        Resolve a goto action into the next single move for the agent.
+
+        A new goto (parameters given) replaces any active route. Without parameters the active route is continued.
+
+        :return: A (direction, message) tuple. direction is None when the agent does not move this tick.
+        """
+        if action_parameters:
+            target = parse_position_parameters(action_parameters)
+            if target is None:
+                self.cancel_goto(agent.id)
+                return None, f"Invalid goto parameters {action_parameters}. Use {{\"x\": <int>, \"y\": <int>}}."
+            path = self.plan_path(agent.position, target)
+            if path is None:
+                self.cancel_goto(agent.id)
+                return None, f"There is no path from {agent.position} to {target}."
+            if not path:
+                self.cancel_goto(agent.id)
+                return None, f"You are already at {target}."
+            self.goto_plans[agent.id] = {"target": target, "path": deque(path)}
+
+        plan = self.goto_plans.get(agent.id)
+        if plan is None:
+            return None, "You have no active goto target."
+
+        next_x, next_y = plan["path"][0]
+        if self.obstacles[next_x, next_y]:
+            # The map changed under us, try to route around it
+            self.obstacles_changed()
+            path = self.plan_path(agent.position, plan["target"])
+            if not path:
+                self.cancel_goto(agent.id)
+                return None, f"Your route to {plan['target']} is blocked."
+            plan["path"] = deque(path)
+            next_x, next_y = plan["path"][0]
+
+        plan["path"].popleft()
+        x, y = agent.position
+        if not plan["path"]:
+            self.cancel_goto(agent.id)
+            message = f"You arrived at {plan['target']}."
+        else:
+            message = f"Travelling to {plan['target']}, {len(plan['path'])} steps remaining."
+
+        if next_y > y:
+            return "north", message
+        if next_y < y:
+            return "south", message
+        if next_x > x:
+            return "east", message
+        return "west", message
+
+    def step(self, agent_id: int, action: str, action_parameters: Dict = None) -> Observation:
+        """
+        Execute a step for the specified agent.
+
+        :param agent_id: ID of the agent taking the action.
+        :param action: Name of the action.
+        :param action_parameters: Parameters of the action, e.g. {"x": 1, "y": 2} for goto.
+        :return: The structured observation, str() renders the text for the agent.
+        """
+        if self.check_termination():
             self.terminated = True
-            return "The environment has reached a termination condition."
+            return Observation("terminated")
 
         agent = self.agents.get(agent_id)
         if not agent:
-            return f"Agent ID {agent_id} not found in the environment."
+            return Observation("error", message=f"Agent ID {agent_id} not found in the environment.")
 
-        valid_actions = [action.name for action in agent.action_space]
-        if action not in valid_actions:
-            return f"Invalid action: '{action}'. Valid actions are {valid_actions}."
+        if action not in agent.action_names:
+            valid_actions = [valid_action.name for valid_action in agent.action_space]
+            return Observation("error", agent.name, action,
+                               message=f"Invalid action: '{action}'. Valid actions are {valid_actions}.")
 
         x, y = agent.position
         new_x, new_y = x, y
-        current_square = self.grid[x][y]
 
-        if current_square.has_items():
-            current_items_str = ", ".join(str(item) for item in current_square.items)
-            item_observation = f"\nYou are in square ({x}, {y}). There are items here: {current_items_str}."
+        goto_message = ""
+        if action == "goto":
+            action, goto_message = self._next_goto_direction(agent, action_parameters)
+            if action is None:
+                return Observation("goto", agent.name, "goto", (x, y), contents=self.square_contents(x, y),
+                                   message=goto_message)
         else:
-            item_observation = f"\nYou are in square ({x}, {y}). There are no items here."
+            # Any other decision overrides an active route
+            self.cancel_goto(agent_id)
 
         if action == "skip":
-            return "You skipped your turn." + item_observation
+            return Observation("skipped", agent.name, action, (x, y), contents=self.square_contents(x, y))
 
         if action == 'north':
             new_y = min(self.grid_size[1] - 1, y + 1)
@@ -152,52 +886,52 @@ class ComplexGridworld:
         elif action == 'west':
             new_x = max(0, x - 1)
         elif action == 'pick':
-            if self.grid[x][y].has_items():
-                item = self.grid[x][y].items[-1]
-                if item and item.item_type == "item":
-                    if item.can_be_picked_up_by(self, agent_id):
-                        agent.item = self.grid[x][y].pick_up_item()
-                        return "You pick up the item"
-                    else:
-                        return f"You (Agent {agent.name}) are not authorized to pick up this item"
+            square = self._square_items.get((x, y))
+            if square and square[-1].item_type in self.pickable_item_types:
+                if self._item_owners[self._item_rows[id(square[-1])]] in (-1, agent_id):
+                    agent.item = self.pop_item(x, y)
+                    self._emit("on_pick", agent_id, (x, y), agent.item)
+                    return Observation("picked", agent.name, action, (x, y))
                 else:
-                    return "No item here"
+                    return Observation("pick_denied", agent.name, action, (x, y), blocked=True)
             else:
-                return "No item here"
+                return Observation("no_item", agent.name, action, (x, y))
         elif action == 'drop':
             if agent.item:
-                self.grid[x][y].items.append(agent.item)
+                self.add_items(x, y, [agent.item])
+                self._emit("on_drop", agent_id, (x, y), agent.item)
                 agent.item = None
-                return "You drop off the item"
+                return Observation("dropped", agent.name, action, (x, y))
             else:
-                return "You are not holding any item"
+                return Observation("not_holding", agent.name, action, (x, y))
 
         if (new_x, new_y) == (x, y):
-            return f"Agent {agent.name} tried to move '{action}', but it cannot move further in that direction." + item_observation
+            return Observation("edge", agent.name, action, (x, y), blocked=True, contents=self.square_contents(x, y))
 
-        target_square = self.grid[new_x][new_y]
-        if target_square.obstacle:
-            return "Cannot move into obstacle."
+        if self.obstacles[new_x, new_y]:
+            self.cancel_goto(agent_id)
+            return Observation("obstacle", agent.name, action, (x, y), blocked=True)
 
-        self.grid[x][y].agents.remove(agent)
-        agent.position = (new_x, new_y)
-        self.grid[new_x][new_y].agents.append(agent)
+        self.move_agent(agent_id, (new_x, new_y))
+        contents = self.square_contents(new_x, new_y)
 
-        if target_square.has_items():
-            current_items_str = ", ".join(str(item) for item in target_square.items)
-            item_observation = f"\nYou are in square ({new_x}, {new_y}). There are items here: {current_items_str}."
-        else:
-            item_observation = f"\nYou are in square ({new_x}, {new_y}). There are no items here."
-
-        observation = f"Agent {agent.name} moved '{action}' from {(x, y)} to {(new_x, new_y)}." + item_observation
-
-        if all(callback(self) for callback in self.termination_callbacks):
+        if self.check_termination():
             self.terminated = True
-            return "The environment has reached a termination condition." + item_observation
+            return Observation("terminated", agent.name, action, (new_x, new_y), (x, y), contents=contents)
 
         agent.variables["score"] = self.score
 
-        return observation
+        return Observation("moved", agent.name, action, (new_x, new_y), (x, y), contents=contents,
+                           message=goto_message)
+
+    def square_contents(self, x: int, y: int) -> SquareContents:
+        """The items on a square, cached until they change."""
+        if not self.item_counts[x, y]:
+            return EMPTY_SQUARE
+        contents = self._square_contents.get((x, y))
+        if contents is None:
+            contents = self._square_contents[(x, y)] = SquareContents(self.items_at(x, y))
+        return contents
 
     def get_agent_position(self, agent_id: int):
         """Get the position of a specific agent."""
@@ -205,11 +939,34 @@ class ComplexGridworld:
         return agent.position if agent else None
 
     def register_termination_callback(self, func):
-        """Register a termination callback."""
+        """Register a termination callback. Callbacks re-evaluate the whole environment, prefer register_task."""
         self.termination_callbacks.append(func)
 
+    def register_task(self, task):
+        """
+        Register an event-driven scoring task (see src.environments.scoring). The task is initialized once, then
+        receives the move, pick and drop events of every step.
+        """
+        task.initialize(self)
+        self.tasks.append(task)
+        self.score = sum(task.score for task in self.tasks)
+
+    def _emit(self, event: str, *args):
+        if not self.tasks:
+            return
+        for task in self.tasks:
+            getattr(task, event)(self, *args)
+        self.score = sum(task.score for task in self.tasks)
+
+    def check_termination(self) -> bool:
+        """Whether every scoring task is done and every termination callback returns True."""
+        if not self.tasks and not self.termination_callbacks:
+            raise ValueError("must have at least one scoring task or termination callback")
+        return all(task.done for task in self.tasks) and all(callback(self) for callback in self.termination_callbacks)
+
     def iter_agents(self):
         pass
 
     def set_agents_for_env(self, agents):
         self.agents = {i: obj for i, obj in enumerate(agents)}
+        self._index_agents()
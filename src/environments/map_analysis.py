@@ -0,0 +1,251 @@
+"""
+Distance fields of a scenario's map. A field holds the number of moves from every square to one source square around
+the obstacles, so once it is computed the optimal distance between any square and the source is a single lookup.
+
+Fields are computed with a breadth-first search on first use and kept in a MapAnalysis, which analyze_map shares
+between every environment on the same map: the simulations of a scenario, and its re-runs, compute each field once.
+They are meant for the squares of the scenario that are looked up again and again, its targets and items. A field
+covers the whole grid, so a map keeps only its most recently used fields and routes to any other square are found
+with a search that stops at the goal (shortest_path).
+"""
+from collections import OrderedDict, deque
+from itertools import permutations
+from typing import Dict, Iterable, List, Optional, Tuple
+import hashlib
+import math
+
+import numpy as np
+
+from src.environments.spatial_index import SparseCells
+
+Position = Tuple[int, int]
+
+# Distance of the squares a field's source cannot be reached from
+UNREACHABLE = -1
+
+# Moves in the order goto prefers them: north, south, east, west
+MOVES = np.array([(0, 1), (0, -1), (1, 0), (-1, 0)], dtype=np.int64)
+DIRECTIONS = ("north", "south", "east", "west")
+
+
+def dense_obstacles(obstacles) -> np.ndarray:
+    """A copy of an obstacle bitmap, dense or SparseCells, as a dense bool array."""
+    if isinstance(obstacles, SparseCells):
+        dense = np.zeros(obstacles.shape, dtype=bool)
+        if obstacles.cells:
+            xs, ys = zip(*obstacles.cells)
+            dense[list(xs), list(ys)] = True
+        return dense
+    return np.array(obstacles, dtype=bool)
+
+
+def shortest_path(obstacles, start: Position, goal: Position) -> Optional[List[Position]]:
+    """
+    Breadth-first search from start that stops once goal is reached, only visiting the squares closer to start than
+    goal is. Routes to nearby squares stay cheap on any grid size.
+
+    :param obstacles: Obstacle bitmap indexed by (x, y), dense or SparseCells.
+    :return: The positions to visit after start (empty if already there), None if goal cannot be reached.
+    """
+    start, goal = (int(start[0]), int(start[1])), (int(goal[0]), int(goal[1]))
+    width, height = obstacles.shape
+    if not (0 <= goal[0] < width and 0 <= goal[1] < height) or obstacles[goal]:
+        return None
+    if start == goal:
+        return []
+
+    parents = {start: None}
+    frontier = deque([start])
+    while frontier:
+        x, y = frontier.popleft()
+        for nxt in ((x, y + 1), (x, y - 1), (x + 1, y), (x - 1, y)):
+            if nxt in parents or not (0 <= nxt[0] < width and 0 <= nxt[1] < height) or obstacles[nxt]:
+                continue
+            parents[nxt] = (x, y)
+            if nxt == goal:
+                path = []
+                while nxt != start:
+                    path.append(nxt)
+                    nxt = parents[nxt]
+                return path[::-1]
+            frontier.append(nxt)
+    return None
+
+
+def distance_field(obstacles: np.ndarray, source: Position) -> np.ndarray:
+    """
+    Breadth-first search from source over the squares without obstacles, one numpy step per ring of the frontier.
+
+    :param obstacles: Dense bool obstacle bitmap indexed by (x, y).
+    :return: An int32 array of the number of moves from each square to source, UNREACHABLE where there is no path.
+    """
+    width, height = obstacles.shape
+    distances = np.full(obstacles.shape, UNREACHABLE, dtype=np.int32)
+    x, y = source
+    if not (0 <= x < width and 0 <= y < height) or obstacles[x, y]:
+        return distances
+
+    distances[x, y] = 0
+    frontier = np.array([[x, y]], dtype=np.int64)
+    step = 0
+    while len(frontier):
+        step += 1
+        neighbours = (frontier[:, None, :] + MOVES[None, :, :]).reshape(-1, 2)
+        xs, ys = neighbours[:, 0], neighbours[:, 1]
+        inside = (xs >= 0) & (xs < width) & (ys >= 0) & (ys < height)
+        xs, ys = xs[inside], ys[inside]
+        fresh = (distances[xs, ys] == UNREACHABLE) & ~obstacles[xs, ys]
+        # Squares reached from two frontier squares appear twice, keep each once
+        flat = np.unique(xs[fresh] * height + ys[fresh])
+        xs, ys = flat // height, flat % height
+        distances[xs, ys] = step
+        frontier = np.stack([xs, ys], axis=1)
+    return distances
+
+
+# Squares of distance fields kept per map, the least recently used field is dropped past the budget (4 bytes a square)
+FIELD_CELL_BUDGET = 1 << 22
+# Fields kept per map however large its grid, enough for the targets and items of the default scenarios
+MIN_CACHED_FIELDS = 8
+
+
+class MapAnalysis:
+    """
+    The distance fields of one map, computed on first use of each source.
+
+    :param obstacles: Obstacle bitmap of the map, dense or SparseCells.
+    :param max_fields: Fields kept, defaults to as many as fit in FIELD_CELL_BUDGET and at least MIN_CACHED_FIELDS.
+    """
+
+    def __init__(self, obstacles, max_fields: Optional[int] = None):
+        self.obstacles = dense_obstacles(obstacles)
+        self.grid_size = self.obstacles.shape
+        if max_fields is None:
+            max_fields = max(MIN_CACHED_FIELDS, FIELD_CELL_BUDGET // max(1, self.obstacles.size))
+        self.max_fields = max_fields
+        # Least recently used first
+        self.fields: "OrderedDict[Position, np.ndarray]" = OrderedDict()
+
+    def field(self, source: Position) -> np.ndarray:
+        """The distance field of a source square."""
+        source = (int(source[0]), int(source[1]))
+        field = self.fields.get(source)
+        if field is None:
+            field = self.fields[source] = distance_field(self.obstacles, source)
+            if len(self.fields) > self.max_fields:
+                self.fields.popitem(last=False)
+        else:
+            self.fields.move_to_end(source)
+        return field
+
+    def precompute(self, sources: Iterable[Position]):
+        """Computes the fields of the sources ahead of their first lookup."""
+        for source in sources:
+            self.field(source)
+
+    def distance(self, start: Position, goal: Position) -> Optional[int]:
+        """The fewest moves from start to goal, None if goal cannot be reached. O(1) once goal's field exists."""
+        x, y = start
+        if not (0 <= x < self.grid_size[0] and 0 <= y < self.grid_size[1]):
+            return None
+        distance = int(self.field(goal)[x, y])
+        return None if distance == UNREACHABLE else distance
+
+    def next_step(self, position: Position, goal: Position) -> Optional[Tuple[str, Position]]:
+        """
+        The first move of a shortest route from position to goal.
+
+        :return: (direction, square) of the move, None when position is the goal or the goal cannot be reached.
+        """
+        field = self.field(goal)
+        x, y = position
+        distance = field[x, y]
+        if distance <= 0:
+            return None
+        width, height = self.grid_size
+        for direction, (dx, dy) in zip(DIRECTIONS, MOVES.tolist()):
+            nx, ny = x + dx, y + dy
+            if 0 <= nx < width and 0 <= ny < height and field[nx, ny] == distance - 1:
+                return direction, (nx, ny)
+        return None
+
+    def path(self, start: Position, goal: Position) -> Optional[List[Position]]:
+        """
+        A shortest route from start to goal, following goal's distance field downhill when it has one. Other goals
+        are searched with shortest_path rather than given a field.
+
+        :return: The positions to visit after start (empty if already there), None if goal cannot be reached.
+        """
+        start, goal = (int(start[0]), int(start[1])), (int(goal[0]), int(goal[1]))
+        if goal not in self.fields:
+            return shortest_path(self.obstacles, start, goal)
+        if self.distance(start, goal) is None:
+            return None
+        path = []
+        position = start
+        while position != goal:
+            position = self.next_step(position, goal)[1]
+            path.append(position)
+        return path
+
+
+def map_key(obstacles: np.ndarray) -> str:
+    """Digest identifying a map by its size and obstacles."""
+    digest = hashlib.sha1(np.packbits(obstacles).tobytes())
+    digest.update(str(obstacles.shape).encode())
+    return digest.hexdigest()
+
+
+# Analyses of the maps seen recently, the oldest is dropped past MAX_CACHED_MAPS
+MAX_CACHED_MAPS = 32
+_analyses: "OrderedDict[str, MapAnalysis]" = OrderedDict()
+
+
+def analyze_map(obstacles) -> MapAnalysis:
+    """The MapAnalysis of a map, shared with every earlier call on the same map."""
+    dense = dense_obstacles(obstacles)
+    key = map_key(dense)
+    analysis = _analyses.get(key)
+    if analysis is None:
+        analysis = _analyses[key] = MapAnalysis(dense)
+        if len(_analyses) > MAX_CACHED_MAPS:
+            _analyses.popitem(last=False)
+    else:
+        _analyses.move_to_end(key)
+    return analysis
+
+
+def min_cost_assignment(costs: np.ndarray) -> List[Optional[int]]:
+    """
+    Assigns rows of a cost matrix to distinct columns, minimizing the total cost. Every row is assigned when there are
+    at least as many columns, otherwise every column is. Exact by enumeration while there are at most 5040
+    assignments (7 agents and targets), greedy on the cheapest remaining pair beyond.
+
+    :param costs: (rows, columns) costs.
+    :return: The column of each row, None for the rows left without one.
+    """
+    rows, columns = costs.shape
+    if rows > columns:
+        assignment = [None] * rows
+        for column, row in enumerate(min_cost_assignment(costs.T)):
+            assignment[row] = column
+        return assignment
+    if rows == 0:
+        return []
+
+    if math.perm(columns, rows) <= 5040:
+        candidates = np.array(list(permutations(range(columns), rows)), dtype=np.int64)
+        totals = costs[np.arange(rows), candidates].sum(axis=1)
+        return candidates[int(np.argmin(totals))].tolist()
+
+    assignment = [None] * rows
+    free_rows, free_columns = set(range(rows)), set(range(columns))
+    for flat in np.argsort(costs, axis=None, kind="stable").tolist():
+        row, column = divmod(flat, columns)
+        if row in free_rows and column in free_columns:
+            assignment[row] = column
+            free_rows.discard(row)
+            free_columns.discard(column)
+            if not free_rows:
+                break
+    return assignment
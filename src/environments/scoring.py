@@ -0,0 +1,211 @@
+from collections import Counter
+from typing import Dict, Iterable, List, Tuple
+
+from src.environments.custom_environments.complex_gridworld_environment import ComplexGridworld, Item, Square
+
+Position = Tuple[int, int]
+
+
+def target_marker() -> Item:
+    return Item(item_type="target", color=(0, 0, 50, 128), shape="circle")
+
+
+class ScoringTask:
+    """
+    A task that keeps its score up to date from the environment's events instead of re-evaluating the whole grid.
+
+    initialize is called once when the task is registered with ComplexGridworld.register_task, then on_move, on_pick
+    and on_drop are called after every change made by ComplexGridworld.step. Each handler is O(1).
+    """
+
+    def __init__(self):
+        self.score = 0
+        self.done = False
+
+    def initialize(self, env: ComplexGridworld):
+        pass
+
+    def on_move(self, env: ComplexGridworld, agent_id: int, old_position: Position, new_position: Position):
+        pass
+
+    def on_pick(self, env: ComplexGridworld, agent_id: int, position: Position, item: Item):
+        pass
+
+    def on_drop(self, env: ComplexGridworld, agent_id: int, position: Position, item: Item):
+        pass
+
+
+class OccupyTargetsTask(ScoringTask):
+    """Every target must be occupied by an agent. Each occupied target is worth 100 / number of targets."""
+
+    def __init__(self, targets: Iterable[Position]):
+        super().__init__()
+        self.targets = {tuple(target) for target in targets}
+        self.agents_on_target: Dict[Position, int] = {}
+        self.occupied = 0
+
+    def initialize(self, env: ComplexGridworld):
+        env.place_markers(list(self.targets), target_marker)
+        self.agents_on_target = {target: int(env.occupancy[target]) for target in self.targets}
+        self.occupied = sum(1 for count in self.agents_on_target.values() if count)
+        self._update()
+
+    def on_move(self, env, agent_id, old_position, new_position):
+        if old_position in self.agents_on_target:
+            self.agents_on_target[old_position] -= 1
+            if not self.agents_on_target[old_position]:
+                self.occupied -= 1
+        if new_position in self.agents_on_target:
+            if not self.agents_on_target[new_position]:
+                self.occupied += 1
+            self.agents_on_target[new_position] += 1
+        self._update()
+
+    def _update(self):
+        self.score = self.occupied * 100 / len(self.targets)
+        self.done = self.occupied == len(self.targets)
+
+
+class AllAgentsAtTargetTask(ScoringTask):
+    """All agents must stand on the target. Scores 100 once they do."""
+
+    def __init__(self, target: Position):
+        super().__init__()
+        self.target = tuple(target)
+        self.agents_at_target = 0
+        self.n_agents = 0
+
+    def initialize(self, env: ComplexGridworld):
+        env[self.target] = Square(items=[Item(item_type="target", color=(0, 0, 100), shape="circle")])
+        self.n_agents = len(env.agents)
+        self.agents_at_target = int(env.occupancy[self.target])
+        self._update()
+
+    def on_move(self, env, agent_id, old_position, new_position):
+        self.agents_at_target += (new_position == self.target) - (old_position == self.target)
+        self._update()
+
+    def _update(self):
+        self.done = self.agents_at_target == self.n_agents
+        self.score = 100 if self.done else 0
+
+
+class OrderedLineTask(ScoringTask):
+    """
+    The agents must line up from start along the axis ("x" or "y"), sorted by name. Each agent in place is worth
+    100 / number of agents.
+    """
+
+    def __init__(self, start: Position = (0, 0), axis: str = "x"):
+        super().__init__()
+        self.start = tuple(start)
+        self.axis = axis
+        self.expected: Dict[int, Position] = {}
+        self.correct = 0
+
+    def initialize(self, env: ComplexGridworld):
+        start_x, start_y = self.start
+        agents_sorted = sorted(env.agents.values(), key=lambda agent: agent.name)
+        if self.axis == "x":
+            self.expected = {agent.id: (start_x + index, start_y) for index, agent in enumerate(agents_sorted)}
+        else:
+            self.expected = {agent.id: (start_x, start_y + index) for index, agent in enumerate(agents_sorted)}
+        self.correct = sum(1 for agent in agents_sorted if tuple(agent.position) == self.expected[agent.id])
+        self._update()
+
+    def on_move(self, env, agent_id, old_position, new_position):
+        expected = self.expected.get(agent_id)
+        self.correct += (new_position == expected) - (old_position == expected)
+        self._update()
+
+    def _update(self):
+        total_agents = len(self.expected)
+        self.score = self.correct / total_agents * 100 if total_agents > 0 else 0
+        self.done = self.correct == total_agents
+
+
+class DeliverItemsTask(ScoringTask):
+    """
+    Every target must hold an item. Each filled target is worth 100 / number of targets.
+
+    On initialize the items are placed at item_positions, owned by the agent with the same index when use_permissions
+    is set.
+    """
+
+    def __init__(self, targets: List[Position], item_positions: List[Position], use_permissions: bool = False,
+                 item_type: str = "item"):
+        super().__init__()
+        # A target listed twice counts twice
+        self.targets = Counter(tuple(target) for target in targets)
+        self.item_positions = [tuple(position) for position in item_positions]
+        self.use_permissions = use_permissions
+        self.item_type = item_type
+        self.items_on_target: Dict[Position, int] = {}
+        self.filled = 0
+
+    def initialize(self, env: ComplexGridworld):
+        env.pickable_item_types.add(self.item_type)
+        env.place_markers(list(self.targets), target_marker)
+        for i, (x, y) in enumerate(self.item_positions):
+            env[x, y].items = [Item(item_type=self.item_type, color=(200, 0, 0), shape="triangle",
+                                    allowed_agent_id=i if self.use_permissions else None)]
+
+        counts = env.item_type_counts(self.item_type)
+        self.items_on_target = {target: int(counts[target]) for target in self.targets}
+        self.filled = sum(self.targets[target] for target, count in self.items_on_target.items() if count)
+        self._update()
+
+    def on_pick(self, env, agent_id, position, item):
+        if position in self.items_on_target and item.item_type == self.item_type:
+            self.items_on_target[position] -= 1
+            if not self.items_on_target[position]:
+                self.filled -= self.targets[position]
+            if not env.item_counts[position]:
+                # The item had replaced the target marker
+                env.add_items(*position, [target_marker()])
+            self._update()
+
+    def on_drop(self, env, agent_id, position, item):
+        if position in self.items_on_target and item.item_type == self.item_type:
+            if not self.items_on_target[position]:
+                self.filled += self.targets[position]
+            self.items_on_target[position] += 1
+            self._update()
+
+    def _update(self):
+        total_targets = sum(self.targets.values())
+        self.score = self.filled / total_targets * 100 if total_targets > 0 else 0
+        self.done = self.filled == total_targets
+
+
+class CompositeTask(ScoringTask):
+    """Several tasks scored together: the score is their weighted sum, done once every task is done."""
+
+    def __init__(self, tasks: List[ScoringTask], weights: List[float]):
+        super().__init__()
+        self.tasks = tasks
+        self.weights = weights
+
+    def initialize(self, env: ComplexGridworld):
+        for task in self.tasks:
+            task.initialize(env)
+        self._update()
+
+    def on_move(self, env, agent_id, old_position, new_position):
+        for task in self.tasks:
+            task.on_move(env, agent_id, old_position, new_position)
+        self._update()
+
+    def on_pick(self, env, agent_id, position, item):
+        for task in self.tasks:
+            task.on_pick(env, agent_id, position, item)
+        self._update()
+
+    def on_drop(self, env, agent_id, position, item):
+        for task in self.tasks:
+            task.on_drop(env, agent_id, position, item)
+        self._update()
+
+    def _update(self):
+        self.score = sum(weight * task.score for task, weight in zip(self.tasks, self.weights))
+        self.done = all(task.done for task in self.tasks)
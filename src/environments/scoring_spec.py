@@ -0,0 +1,358 @@
+"""
+Declarative scoring specs. A config's `scoring` section names the rules of its task, e.g.
+
+    scoring:
+      deliver_items:
+        targets: target_positions
+        items: item_positions
+        permissions: True
+
+The section is compiled once per environment into a ScoringSpec. build_task returns the event-driven ScoringTask
+that scores a live environment step by step, evaluate scores a whole logged Trajectory at once with numpy.
+
+Rules:
+
+- occupy_targets: targets (positions or "corners"). Every target must be occupied by an agent.
+- all_agents_at: target (position). Every agent must stand on the target.
+- ordered_line: start (position, default [0, 0]), axis ("x" or "y", default "x"). The agents line up sorted by name.
+- deliver_items: targets, items (positions), permissions (bool), item_type (default "item"). Every target must hold
+  an item, items are placed at the item positions and owned by the agent with the same index with permissions.
+
+Every rule also takes a weight. The score of a spec is the weighted sum of its rule scores, the weights default to an
+equal share of 1.
+
+Each rule also plans how the agents complete it along the shortest routes of the map's distance fields
+(src.environments.map_analysis): every agent gets the waypoints it visits and the action it takes there. The plan
+gives the optimal number of steps benchmarks compare the agents against, and the scripted baseline follows it.
+"""
+from typing import Any, Dict, List, Optional, Tuple
+import ast
+import json
+import sqlite3
+
+import numpy as np
+
+from src.environments.map_analysis import UNREACHABLE, MapAnalysis, min_cost_assignment
+from src.environments.scoring import (AllAgentsAtTargetTask, CompositeTask, DeliverItemsTask, OccupyTargetsTask,
+                                      OrderedLineTask, ScoringTask)
+
+
+class Trajectory:
+    """
+    The states of one simulation as arrays with a leading time axis.
+
+    :param agent_names: Names of the agents, in the order of the agent axis.
+    :param agent_positions: (T, agents, 2) positions.
+    :param item_positions: Item type to (T, items, 2) positions. Squares without an item at that time are -1.
+    """
+
+    def __init__(self, agent_names: List[str], agent_positions: np.ndarray, item_positions: Dict[str, np.ndarray]):
+        self.agent_names = agent_names
+        self.agent_positions = agent_positions
+        self.item_positions = item_positions
+
+    def __len__(self):
+        return len(self.agent_positions)
+
+    @classmethod
+    def from_snapshots(cls, snapshots: List[Dict]) -> 'Trajectory':
+        """Builds a trajectory from ComplexGridworld.state_snapshot() dictionaries."""
+        agent_names = snapshots[0]["agent_names"] if snapshots else []
+        agent_positions = np.array([snapshot["agents"] for snapshot in snapshots], dtype=np.int64)
+        agent_positions = agent_positions.reshape(len(snapshots), len(agent_names), 2)
+
+        item_positions = {}
+        item_types = {item_type for snapshot in snapshots for item_type in snapshot["items"]}
+        for item_type in item_types:
+            per_step = [snapshot["items"].get(item_type, []) for snapshot in snapshots]
+            positions = np.full((len(snapshots), max(len(step) for step in per_step), 2), -1, dtype=np.int64)
+            for t, step in enumerate(per_step):
+                if step:
+                    positions[t, :len(step)] = step
+            item_positions[item_type] = positions
+        return cls(agent_names, agent_positions, item_positions)
+
+    def items(self, item_type: str) -> np.ndarray:
+        return self.item_positions.get(item_type, np.full((len(self), 0, 2), -1, dtype=np.int64))
+
+
+def load_trajectories(db_file: str, environment_name: Optional[str] = None) -> Dict[str, Trajectory]:
+    """
+    Loads the logged states of every simulation in a database, keyed by simulation id. Each assistant row of the
+    episodes table holds the state before its action.
+    """
+    query = "SELECT simulation_id, state FROM episodes WHERE role = 'assistant' AND state IS NOT NULL"
+    parameters = ()
+    if environment_name is not None:
+        query += " AND environment_name = ?"
+        parameters = (environment_name,)
+
+    snapshots: Dict[str, List[Dict]] = {}
+    connection = sqlite3.connect(db_file)
+    try:
+        for simulation_id, state in connection.execute(query + " ORDER BY rowid", parameters):
+            snapshots.setdefault(simulation_id, []).append(json.loads(state))
+    finally:
+        connection.close()
+    return {simulation_id: Trajectory.from_snapshots(states) for simulation_id, states in snapshots.items()}
+
+
+def parse_positions(value: Any, grid_size: Tuple[int, int]) -> np.ndarray:
+    """
+    Positions of a rule as a (k, 2) array. Accepts a list, its string form (random variables are substituted as
+    strings) or "corners".
+    """
+    if value == "corners":
+        width, height = grid_size
+        value = [(0, 0), (width - 1, 0), (0, height - 1), (width - 1, height - 1)]
+    elif isinstance(value, str):
+        value = ast.literal_eval(value)
+    return np.asarray(value, dtype=np.int64).reshape(-1, 2)
+
+
+# A square to reach and the action taken there, None to only reach it
+Waypoint = Tuple[Tuple[int, int], Optional[str]]
+
+
+def _route_costs(analysis: MapAnalysis, starts: np.ndarray, goals: np.ndarray) -> np.ndarray:
+    """(starts, goals) numbers of moves from the goals' distance fields, unreachable pairs cost more than any route."""
+    costs = np.empty((len(starts), len(goals)), dtype=np.int64)
+    for j, goal in enumerate(goals.tolist()):
+        costs[:, j] = analysis.field(goal)[starts[:, 0], starts[:, 1]]
+    costs[costs == UNREACHABLE] = analysis.obstacles.size
+    return costs
+
+
+def _matches(positions: np.ndarray, targets: np.ndarray) -> np.ndarray:
+    """(T, n, 2) positions against (k, 2) targets: (T, k) whether any of the n positions is on each target."""
+    return (positions[:, :, None, :] == targets[None, None, :, :]).all(axis=-1).any(axis=1)
+
+
+class ScoringRule:
+    """One rule of a scoring spec."""
+
+    # Parameter a rule given as a plain value is assigned to
+    default_parameter = None
+
+    def __init__(self, weight: Optional[float] = None):
+        self.weight = weight
+
+    def task(self) -> ScoringTask:
+        """The event-driven task scoring this rule on a live environment."""
+        raise NotImplementedError
+
+    def evaluate(self, trajectory: Trajectory) -> Tuple[np.ndarray, np.ndarray]:
+        """Scores and done flags of every state of the trajectory, as two (T,) arrays."""
+        raise NotImplementedError
+
+    def plan(self, env) -> Dict[int, List[Waypoint]]:
+        """The waypoints of each agent that complete the rule with the fewest moves, from the current state."""
+        raise NotImplementedError
+
+
+class OccupyTargets(ScoringRule):
+    default_parameter = "targets"
+
+    def __init__(self, targets: np.ndarray, weight: Optional[float] = None):
+        super().__init__(weight)
+        self.targets = np.unique(targets, axis=0)
+
+    def task(self) -> ScoringTask:
+        return OccupyTargetsTask([tuple(target) for target in self.targets.tolist()])
+
+    def evaluate(self, trajectory):
+        occupied = _matches(trajectory.agent_positions, self.targets).sum(axis=1)
+        return occupied * 100 / len(self.targets), occupied == len(self.targets)
+
+    def plan(self, env):
+        costs = _route_costs(env.map_analysis, env.agent_positions, self.targets)
+        return {
+            agent_id: [(tuple(self.targets[target].tolist()), None)]
+            for agent_id, target in zip(env.agent_ids, min_cost_assignment(costs)) if target is not None
+        }
+
+
+class AllAgentsAt(ScoringRule):
+    default_parameter = "target"
+
+    def __init__(self, target: np.ndarray, weight: Optional[float] = None):
+        super().__init__(weight)
+        self.target = target[0]
+
+    def task(self) -> ScoringTask:
+        return AllAgentsAtTargetTask(tuple(self.target.tolist()))
+
+    def evaluate(self, trajectory):
+        done = (trajectory.agent_positions == self.target).all(axis=-1).all(axis=1)
+        return np.where(done, 100, 0), done
+
+    def plan(self, env):
+        return {agent_id: [(tuple(self.target.tolist()), None)] for agent_id in env.agent_ids}
+
+
+class OrderedLine(ScoringRule):
+    default_parameter = "start"
+
+    def __init__(self, start: np.ndarray = None, axis: str = "x", weight: Optional[float] = None):
+        super().__init__(weight)
+        self.start = np.zeros(2, dtype=np.int64) if start is None else start[0]
+        self.axis = axis
+
+    def task(self) -> ScoringTask:
+        return OrderedLineTask(tuple(self.start.tolist()), axis=self.axis)
+
+    def evaluate(self, trajectory):
+        total_agents = len(trajectory.agent_names)
+        order = sorted(range(total_agents), key=trajectory.agent_names.__getitem__)
+        step = np.array([1, 0] if self.axis == "x" else [0, 1], dtype=np.int64)
+        expected = self.start + np.arange(total_agents)[:, None] * step
+        correct = (trajectory.agent_positions[:, order] == expected).all(axis=-1).sum(axis=1)
+        scores = correct / total_agents * 100 if total_agents > 0 else np.zeros(len(trajectory))
+        return scores, correct == total_agents
+
+    def plan(self, env):
+        start_x, start_y = self.start.tolist()
+        agents_sorted = sorted(env.agents.values(), key=lambda agent: agent.name)
+        if self.axis == "x":
+            return {agent.id: [((start_x + index, start_y), None)] for index, agent in enumerate(agents_sorted)}
+        return {agent.id: [((start_x, start_y + index), None)] for index, agent in enumerate(agents_sorted)}
+
+
+class DeliverItems(ScoringRule):
+    default_parameter = "targets"
+
+    def __init__(self, targets: np.ndarray, items: np.ndarray = None, permissions: bool = False,
+                 item_type: str = "item", weight: Optional[float] = None):
+        super().__init__(weight)
+        # Not deduplicated: a target listed twice counts twice
+        self.targets = targets
+        self.items = np.empty((0, 2), dtype=np.int64) if items is None else items
+        self.permissions = permissions
+        self.item_type = item_type
+
+    def task(self) -> ScoringTask:
+        return DeliverItemsTask([tuple(target) for target in self.targets.tolist()],
+                                [tuple(item) for item in self.items.tolist()],
+                                use_permissions=self.permissions, item_type=self.item_type)
+
+    def evaluate(self, trajectory):
+        filled = _matches(trajectory.items(self.item_type), self.targets).sum(axis=1)
+        total_targets = len(self.targets)
+        scores = filled / total_targets * 100 if total_targets > 0 else np.zeros(len(trajectory))
+        return scores, filled == total_targets
+
+    def plan(self, env):
+        """
+        Each agent carries one item to one target. With permissions agent i carries item i, otherwise the agents are
+        assigned to the items they are closest to overall. Items already lying on a target stay there.
+        """
+        analysis = env.map_analysis
+        placed = _matches(self.items[None], self.targets)[0]
+        free_targets = np.flatnonzero(~placed)
+        loose_items = np.flatnonzero(~_matches(self.targets[None], self.items)[0])
+        targets = min_cost_assignment(_route_costs(analysis, self.items[loose_items], self.targets[free_targets]))
+        targets = {item: free_targets[target] for item, target in zip(loose_items.tolist(), targets)
+                   if target is not None}
+
+        if self.permissions:
+            # Item i is owned by the agent with id i
+            carriers = {item: item for item in targets if item in env.agents}
+        else:
+            items = list(targets)
+            assignment = min_cost_assignment(_route_costs(analysis, env.agent_positions, self.items[items]))
+            carriers = {items[item]: agent_id for agent_id, item in zip(env.agent_ids, assignment) if item is not None}
+
+        plan = {}
+        for item, agent_id in carriers.items():
+            plan[agent_id] = [(tuple(self.items[item].tolist()), "pick"),
+                              (tuple(self.targets[targets[item]].tolist()), "drop")]
+        return plan
+
+
+RULES = {
+    "occupy_targets": OccupyTargets,
+    "all_agents_at": AllAgentsAt,
+    "ordered_line": OrderedLine,
+    "deliver_items": DeliverItems,
+}
+
+# Parameters holding positions, parsed with parse_positions
+POSITION_PARAMETERS = {"targets", "target", "items", "start"}
+
+
+class ScoringSpec:
+    """A compiled scoring section: its rules and their weights."""
+
+    def __init__(self, rules: List[ScoringRule]):
+        if not rules:
+            raise ValueError("A scoring spec needs at least one rule")
+        self.rules = rules
+        default_weight = 1 / len(rules)
+        self.weights = [default_weight if rule.weight is None else rule.weight for rule in rules]
+
+    def build_task(self) -> ScoringTask:
+        """A new event-driven task for one environment, register it with ComplexGridworld.register_task."""
+        if len(self.rules) == 1 and self.weights[0] == 1:
+            return self.rules[0].task()
+        return CompositeTask([rule.task() for rule in self.rules], self.weights)
+
+    def evaluate(self, trajectory: Trajectory) -> Tuple[np.ndarray, np.ndarray]:
+        """Scores and done flags of every state of a trajectory, as two (T,) arrays."""
+        scores = np.zeros(len(trajectory))
+        done = np.ones(len(trajectory), dtype=bool)
+        for rule, weight in zip(self.rules, self.weights):
+            rule_scores, rule_done = rule.evaluate(trajectory)
+            scores = scores + weight * rule_scores
+            done &= rule_done
+        return scores, done
+
+    def plan(self, env) -> Dict[int, List[Waypoint]]:
+        """The waypoints of each agent, the plans of the rules one after the other."""
+        plan: Dict[int, List[Waypoint]] = {}
+        for rule in self.rules:
+            for agent_id, waypoints in rule.plan(env).items():
+                plan.setdefault(agent_id, []).extend(waypoints)
+        return plan
+
+    def optimal_steps(self, env) -> Optional[int]:
+        """
+        The moves of all agents to complete the spec from the current state along plan(), None if a waypoint cannot
+        be reached. Optimal for single rule specs, given that each agent carries at most one item.
+        """
+        analysis = env.map_analysis
+        total = 0
+        for agent_id, waypoints in self.plan(env).items():
+            position = tuple(env.agents[agent_id].position)
+            for waypoint, _ in waypoints:
+                distance = analysis.distance(position, waypoint)
+                if distance is None:
+                    return None
+                total += distance
+                position = waypoint
+        return total
+
+
+def compile_scoring(spec: Dict[str, Any], grid_size: Tuple[int, int]) -> ScoringSpec:
+    """
+    Compiles a config's scoring section.
+
+    :param spec: Rule name to its parameters, or to the value of its main parameter.
+    :param grid_size: (width, height) of the environment, used by "corners".
+    :raises ValueError: On an unknown rule.
+    """
+    rules = []
+    for name, parameters in spec.items():
+        rule_class = RULES.get(name)
+        if rule_class is None:
+            raise ValueError(f"Unknown scoring rule '{name}', expected one of {list(RULES)}")
+        if parameters is None:
+            parameters = {}
+        elif not isinstance(parameters, dict):
+            parameters = {rule_class.default_parameter: parameters}
+
+        parameters = {
+            key: parse_positions(value, grid_size) if key in POSITION_PARAMETERS else value
+            for key, value in parameters.items()
+        }
+        rules.append(rule_class(**parameters))
+    return ScoringSpec(rules)
@@ -0,0 +1,170 @@
+from typing import Dict, Hashable, Iterator, List, Tuple
+
+import numpy as np
+
+Position = Tuple[int, int]
+
+
+class SpatialIndex:
+    """
+    Uniform bucket grid over points on the grid. Inserting, moving and removing a point is O(1), a query only visits
+    the buckets overlapping its window, so its cost follows the number of points nearby rather than the grid size.
+
+    :param bucket_size: Side of a bucket in squares.
+    """
+
+    def __init__(self, bucket_size: int = 8):
+        self.bucket_size = bucket_size
+        self.positions: Dict[Hashable, Position] = {}
+        # Bucket to the keys in it, dicts keep the insertion order so queries are deterministic
+        self.buckets: Dict[Position, Dict[Hashable, None]] = {}
+
+    def __len__(self):
+        return len(self.positions)
+
+    def __contains__(self, key: Hashable):
+        return key in self.positions
+
+    def _bucket(self, position: Position) -> Position:
+        return position[0] // self.bucket_size, position[1] // self.bucket_size
+
+    def insert(self, key: Hashable, position: Position):
+        position = (int(position[0]), int(position[1]))
+        self.positions[key] = position
+        self.buckets.setdefault(self._bucket(position), {})[key] = None
+
+    def remove(self, key: Hashable):
+        position = self.positions.pop(key)
+        bucket = self._bucket(position)
+        del self.buckets[bucket][key]
+        if not self.buckets[bucket]:
+            del self.buckets[bucket]
+
+    def move(self, key: Hashable, position: Position):
+        old_bucket = self._bucket(self.positions[key])
+        position = (int(position[0]), int(position[1]))
+        self.positions[key] = position
+        new_bucket = self._bucket(position)
+        if new_bucket != old_bucket:
+            del self.buckets[old_bucket][key]
+            if not self.buckets[old_bucket]:
+                del self.buckets[old_bucket]
+            self.buckets.setdefault(new_bucket, {})[key] = None
+
+    def _keys_in_area(self, min_x: int, min_y: int, max_x: int, max_y: int) -> Iterator[Hashable]:
+        """The keys of the buckets overlapping the area, a superset of the keys inside it."""
+        min_bx, min_by = self._bucket((min_x, min_y))
+        max_bx, max_by = self._bucket((max_x, max_y))
+        if (max_bx - min_bx + 1) * (max_by - min_by + 1) > len(self.buckets):
+            # An area wider than the occupied one, walking the occupied buckets is cheaper
+            for (bx, by), keys in self.buckets.items():
+                if min_bx <= bx <= max_bx and min_by <= by <= max_by:
+                    yield from keys
+            return
+        for bx in range(min_bx, max_bx + 1):
+            for by in range(min_by, max_by + 1):
+                keys = self.buckets.get((bx, by))
+                if keys:
+                    yield from keys
+
+    def query(self, x: int, y: int, radius: int) -> List[Hashable]:
+        """The keys within the square window of Chebyshev radius around (x, y)."""
+        found = []
+        for key in self._keys_in_area(x - radius, y - radius, x + radius, y + radius):
+            px, py = self.positions[key]
+            if abs(px - x) <= radius and abs(py - y) <= radius:
+                found.append(key)
+        return found
+
+    def query_many(self, points: List[Position], radius: int) -> List[List[Hashable]]:
+        """
+        query for many points at once. The points are grouped by bucket, the keys around each group are gathered once
+        and filtered against all the points of the group with one numpy comparison.
+
+        :return: The keys found around each point, in the order of points.
+        """
+        groups: Dict[Position, List[int]] = {}
+        for i, point in enumerate(points):
+            groups.setdefault(self._bucket(point), []).append(i)
+
+        found: List[List[Hashable]] = [[] for _ in points]
+        for indexes in groups.values():
+            if len(indexes) == 1:
+                # A lone point is cheaper to query directly than through numpy
+                found[indexes[0]] = self.query(*points[indexes[0]], radius)
+                continue
+            group = np.array([points[i] for i in indexes], dtype=np.int64).reshape(-1, 2)
+            (min_x, min_y), (max_x, max_y) = group.min(axis=0).tolist(), group.max(axis=0).tolist()
+            keys = list(self._keys_in_area(min_x - radius, min_y - radius, max_x + radius, max_y + radius))
+            if not keys:
+                continue
+            candidates = np.array([self.positions[key] for key in keys], dtype=np.int64)
+            near = np.abs(group[:, None, :] - candidates[None, :, :]).max(axis=2) <= radius
+            for i, row in zip(indexes, near):
+                found[i] = [keys[j] for j in row.nonzero()[0].tolist()]
+        return found
+
+
+class SparseCells:
+    """
+    A grid_size array stored as a dict of its non-zero squares, so memory follows the occupied squares instead of
+    the grid area. Supports the indexing ComplexGridworld uses on its dense arrays: cells[x, y], cells[xs, ys] with
+    index arrays, assignment to both and cells[:] = 0.
+    """
+
+    def __init__(self, shape: Tuple[int, int], dtype=np.int32):
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        # Values are kept as Python scalars, cheaper than numpy scalars on single squares
+        self._cast = {"b": bool, "f": float}.get(self.dtype.kind, int)
+        self.cells: Dict[Position, object] = {}
+
+    @property
+    def size(self) -> int:
+        return self.shape[0] * self.shape[1]
+
+    def __getitem__(self, key):
+        x, y = key
+        if np.ndim(x) == 0:
+            return self._cast(self.cells.get((int(x), int(y)), 0))
+        positions = zip(np.asarray(x).tolist(), np.asarray(y).tolist())
+        return np.array([self.cells.get(position, 0) for position in positions], dtype=self.dtype)
+
+    def __setitem__(self, key, value):
+        if isinstance(key, slice):
+            if key != slice(None) or value:
+                raise ValueError("Only cells[:] = 0 is supported")
+            self.cells.clear()
+            return
+        x, y = key
+        if np.ndim(x) == 0:
+            self._set((int(x), int(y)), value)
+            return
+        xs, ys = np.asarray(x).tolist(), np.asarray(y).tolist()
+        for position, cell_value in zip(zip(xs, ys), np.broadcast_to(value, (len(xs),)).tolist()):
+            self._set(position, cell_value)
+
+    def _set(self, position: Position, value):
+        value = self._cast(value)
+        if value:
+            self.cells[position] = value
+        else:
+            self.cells.pop(position, None)
+
+    def add_at(self, xs, ys, delta):
+        for position in zip(np.asarray(xs).tolist(), np.asarray(ys).tolist()):
+            self._set(position, self.cells.get(position, 0) + delta)
+
+    def sum(self):
+        return sum(self.cells.values())
+
+    def nonzero(self) -> List[Position]:
+        return list(self.cells)
+
+
+def add_at(cells, xs, ys, delta):
+    """np.add.at for dense arrays and SparseCells alike."""
+    if isinstance(cells, SparseCells):
+        cells.add_at(xs, ys, delta)
+    else:
+        np.add.at(cells, (xs, ys), delta)
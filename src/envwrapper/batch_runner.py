@@ -0,0 +1,77 @@
+from typing import Dict, List
+from src.agent.backend.batch_client import BatchClient
+from src.environments.custom_environments.complex_gridworld_environment import ComplexGridworld
+from src.envwrapper.simulator import (add_local_views, advance_goto, apply_agent_turn, finish_simulation,
+                                     start_simulation)
+from src.utils.output_parsing import ActionDecision
+
+
+def batch_request(agent) -> Dict:
+    """The chat completion request the agent's backend would send for its pending turn."""
+    backend = agent.backend
+    return {
+        "model": agent.backend_model,
+        "messages": backend._truncate_messages(agent.messages),
+        "temperature": getattr(backend, "temperature", 0.9),
+    }
+
+
+def run_simulations_batched(envs: List[ComplexGridworld], batch_client: BatchClient) -> List[float]:
+    """
+    Runs several simulations in lockstep, sending the model calls of each tick to a batch API as one job.
+
+    A tick is one agent's turn in every simulation: agents within a simulation still act one after the other
+    and see the messages of the agents before them, exactly as in run_simulation.
+
+    :param envs: Environments loaded with Simulator.load_environment_config.
+    :param batch_client: Client of the batch API that answers the turns.
+    :return: The final score of every simulation.
+    """
+    for env in envs:
+        start_simulation(env)
+
+    max_episodes = max(env.max_episodes for env in envs)
+    max_agents = max(len(env.agents) for env in envs)
+
+    for episode in range(max_episodes):
+        print(episode)
+        for env in envs:
+            if not env.terminated and episode < env.max_episodes:
+                add_local_views(env)
+        for turn in range(max_agents):
+            pending = {}
+            for sim, env in enumerate(envs):
+                if env.terminated or episode >= env.max_episodes or turn >= len(env.agents):
+                    continue
+                agent_id, agent = list(env.agents.items())[turn]
+                agent.variables["current_episode"] = episode
+
+                if env.has_pending_goto(agent_id):
+                    advance_goto(env, agent)
+                    continue
+
+                agent._prepare_step()
+                pending[f"sim-{sim}-episode-{episode}-agent-{agent_id}"] = (env, agent_id, agent)
+
+            if not pending:
+                continue
+
+            responses = batch_client.run({
+                custom_id: batch_request(agent) for custom_id, (_, _, agent) in pending.items()
+            })
+
+            for custom_id, (env, agent_id, agent) in pending.items():
+                response = responses[custom_id]
+                if response is None:
+                    print(f"Batch request {custom_id} failed, the turn counts as an invalid action")
+                    agent.add_agent_message("")
+                    decision = ActionDecision()
+                else:
+                    decision = agent._finish_step(response)
+                apply_agent_turn(env, episode, agent_id, agent, decision)
+
+    for env in envs:
+        finish_simulation(env)
+
+    print(f"Batch usage: {batch_client.stats}")
+    return [env.score for env in envs]
@@ -12,9 +12,6 @@ from src.environments.custom_environments.complex_gridworld_environment import C
 from src.environments.custom_environments.gridworld_environment import GridworldEnvironment
 from src.envwrapper.env_names import EnvironmentNames
 
-# Loading the env file.
-load_dotenv()
-
 
 class EnvManager:
 
@@ -23,8 +20,9 @@ class EnvManager:
         EnvironmentNames.COMPLEX_GRID_WORLD.value: ComplexGridworld
     }
     
+    # Prompts are loaded by system_prompt when first needed, not at import time
     __prompt_map = {
-        EnvironmentNames.GRID_WORLD.value: PromptLoader().load_prompt("gridworld_system_prompt")
+        EnvironmentNames.GRID_WORLD.value: "gridworld_system_prompt"
     }
 
     def __init__(self, env_name, **kwargs):
@@ -38,6 +36,9 @@ class EnvManager:
         :param kwargs   : used to spin up the environment object. If no kwarg is specified, it will use the
                           default settings for environment.
          """
+        # Loading the env file.
+        load_dotenv()
+
         self.agents = []
         self.target = None
         self.output_instruction_text = None
@@ -51,6 +52,17 @@ class EnvManager:
         self.num_episodes: int = None
         self.db_manager = None
 
+    def system_prompt(self):
+        """
+        Loads the system prompt of the environment.
+
+        :return: The prompt, None if the environment has no default prompt.
+        """
+        prompt_name = self.__prompt_map.get(self.env_name)
+        if prompt_name is None:
+            return None
+        return PromptLoader().load_prompt(prompt_name)
+
     def create_agents(self, agents, unified_goal, prompt, agent_starting_positions):
         """
         Creates the specified agents.
@@ -65,7 +77,7 @@ class EnvManager:
             agent_id = int(i)
             name = agents[i]
             action_space = []
-            #system_prompt = self.__prompt_map[self.env_name]
+            #system_prompt = self.system_prompt()
 
             variables = {
                 "name": agents[i],
@@ -144,15 +156,14 @@ class EnvManager:
                 observation = env.get_agent_position(agent.id)
                 agent.observation = f"Your current position is: {observation}"
                 print(f"Agent {agent.id}: {agent.name}, Observation {observation}")
-                action = agent.step()
+                decision = agent.step()
 
-                # Extract the action name from the agent's response
-                action_name = action.get("action_name", "invalid")
+                action_name = decision.action_name
                 print(f"Agent {agent.id} Action: {action_name}")
-                print(f"Rationale: {action.get('rationale', 'No rationale provided.')}")
+                print(f"Rationale: {decision.rationale or 'No rationale provided.'}")
 
                 # Execute the action in the environment
-                observation_str = env.step(agent.id, action_name)
+                observation_str = str(env.step(agent.id, action_name))
 
                 # Display the updated grid state
                 print("Updated Grid State:")
@@ -166,7 +177,7 @@ class EnvManager:
                     self.db_manager['episodes'].insert(
                         episode_id = episode,
                         agent_id= agent.id,
-                        history=[{"action": action, "result": observation_str}]
+                        history=[{"action": decision.to_dict(), "result": observation_str}]
                     )
 
                 # Check if the agent has reached the target position
@@ -2,23 +2,54 @@ import yaml
 import re
 import time
 from src.environments.custom_environments.complex_gridworld_environment import ComplexGridworld, Item
-from src.gui.gui import GUI
 from src.agent.actions import Action, format_actions
 from src.environments.DEFAULT_CONFIGS import DEFAULT_CONFIGS
+from src.environments.scoring_spec import compile_scoring, parse_positions
 from src.storage.database import DatabaseManager
 from src.agent.base_agent import Agent
+from src.agent.backend.telemetry import get_collector
+from src.utils.output_parsing import ActionDecision
 import random
 from typing import List, Dict
 import uuid  # Add this at the top with other imports
 
+# Actions that count as a step taken
+MOVEMENT_ACTIONS = frozenset(("north", "south", "east", "west", "goto"))
+
+
+def log_llm_calls(env: ComplexGridworld, episode_row_id: int, agent_id: int, records: List[Dict]):
+    """Write the telemetry of the LLM calls behind one agent turn, linked to the turn's episodes row."""
+    for record in records:
+        env.db_manager["llm_calls"].insert(
+            episode_row_id=episode_row_id,
+            simulation_id=env.sim_id,
+            agent_id=agent_id,
+            provider=record["provider"],
+            model=record["model"],
+            key_id=record["key_id"],
+            queue_wait=record["queue_wait"],
+            key_wait=record["key_wait"],
+            rate_limit_wait=record["rate_limit_wait"],
+            latency=record["latency"],
+            time_to_first_token=record["time_to_first_token"],
+            time_to_action=record["time_to_action"],
+            total_time=record["total_time"],
+            prompt_tokens=record["prompt_tokens"],
+            completion_tokens=record["completion_tokens"],
+            retries=record["retries"],
+            streamed=int(record["streamed"]),
+            error=record["error"],
+        )
 
-# Define the simulation logic in a function
-def run_simulation(env: ComplexGridworld):
+
+def start_simulation(env: ComplexGridworld):
+    """
+    Opens the database, assigns a simulation id and gives every agent its first observation.
+    """
     if env.use_db:
         env.db_manager = DatabaseManager(reset_db=False)
 
     env.sim_id = str(uuid.uuid4())
-    time.sleep(10)
     # Initial observation of the agent's position
     for agent_id, agent in env.agents.items():
         agent.variables["current_episode"] = 0
@@ -40,61 +71,118 @@ def run_simulation(env: ComplexGridworld):
             )
 
     env.variables["group_messages"] = []
-    env.score = 0
+    env.score = sum(task.score for task in env.tasks)
+
+
+def add_local_views(env: ComplexGridworld):
+    """
+    Under partial observability, appends what each agent sees around it to its observation. The views of all agents
+    are computed together once per episode with ComplexGridworld.observe_all, agents acting later in the episode see
+    the surroundings as they were at its start.
+    """
+    if env.field_of_view is None:
+        return
+    views = env.observe_all(env.field_of_view["radius"], env.field_of_view["line_of_sight"])
+    for agent_id, view in views.items():
+        agent = env.agents[agent_id]
+        agent.observation = f"{agent.observation}\n{view}"
+
+
+def advance_goto(env: ComplexGridworld, agent: Agent):
+    """
+    The agent is still travelling along its goto route, advance it without querying the model.
+    """
+    agent.observation = env.step(agent.id, "goto")
+    agent.variables["steps_taken"] += 1
+
+
+def apply_agent_turn(env: ComplexGridworld, episode: int, agent_id: int, agent: Agent, decision: ActionDecision,
+                     llm_calls: List[Dict] = ()):
+    """
+    Logs an agent's turn, delivers its message to the other agents and executes its action.
+
+    :param decision: The agent's parsed decision for the turn.
+    :param llm_calls: Telemetry records of the LLM calls that produced the turn.
+    """
+    if env.db_manager is not None:
+        # Log user observation to the database
+        env.db_manager["episodes"].insert(
+            environment_name=env.name,
+            simulation_id=env.sim_id,
+            episode_number=episode,
+            agent_id=agent_id,
+            role="user",
+            content=agent.last_user_message,
+            action=None,
+            score=env.score,
+        )
+
+        episode_row_id = env.db_manager["episodes"].insert(
+            environment_name=env.name,
+            simulation_id=env.sim_id,
+            episode_number=episode,
+            agent_id=agent_id,
+            role="assistant",
+            content=agent.last_assistant_message,
+            action=decision.action_name,
+            score=env.score,
+            state=env.state_snapshot(),
+        )
+        log_llm_calls(env, episode_row_id, agent_id, llm_calls)
+
+    # Check if there is a message to send and distribute it to other agents
+    message = decision.message
+    if message:
+        message = f"From: {agent.name}\nMessage: {message}\n"
+        for other_agent_id, other_agent in env.agents.items():
+            if other_agent_id != agent_id:  # Only send to other agents
+                other_agent.add_inbox_message(message)
+        env.variables["group_messages"].append(
+            {
+                "from": agent.name,
+                "message": message
+            }
+        )
+
+    if decision.action_name == "invalid":
+        agent.observation = "your action was invalid"
+    else:
+        # Execute the action in the environment
+        agent.observation = env.step(agent.id, decision.action_name, decision.action_parameters)
+        if decision.action_name in MOVEMENT_ACTIONS:
+            agent.variables["steps_taken"] += 1
+
+
+def finish_simulation(env: ComplexGridworld):
+    env.terminated = True
+    for agent in env.agents.values():
+        agent.backend.record_outcome(env.score)
+
+    # Final summary
+    print(f"Simulation Complete: the final score is {env.score}")
+
+
+# Define the simulation logic in a function
+def run_simulation(env: ComplexGridworld):
+    start_simulation(env)
+    time.sleep(10)
 
     for episode in range(env.max_episodes):
         print(episode)
+        add_local_views(env)
         for agent_id, agent in env.agents.items():
             agent.variables["current_episode"] = episode
 
+            if env.has_pending_goto(agent_id):
+                advance_goto(env, agent)
+                if env.terminated:
+                    break
+                continue
+
             # Agent makes a decision based on the current observation
-            action_dict = agent.step()
-
-            if env.db_manager is not None:
-                # Log user observation to the database
-                env.db_manager["episodes"].insert(
-                    environment_name=env.name,
-                    simulation_id=env.sim_id,
-                    episode_number=episode,
-                    agent_id=agent_id,
-                    role="user",
-                    content=agent.last_user_message,
-                    action=None,
-                    score=env.score,
-                )
-
-                env.db_manager["episodes"].insert(
-                    environment_name=env.name,
-                    simulation_id=env.sim_id,
-                    episode_number=episode,
-                    agent_id=agent_id,
-                    role="assistant",
-                    content=agent.last_assistant_message,
-                    action=None,  #
-                    score=env.score,
-                )
-
-            # Check if there is a message to send and distribute it to other agents
-            message = action_dict.get("message", "")
-            if message:
-                message = f"From: {agent.name}\nMessage: {message}\n"
-                for other_agent_id, other_agent in env.agents.items():
-                    if other_agent_id != agent_id:  # Only send to other agents
-                        other_agent.add_inbox_message(message)
-                env.variables["group_messages"].append(
-                    {
-                        "from": agent.name,
-                        "message": message
-                    }
-                )
-
-            if action_dict.get("action_name", None) == None:
-                agent.observation = "your action was invalid"
-            else:
-                # Execute the action in the environment
-                agent.observation = env.step(agent.id, action_dict["action_name"])
-                if action_dict.get("action_name", None) in ["north", "south", "east", "west"]:
-                    agent.variables["steps_taken"] += 1
+            with get_collector().collect((env.sim_id, episode, agent_id)) as calls:
+                decision = agent.step()
+            apply_agent_turn(env, episode, agent_id, agent, decision, calls)
 
             if env.terminated:
                 break
@@ -102,9 +190,7 @@ def run_simulation(env: ComplexGridworld):
         if env.terminated:
             break
 
-    env.terminated = True
-    # Final summary
-    print(f"Simulation Complete: the final score is {env.score}")
+    finish_simulation(env)
 
     return 0
 
@@ -121,13 +207,25 @@ class Simulator:
             backend_provider,
             backend_model,
             configs: Dict[str, Dict] = DEFAULT_CONFIGS,
-            db_name: str = "simulation_data"
+            db_name: str = "simulation_data",
+            escalation_provider=None,
+            escalation_model=None,
+            hedge_budget=None,
+            fallback_models=None,
+            coalesce_requests=False,
+            minify_prompts=False
     ):
         """
         Initializes an empty dictionary to keep track of each environment.
 
         :param use_db: Boolean to use database
         :param use_gui: Boolean to use GUI
+        :param escalation_provider: Provider of the escalation model, defaults to backend_provider
+        :param escalation_model: Larger model that turns are escalated to when the backend model's output is rejected
+        :param hedge_budget: Fraction of slow requests that may be hedged on a second key, None to disable hedging
+        :param fallback_models: (provider, model) pairs that requests fail over to when the backend is down
+        :param coalesce_requests: Let concurrent identical requests share one provider call (and its sampled answer)
+        :param minify_prompts: Strip markdown and whitespace from the prompts and do not repeat the goal every turn
         """
         self.use_db = use_db
         self.db_name = db_name
@@ -140,6 +238,14 @@ class Simulator:
         for key, config in self.configs.items():
             config["backend_model"] = backend_model
 
+        for key, config in self.configs.items():
+            config["escalation_provider"] = escalation_provider
+            config["escalation_model"] = escalation_model
+            config["hedge_budget"] = hedge_budget
+            config["fallback_models"] = fallback_models
+            config["coalesce_requests"] = coalesce_requests
+            config["minify_prompts"] = minify_prompts
+
         self.environments: dict[str, ComplexGridworld] = {}
 
         self.name_bank = [
@@ -169,6 +275,12 @@ class Simulator:
             "skip": Action(name="skip", description="Do nothing and skip this step."),
             "pick": Action(name="pick", description="Pick up the item at current position"),
             "drop": Action(name="drop", description="Drop off the item at current position"),
+            "goto": Action(
+                name="goto",
+                description="Travel to position (x, y) along the shortest path around obstacles, one step per "
+                            "episode. You will not be asked for a new action until you arrive or the path is blocked",
+                parameters={"x": "target x-coordinate", "y": "target y-coordinate"}
+            ),
         }
 
         self.random_variables = {}
@@ -187,13 +299,17 @@ class Simulator:
             except Exception as e:
                 print(e)
 
-    def run(self, config_key: str, num_simulations: int = 1):
+    def run(self, config_key: str, num_simulations: int = 1, batch_client=None):
         """
         Runs all environments in the simulator.
 
         :param num_simulations: Number of simulations for each environment.
         :param max_episodes: Maximum number of episodes for each environment.
+        :param batch_client: Optional BatchClient, runs the simulations in lockstep through a batch API instead.
         """
+        if batch_client is not None:
+            return self.run_batched(config_key, num_simulations, batch_client)
+
         scores = []  # List to store scores from each simulation
 
         for sim in range(num_simulations):
@@ -212,6 +328,7 @@ class Simulator:
                 if num_simulations >= 20:
                     print("There is a bug in the GUI, you may need to exit the window at the end of a simulation.")
 
+                from src.gui.gui import GUI
                 gui = GUI(env=env)
                 gui.run(run_simulation)
             else:
@@ -223,6 +340,38 @@ class Simulator:
 
         return scores
 
+    def run_batched(self, config_key: str, num_simulations: int, batch_client):
+        """
+        Runs the simulations of a config together, each tick's model calls are sent as one batch job.
+
+        :param num_simulations: Number of simulations to run.
+        :param batch_client: BatchClient of the provider's batch API.
+        """
+        from src.envwrapper.batch_runner import run_simulations_batched
+
+        if self.use_gui:
+            print("The GUI is not available in batch mode, running without it.")
+
+        envs = []
+        for sim in range(num_simulations):
+            env = self.load_environment_config(config_key)
+            self.env_map.setdefault(config_key, {})[sim] = env
+            env.sim_id = self.sim_num
+            self.sim_num += 1
+            envs.append(env)
+
+        print(f"Running {num_simulations} simulations of {config_key} in batch mode...")
+        scores = run_simulations_batched(envs, batch_client)
+        print("scores are for: ", scores)
+        return scores
+
+    def get_llm_telemetry(self) -> Dict[str, Dict]:
+        """
+        Summary of every LLM call made so far: call, error and retry counts, token totals, and p50/p95/p99 of the
+        waits, latencies and token counts, per provider/model.
+        """
+        return get_collector().summary()
+
     def generate_random_variables(self, random_definitions):
         random_values = {}
         for var, expression in random_definitions.items():
@@ -253,16 +402,24 @@ class Simulator:
             system_prompt: str,
             user_prompt: str,
             output_instruction_prompt: str,
-            backend_model: tuple[str, str]
+            backend_model: tuple[str, str],
+            escalation_model: tuple[str, str] = (None, None),
+            hedge_budget: float = None,
+            fallback_models: list = None,
+            coalesce_requests: bool = False,
+            minify_prompts: bool = False,
+            blocked_positions=()
     ):
         agents = {}
         positions = set()
         num_agents = int(num_agents)
+        blocked_positions = set(blocked_positions)
 
-        # Generate random, unique starting positions within the grid size
+        # Generate random, unique starting positions within the grid size, off the obstacles
         while len(positions) < num_agents:
             position = (random.randint(0, grid_size[0] - 1), random.randint(0, grid_size[1] - 1))
-            positions.add(position)
+            if position not in blocked_positions:
+                positions.add(position)
 
         starting_positions = list(positions)
 
@@ -288,7 +445,13 @@ class Simulator:
                 variables=variables,
                 action_space=action_space,
                 backend_provider=backend_model[0],
-                backend_model=backend_model[1]
+                backend_model=backend_model[1],
+                escalation_provider=escalation_model[0],
+                escalation_model=escalation_model[1],
+                hedge_budget=hedge_budget,
+                fallback_models=fallback_models,
+                coalesce_requests=coalesce_requests,
+                minify_prompts=minify_prompts
             )
 
             agent.set_start_position(starting_positions[i])
@@ -373,6 +536,7 @@ class Simulator:
         actions = self.get_actions_from_yaml(environment_config["actions"])
 
         unified_goal = environment_config["unified_goal"]
+        scoring = environment_config.get("scoring")
 
         # Extract items position
         items_config = environment_config.get("env_variables", {}).get("item_positions", None)
@@ -381,6 +545,12 @@ class Simulator:
             items = {tuple(pos): [Item(item_type="item", color=(0, 0, 255), shape="triangle")] for pos in
                      eval(items_config)}
 
+        # Optional obstacle map, a list of [x, y] positions
+        obstacles = None
+        if environment_config.get("obstacles"):
+            obstacles = [tuple(position) for position in
+                         parse_positions(environment_config["obstacles"], grid_size).tolist()]
+
         # optional configs
         output_instruction_prompt = environment_config.get("output_instruction_prompt", "NONE")
         system_prompt = environment_config.get("system_prompt", "NONE")
@@ -410,18 +580,43 @@ class Simulator:
             system_prompt=system_prompt,
             user_prompt=user_prompt,
             output_instruction_prompt=output_instruction_prompt,
-            backend_model=(backend_provider, backend_model)
+            backend_model=(backend_provider, backend_model),
+            escalation_model=(config.get("escalation_provider"), config.get("escalation_model")),
+            hedge_budget=config.get("hedge_budget"),
+            fallback_models=config.get("fallback_models"),
+            coalesce_requests=config.get("coalesce_requests", False),
+            minify_prompts=config.get("minify_prompts", False),
+            blocked_positions=obstacles or ()
         )
 
-        env = ComplexGridworld(agents=agents, grid_size=grid_size, items=items)
+        # Large grids with few occupied squares can store the grid sparsely
+        env = ComplexGridworld(agents=agents, grid_size=grid_size, items=items, obstacles=obstacles,
+                               sparse=environment_config.get("sparse_grid", False),
+                               bucket_size=environment_config.get("bucket_size", 8))
         env.max_episodes = max_episodes
         env.variables = env_variables
 
+        # Partial observability: `field_of_view: 3` or `field_of_view: {radius: 3, line_of_sight: true}`
+        field_of_view = environment_config.get("field_of_view")
+        if field_of_view is not None:
+            if not isinstance(field_of_view, dict):
+                field_of_view = {"radius": field_of_view}
+            env.field_of_view = {"radius": int(field_of_view["radius"]),
+                                 "line_of_sight": bool(field_of_view.get("line_of_sight", False))}
+
         if self.use_db:
             env.use_db = True
         env.name = config_key
         env.score = 0
-        # Register the environment and termination condition
-        termination_condition = config["termination_condition"]
-        env.register_termination_callback(termination_condition)
+        # An explicit termination condition takes precedence over the config's scoring section
+        termination_condition = config.get("termination_condition")
+        if termination_condition is not None:
+            env.register_termination_callback(termination_condition)
+        elif scoring is not None:
+            env.scoring_spec = compile_scoring(scoring, grid_size)
+            env.register_task(env.scoring_spec.build_task())
+            # Reads the distance fields of the map, computed once and shared by the simulations on the same map
+            env.optimal_steps = env.scoring_spec.optimal_steps(env)
+        else:
+            raise ValueError(f"{yaml_file} has no scoring section and {config_key} no termination_condition")
         return env
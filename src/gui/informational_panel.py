@@ -10,6 +10,7 @@ class InfoPanelView:
         self.selected_agent = list(env.agents.keys())[0] if env.agents else None
         self.last_message_count = 0
         self.last_position = None
+        self.last_decision = None
         self.active_tab = "agents"
 
         self.backgrounds = {
@@ -29,6 +30,7 @@ class InfoPanelView:
         self.group_messages_window_tag = "group_messages_window"
 
         self.position_tag = "agent_position"
+        self.action_tag = "agent_action"
         self.tab_bar_tag = "tab_bar"
         self.SCROLL_THRESHOLD = 20
 
@@ -121,6 +123,7 @@ class InfoPanelView:
                 self.selected_agent = agent_id
                 self.last_message_count = 0
                 self.last_position = None
+                self.last_decision = None
                 break
 
     def on_tab_selected(self, sender, app_data):
@@ -146,6 +149,9 @@ class InfoPanelView:
                     dpg.add_text("Current Position:", color=(255, 200, 100))
                     dpg.add_text("", tag=self.position_tag, indent=10)
 
+                    dpg.add_text("Last Action:", color=(255, 200, 100))
+                    dpg.add_text("", tag=self.action_tag, indent=10)
+
                     dpg.add_spacer(height=10)
 
                     # Scrollable messages window
@@ -172,6 +178,14 @@ class InfoPanelView:
                 dpg.set_value(self.position_tag, f"({pos[0]}, {pos[1]})")
                 self.last_position = pos
 
+            # The agent's parsed decision, shown as is
+            decision = getattr(agent, "last_decision", None)
+            if decision is not None and decision is not self.last_decision:
+                parameters = f" {decision.action_parameters}" if decision.action_parameters else ""
+                validity = "" if decision.valid is not False else " (invalid)"
+                dpg.set_value(self.action_tag, f"{decision.action_name}{parameters}{validity}")
+                self.last_decision = decision
+
             # Update agent messages
             current_message_count = len(agent.messages) if hasattr(agent, 'messages') else 0
             if current_message_count != self.last_message_count:
@@ -35,10 +35,54 @@ class DatabaseManager:
                 'content': 'TEXT NOT NULL',  # Content of the message or action
                 'action': 'TEXT',  # Optional: Specific action taken by the agent
                 'timestamp': 'DATETIME DEFAULT CURRENT_TIMESTAMP',  # Auto-captures the timestamp
-                'score': 'DOUBLE'  # score
+                'score': 'DOUBLE',  # score
+                'state': 'TEXT'  # JSON agent and item positions before the action, see scoring_spec.Trajectory
             }
         )
 
+        # One row per LLM call, linked to the assistant message row in episodes it produced
+        self.tables['llm_calls'] = Table(
+            self.connection,
+            'llm_calls',
+            {
+                'episode_row_id': 'INTEGER',  # rowid of the episodes row
+                'simulation_id': 'TEXT',
+                'agent_id': 'INTEGER',
+                'provider': 'TEXT',
+                'model': 'TEXT',
+                'key_id': 'TEXT',  # hashed API key
+                'queue_wait': 'DOUBLE',  # seconds waiting for a concurrency slot
+                'key_wait': 'DOUBLE',  # seconds waiting for a key to leave its timeout
+                'rate_limit_wait': 'DOUBLE',  # seconds slept by the rate limiter
+                'latency': 'DOUBLE',  # seconds from sending the request to having the answer
+                'time_to_first_token': 'DOUBLE',
+                'time_to_action': 'DOUBLE',  # seconds until the action name had streamed in
+                'total_time': 'DOUBLE',  # seconds spent in the backend call, waits included
+                'prompt_tokens': 'INTEGER',
+                'completion_tokens': 'INTEGER',
+                'retries': 'INTEGER',
+                'streamed': 'INTEGER',
+                'error': 'TEXT',
+                'timestamp': 'DATETIME DEFAULT CURRENT_TIMESTAMP',
+            }
+        )
+        # Databases created before the state and time_to_action columns were recorded
+        self._add_missing_columns('episodes', {'state': 'TEXT'})
+        self._add_missing_columns('llm_calls', {'time_to_action': 'DOUBLE'})
+
+    def _add_missing_columns(self, table_name: str, columns: Dict[str, str]) -> None:
+        """
+        Adds the columns a table created by an earlier version is missing, its existing rows get NULL.
+
+        :param table_name: Name of the existing table.
+        :param columns: Dictionary of column names and their data types, without NOT NULL or non-constant defaults.
+        """
+        existing = {row[1] for row in self.connection.execute(f"PRAGMA table_info({table_name})")}
+        for column, column_type in columns.items():
+            if column not in existing:
+                self.connection.execute(f"ALTER TABLE {table_name} ADD COLUMN {column} {column_type}")
+        self.connection.commit()
+
     def create_table(self, table_name: str, columns: Dict[str, str]) -> None:
         """
         Dynamically creates a new table.
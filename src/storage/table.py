@@ -24,10 +24,11 @@ class Table:
         self.cursor.execute(create_query)
         self.connection.commit()
 
-    def insert(self, **kwargs: Any) -> None:
+    def insert(self, **kwargs: Any) -> int:
         """
         Inserts a row into the table, automatically serializing dictionaries or lists to JSON.
         :param kwargs: Column-value pairs for the row to insert.
+        :return: The rowid of the inserted row.
         """
         # Serialize dictionaries and lists to JSON strings automatically
         serialized_values = {
@@ -39,6 +40,7 @@ class Table:
         insert_query = f"INSERT INTO {self.name} ({columns}) VALUES ({placeholders})"
         self.cursor.execute(insert_query, tuple(serialized_values.values()))
         self.connection.commit()
+        return self.cursor.lastrowid
 
     def fetch_all(self) -> List[tuple]:
         """
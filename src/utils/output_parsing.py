@@ -1,5 +1,4 @@
-from typing import Dict, Any
-import ast
+from typing import Any, Callable, Dict, FrozenSet, List, Optional, Tuple
 import json
 import re
 
@@ -14,6 +13,11 @@ def extract_json_from_string(s: str) -> Dict[str, Any]:
     Returns:
         Dict[str, Any]: The parsed JSON object or an empty dictionary if not found.
     """
+    try:
+        return parse_json_object(s)
+    except ValueError:
+        pass
+
     start_idx = s.find('{')
     end_idx = s.rfind('}')
 
@@ -21,17 +25,6 @@ def extract_json_from_string(s: str) -> Dict[str, Any]:
         raise ValueError(f"String does not contain valid brackets: {s}")
 
     s = s[start_idx:end_idx + 1]
-    s = s.strip()
-
-    try:
-        return ast.literal_eval(s)
-    except Exception:
-        pass
-
-    try:
-        return json.loads(s.replace("'", '"'))
-    except Exception:
-        pass
 
     # Improved regex pattern
     pattern = r"['\"]?(\w+)['\"]?\s*:\s*['\"]?([^,'\"{}]+)['\"]?"
@@ -43,3 +36,425 @@ def extract_json_from_string(s: str) -> Dict[str, Any]:
         return {}
 
     return result
+
+
+# Literal control characters (newlines in strings) are common in model output, strict=False accepts them
+_json_decoder = json.JSONDecoder(strict=False)
+
+_WHITESPACE = " \t\r\n"
+_QUOTES = "\"'"
+_BARE_VALUE = re.compile(r"[^,}\])\n]*")
+_BARE_KEY = re.compile(r"[^:{}\[\],\n]+")
+_STRING_SPECIAL = re.compile(r"[\"'\\]")
+# A quote of the other kind also ends a string when the line ends after it and the next key begins
+_MISMATCHED_END = re.compile(r"\s*,[ \t]*\r?\n\s*[\"']")
+_ESCAPES = {"n": "\n", "t": "\t", "r": "\r", "b": "\b", "f": "\f", "/": "/", "\\": "\\", '"': '"', "'": "'"}
+_LITERALS = {"true": True, "false": False, "null": None, "True": True, "False": False, "None": None}
+# Characters that may follow the closing quote of a key or of a value, any other quote is part of the string
+_AFTER_KEY = ":"
+_AFTER_VALUE = ",}])"
+
+
+class _EndOfText(ValueError):
+    pass
+
+
+class TolerantJsonParser:
+    """
+    Single pass parser for the JSON-like objects LLMs write.
+
+    Accepts what models get wrong: single quoted strings, unescaped quotes and apostrophes inside strings,
+    literal newlines, trailing commas, missing commas after an object, unquoted keys, Python literals (True, None),
+    tuples and junk between a key and its value. Raises ValueError when the text is not an object at all.
+
+    :param text: The text to parse.
+    :param allow_incomplete: Return the keys parsed so far when the text ends inside the object, as with a
+                             truncated response. Only values that are complete are included.
+    :param streaming: The text is the start of a response still being received, a string or literal running to
+                      the end of the text may continue and is not complete yet. Implies allow_incomplete.
+    """
+
+    def __init__(self, text: str, allow_incomplete: bool = False, streaming: bool = False):
+        self.text = text
+        self.length = len(text)
+        self.allow_incomplete = allow_incomplete or streaming
+        self.streaming = streaming
+        self.root = None
+
+    def parse(self, start: int) -> Tuple[Dict[str, Any], int]:
+        """Parse the object opening at index start, returns it and the index just past it."""
+        try:
+            return self.parse_object(start)
+        except _EndOfText:
+            if not self.allow_incomplete or self.root is None:
+                raise
+            return self.root, self.length
+
+    def _skip(self, i: int) -> int:
+        while i < self.length and self.text[i] in _WHITESPACE:
+            i += 1
+        return i
+
+    def _expect(self, i: int) -> str:
+        if i >= self.length:
+            raise _EndOfText("Unexpected end of text")
+        return self.text[i]
+
+    def parse_object(self, i: int) -> Tuple[Dict[str, Any], int]:
+        result = {}
+        if self.root is None:
+            self.root = result
+        i = self._skip(i + 1)
+        while True:
+            char = self._expect(i)
+            if char == "}":
+                return result, i + 1
+            if char in _QUOTES:
+                key, i = self.parse_string(i, _AFTER_KEY)
+            else:
+                match = _BARE_KEY.match(self.text, i)
+                if not match or not match.group().strip():
+                    raise ValueError(f"Expected a key at {i}")
+                key, i = match.group().strip(), match.end()
+            i = self._skip(i)
+            if self._expect(i) != ":":
+                raise ValueError(f"Expected ':' at {i}")
+            value, i = self.parse_value(i + 1)
+            result[key] = value
+            i = self._skip(i)
+            char = self._expect(i)
+            if char == ",":
+                i = self._skip(i + 1)
+            elif char != "}" and char not in _QUOTES:  # a missing comma before the next key is fine
+                raise ValueError(f"Expected ',' or '}}' at {i}")
+
+    def parse_array(self, i: int) -> Tuple[List[Any], int]:
+        closer = "]" if self.text[i] == "[" else ")"
+        result = []
+        i = self._skip(i + 1)
+        while True:
+            if self._expect(i) == closer:
+                return result, i + 1
+            value, i = self.parse_value(i)
+            result.append(value)
+            i = self._skip(i)
+            char = self._expect(i)
+            if char == ",":
+                i = self._skip(i + 1)
+            elif char != closer:
+                raise ValueError(f"Expected ',' or '{closer}' at {i}")
+
+    def parse_string(self, i: int, allowed_after: str = _AFTER_VALUE) -> Tuple[str, int]:
+        quote = self.text[i]
+        parts = []
+        i += 1
+        while True:
+            match = _STRING_SPECIAL.search(self.text, i)
+            if match is None:
+                raise _EndOfText("Unterminated string")
+            j = match.start()
+            char = self.text[j]
+            parts.append(self.text[i:j])
+            if char == "\\":
+                if j + 1 >= self.length:
+                    raise _EndOfText("Unterminated string")
+                escaped = self.text[j + 1]
+                if escaped == "u" and j + 6 <= self.length:
+                    parts.append(chr(int(self.text[j + 2:j + 6], 16)))
+                    i = j + 6
+                else:
+                    parts.append(_ESCAPES.get(escaped, escaped))
+                    i = j + 2
+                continue
+            if char == quote:
+                after = self._skip(j + 1)
+                if after >= self.length:
+                    if self.streaming:
+                        raise _EndOfText("Value may continue")
+                    return "".join(parts), j + 1
+                if self.text[after] in allowed_after:
+                    return "".join(parts), j + 1
+            elif allowed_after is _AFTER_VALUE and _MISMATCHED_END.match(self.text, j + 1):
+                return "".join(parts), j + 1
+            parts.append(char)
+            i = j + 1
+
+    def parse_value(self, i: int) -> Tuple[Any, int]:
+        i = self._skip(i)
+        char = self._expect(i)
+        if char == "{":
+            return self.parse_object(i)
+        if char in "[(":
+            return self.parse_array(i)
+        if char in _QUOTES:
+            return self.parse_string(i)
+
+        match = _BARE_VALUE.match(self.text, i)
+        if match.end() >= self.length and self.streaming:
+            raise _EndOfText("Value may continue")
+        word = match.group().strip()
+        if word in _LITERALS:
+            return _LITERALS[word], match.end()
+        try:
+            return int(word), match.end()
+        except ValueError:
+            pass
+        try:
+            return float(word), match.end()
+        except ValueError:
+            pass
+        # Junk before a quoted value, e.g. `"reflection": xx"text"`
+        quote = next((k for k, c in enumerate(word) if c in _QUOTES), None)
+        if quote is not None:
+            return self.parse_string(i + match.group().index(word) + quote)
+        return word, match.end()
+
+
+def parse_json_object(s: str, allow_incomplete: bool = True) -> Dict[str, Any]:
+    """
+    Parses the first balanced object in a model response, ignoring prose and code fences around it.
+
+    Well-formed JSON is decoded by the C decoder, anything else by TolerantJsonParser. An opening brace that does
+    not start an object (e.g. in prose) is skipped.
+
+    Parameters:
+        s (str): The model response.
+        allow_incomplete (bool): Accept an object cut off by the end of the response, with its complete values.
+
+    Returns:
+        Dict[str, Any]: The first object found.
+
+    Raises:
+        ValueError: If the string contains no object.
+    """
+    start = s.find('{')
+    while start != -1:
+        try:
+            value, _ = _json_decoder.raw_decode(s, start)
+            if isinstance(value, dict):
+                return value
+        except ValueError:
+            pass
+        try:
+            return TolerantJsonParser(s, allow_incomplete).parse(start)[0]
+        except ValueError:
+            start = s.find('{', start + 1)
+    raise ValueError(f"String does not contain an object: {s}")
+
+
+class ActionDecision:
+    """
+    The decision of one agent turn, parsed once from the model's response and passed on as is to the environment,
+    the database logging and the GUI.
+
+    :param action_name: Name of the chosen action, "invalid" when the response held none.
+    :param action_parameters: Parameters of the action.
+    :param message: Message for the other agents.
+    :param add_memory: Text to append to the agent's memory.
+    :param reflection: The agent's reflection on its progress.
+    :param rationale: Why the action was chosen.
+    :param raw: The response text.
+    """
+
+    __slots__ = ("action_name", "action_parameters", "message", "add_memory", "reflection", "rationale", "raw",
+                 "valid")
+
+    def __init__(self, action_name: str = "invalid", action_parameters: Dict[str, Any] = None, message: str = "",
+                 add_memory: str = "", reflection: str = "", rationale: str = "", raw: str = ""):
+        self.action_name = action_name
+        self.action_parameters = action_parameters if action_parameters is not None else {}
+        self.message = message
+        self.add_memory = add_memory
+        self.reflection = reflection
+        self.rationale = rationale
+        self.raw = raw
+        # None until validated against an action space
+        self.valid: Optional[bool] = None
+
+    @classmethod
+    def from_response(cls, text: str) -> "ActionDecision":
+        """Parse a model response, a response without an object gives an invalid decision."""
+        try:
+            data = extract_json_from_string(text)
+        except ValueError:
+            data = {}
+        return cls.from_dict(data, raw=text)
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any], raw: str = "") -> "ActionDecision":
+        parameters = data.get("action_parameters")
+        return cls(
+            action_name=str(data.get("action_name") or "invalid"),
+            action_parameters=parameters if isinstance(parameters, dict) else {},
+            message=str(data.get("message") or ""),
+            add_memory=str(data.get("add_memory") or ""),
+            reflection=str(data.get("reflection") or ""),
+            rationale=str(data.get("rationale") or ""),
+            raw=raw,
+        )
+
+    def validate(self, action_names: FrozenSet[str]) -> bool:
+        """Check the action against an agent's action names, the result is kept in `valid`."""
+        self.valid = self.action_name in action_names
+        return self.valid
+
+    def to_dict(self) -> Dict[str, Any]:
+        """The decision in the response format, without the raw text."""
+        return {
+            "reflection": self.reflection,
+            "rationale": self.rationale,
+            "action_name": self.action_name,
+            "action_parameters": self.action_parameters,
+            "message": self.message,
+            "add_memory": self.add_memory,
+        }
+
+    def __eq__(self, other):
+        if not isinstance(other, ActionDecision):
+            return NotImplemented
+        return all(getattr(self, slot) == getattr(other, slot) for slot in self.__slots__)
+
+    def __repr__(self):
+        return f"ActionDecision(action_name={self.action_name!r}, action_parameters={self.action_parameters!r})"
+
+
+class JsonObjectScanner:
+    """
+    Incrementally tracks brace depth over streamed text to find where the first top-level object ends.
+
+    Braces inside quoted strings are ignored. Single quotes count as string delimiters too, since models
+    sometimes answer with Python-style dicts.
+    """
+
+    def __init__(self):
+        self.depth = 0
+        self.quote = None
+        self.escaped = False
+        self.complete = False
+
+    def feed(self, chunk: str) -> Optional[int]:
+        """
+        Scan the next piece of text.
+
+        Returns:
+            Optional[int]: Index in `chunk` just past the closing brace once the object is complete, else None.
+        """
+        if self.complete:
+            return 0
+        for i, char in enumerate(chunk):
+            if self.quote is not None:
+                if self.escaped:
+                    self.escaped = False
+                elif char == '\\':
+                    self.escaped = True
+                elif char == self.quote:
+                    self.quote = None
+            elif char == '{':
+                self.depth += 1
+            elif self.depth == 0:
+                continue  # prose before the object
+            elif char in ('"', "'"):
+                self.quote = char
+            elif char == '}':
+                self.depth -= 1
+                if self.depth == 0:
+                    self.complete = True
+                    return i + 1
+        return None
+
+
+# A quoted key of the decision, not preceded by a backslash (an escaped quote inside a string value)
+_DECISION_KEY = re.compile(r"""(?<!\\)["'](action_name|action_parameters)["']\s*:""")
+
+
+class StreamingDecisionParser:
+    """
+    Finds the action of a response while it is still streaming.
+
+    Calls `on_action` as soon as the value of `action_name` has fully arrived, whatever the order of the keys
+    (8B models often write the message or reflection first). A value is only taken once its closing quote is
+    followed by ',' or '}', so a key quoted inside another value does not fire early. Only the new text is scanned
+    on every chunk, plus the value currently being received.
+
+    :param on_action: Called once with the action name.
+    """
+
+    def __init__(self, on_action: Callable[[str], None] = None):
+        self.on_action = on_action
+        self.reset()
+
+    def reset(self):
+        """Forget the text received so far, for a new response."""
+        self.buffer = ""
+        self.values: Dict[str, Any] = {}
+        self._search_from = 0
+        self._pending: Optional[Tuple[str, int]] = None
+        self.scanner = JsonObjectScanner()
+        # Index in the last chunk just past the end of the object, once it is complete
+        self.object_end: Optional[int] = None
+
+    @property
+    def action_name(self) -> Optional[str]:
+        return self.values.get("action_name")
+
+    @property
+    def action_parameters(self) -> Optional[Dict[str, Any]]:
+        return self.values.get("action_parameters")
+
+    @property
+    def complete(self) -> bool:
+        """Whether the response's object has been closed."""
+        return self.scanner.complete
+
+    def feed(self, chunk: str) -> Optional[str]:
+        """
+        Scan the next piece of the response.
+
+        Returns:
+            Optional[str]: The action name once it has arrived, else None.
+        """
+        if not chunk or self.complete:
+            return self.action_name
+        self.buffer += chunk
+        self.object_end = self.scanner.feed(chunk)
+
+        while True:
+            if self._pending is not None:
+                key, start = self._pending
+            else:
+                match = _DECISION_KEY.search(self.buffer, self._search_from)
+                if match is None:
+                    # a key may be split over two chunks
+                    self._search_from = max(self._search_from, len(self.buffer) - len('"action_parameters":'))
+                    break
+                key, start = match.group(1), match.end()
+
+            try:
+                value, end = TolerantJsonParser(self.buffer, streaming=not self.complete).parse_value(start)
+            except ValueError:
+                if self.complete:
+                    self._pending = None
+                    self._search_from = start
+                    continue
+                self._pending = (key, start)  # the value is still arriving
+                break
+
+            self._pending = None
+            if key == "action_name" and isinstance(value, str) and ('"' in value or "'" in value):
+                # Not a key but text of another value with unescaped quotes, e.g. "my "action_name": "east" failed"
+                self._search_from = start
+                continue
+            self._search_from = end
+            if key not in self.values:
+                self._set(key, value)
+        return self.action_name
+
+    def _set(self, key: str, value: Any):
+        if key == "action_name":
+            if not isinstance(value, str) or not value:
+                return
+            self.values[key] = value
+            if self.on_action is not None:
+                self.on_action(value)
+        elif isinstance(value, dict):
+            self.values[key] = value
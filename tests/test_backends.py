@@ -0,0 +1,762 @@
+import asyncio
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import unittest
+from datetime import datetime, timedelta
+from unittest import mock
+from benchmarking.stub_server import StubServer
+from src.agent.backend import concurrency
+from src.agent.backend.base_backend import Backend, listen_for_action
+from src.agent.backend.concurrency import AIMDController, parse_reset_duration
+from src.agent.backend.groq_backend import GroqBackend
+from src.agent.backend.hedged_backend import HedgedBackend
+from src.agent.backend.multi_backend import CircuitBreaker, MultiBackend
+from src.agent.backend.key_store import SQLiteKeyStateStore, select_key_shard
+from src.agent.backend.rate_limiter import RateLimiter
+from src.agent.backend.router_backend import RouterBackend
+from src.agent.backend.single_flight import SingleFlight, SingleFlightBackend, request_fingerprint
+from src.agent.backend.telemetry import TelemetryCollector, get_collector, instrumented, percentile
+from src.storage.database import DatabaseManager
+
+
+class FakeBackend(Backend):
+    def __init__(self, responses, name="fake", model="fake-model"):
+        super().__init__(name=name, api_key_prefix="FAKE_API_KEY")
+        self.model = model
+        self.responses = list(responses)
+        self.calls = 0
+
+    def generate(self, messages):
+        self.calls += 1
+        return self.responses.pop(0)
+
+
+def json_only_validator(response):
+    return None if response.startswith("{") else "unparseable"
+
+
+class TestRouterBackend(unittest.TestCase):
+
+    def setUp(self):
+        self.messages = [{"role": "system", "content": "system"}, {"role": "user", "content": "hi"}]
+
+    def test_cheap_tier_accepted(self):
+        small = FakeBackend(['{"action_name": "north"}'], model="small")
+        large = FakeBackend([], model="large")
+        router = RouterBackend([small, large], validator=json_only_validator)
+
+        self.assertEqual(router.generate(self.messages), '{"action_name": "north"}')
+        self.assertEqual(router.last_tier, 0)
+        self.assertEqual(large.calls, 0)
+
+    def test_escalates_rejected_output(self):
+        small = FakeBackend(["I think I will go north"], model="small")
+        large = FakeBackend(['{"action_name": "north"}'], model="large")
+        router = RouterBackend([small, large], validator=json_only_validator)
+
+        self.assertEqual(router.generate(self.messages), '{"action_name": "north"}')
+        self.assertEqual(router.last_tier, 1)
+
+        router.record_outcome(100)
+        stats = router.get_tier_stats()
+        self.assertEqual(stats["fake:small"]["escalation_rate"], 1.0)
+        self.assertEqual(stats["fake:small"]["escalation_reasons"], {"unparseable": 1})
+        self.assertEqual(stats["fake:large"]["avg_score"], 100)
+
+
+class FailingBackend(FakeBackend):
+    def generate(self, messages):
+        self.calls += 1
+        raise ConnectionError("provider down")
+
+
+class TestMultiBackend(unittest.TestCase):
+
+    def test_fails_over_and_records_backend(self):
+        down = FailingBackend([], name="groq", model="llama")
+        up = FakeBackend(["ok", "ok"], name="together", model="llama")
+        backend = MultiBackend([down, up], failure_threshold=2)
+
+        self.assertEqual(backend.generate([]), "ok")
+        self.assertEqual(backend.last_backend, "together:llama")
+        self.assertEqual(backend.generate([]), "ok")
+
+        # The breaker opened after two failures, so the third call skips the down provider
+        up.responses.append("ok")
+        backend.generate([])
+        self.assertEqual(down.calls, 2)
+        self.assertEqual(backend.get_backend_stats()["groq:llama"]["state"], CircuitBreaker.OPEN)
+        self.assertEqual(list(backend.call_log), ["together:llama"] * 3)
+
+    def test_breakers_shared_between_agents(self):
+        first = MultiBackend([FailingBackend([], name="shared", model="llama"),
+                              FakeBackend(["ok"], name="backup", model="llama")], failure_threshold=1)
+        down = FailingBackend([], name="shared", model="llama")
+        second = MultiBackend([down, FakeBackend(["ok"], name="backup", model="llama")], failure_threshold=1)
+
+        first.generate([])
+        # The first agent's failure opened the breaker, the second agent goes straight to the backup
+        self.assertEqual(second.generate([]), "ok")
+        self.assertEqual(down.calls, 0)
+
+    def test_call_log_is_bounded(self):
+        backend = MultiBackend([FakeBackend(["ok"] * 5, name="logged", model="llama")], call_log_size=3)
+        for _ in range(5):
+            backend.generate([])
+        self.assertEqual(len(backend.call_log), 3)
+
+    def test_all_backends_down(self):
+        backend = MultiBackend([FailingBackend([]), FailingBackend([])])
+        with self.assertRaises(RuntimeError):
+            backend.generate([])
+
+    def test_half_open_probe(self):
+        clock = FakeClock()
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10, clock=clock)
+        breaker.record_failure()
+        self.assertFalse(breaker.allow_request())
+
+        clock.now = 10
+        self.assertTrue(breaker.allow_request())
+        self.assertFalse(breaker.allow_request())  # one probe at a time
+        breaker.record_failure()
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+
+        clock.now = 20
+        self.assertTrue(breaker.allow_request())
+        breaker.record_success()
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+
+    def test_cancelled_probe_releases_breaker(self):
+        backend = MultiBackend([DelayedBackend([5.0], name="probed", model="llama")], reset_timeout=10)
+        breaker = backend.breakers[0]
+        breaker.opened_at = time.monotonic() - 10  # half-open
+
+        async def cancel_probe():
+            probe = asyncio.ensure_future(backend.agenerate([]))
+            await asyncio.sleep(0.01)
+            self.assertTrue(breaker.probing)
+            probe.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await probe
+
+        asyncio.run(cancel_probe())
+        self.assertEqual(breaker.state, CircuitBreaker.HALF_OPEN)
+        self.assertTrue(breaker.allow_request())
+
+    def test_weighted_prefers_faster_backend(self):
+        fast = FakeBackend(["fast"] * 200, model="fast")
+        slow = FakeBackend(["slow"] * 200, model="slow")
+        backend = MultiBackend([fast, slow], strategy="weighted")
+        backend.backend_stats = [
+            {"calls": 10, "failures": 0, "latency": 1.0},
+            {"calls": 10, "failures": 0, "latency": 10.0},
+        ]
+
+        answers = [backend.generate([]) for _ in range(100)]
+        self.assertGreater(answers.count("fast"), 75)
+
+
+class TestClientReuse(unittest.TestCase):
+
+    def setUp(self):
+        self.server = StubServer().start()
+
+    def tearDown(self):
+        Backend.close_clients()
+        self.server.stop()
+
+    def test_clients_shared_per_key_and_base_url(self):
+        first = GroqBackend(base_url=self.server.url)
+        second = GroqBackend(model_id="llama-3.1-70b-versatile", base_url=self.server.url)
+
+        self.assertIs(first._get_client("key-1"), second._get_client("key-1"))
+        self.assertIsNot(first._get_client("key-1"), first._get_client("key-2"))
+        self.assertIsNot(first._get_client("key-1"), GroqBackend()._get_client("key-1"))
+
+    def test_connection_reused_across_calls(self):
+        backend = GroqBackend(base_url=self.server.url)
+        for _ in range(3):
+            backend._get_client("key-1").chat.completions.create(
+                messages=[{"role": "user", "content": "hi"}],
+                model=backend.model
+            )
+
+        self.assertEqual(len(self.server.requests), 3)
+        self.assertEqual(len(self.server.connections), 1)
+
+    def test_concurrent_calls_keep_their_own_client(self):
+        with mock.patch.dict(os.environ, {"GROQ_API_KEY1": "key-1"}):
+            backend = GroqBackend(base_url=self.server.url)
+        keys = iter(["key-1", "key-2"])
+        backend._acquire_api_key = lambda estimated_tokens: next(keys)
+        sent_with = []
+
+        def get_client(api_key):
+            client = mock.Mock()
+            client.chat.completions.with_raw_response.create.return_value = api_key
+            return client
+
+        backend._get_client = get_client
+
+        def controlled_request(request, consume=None):
+            if not sent_with:
+                # another thread's call picks its client before this call's request is sent
+                sent_with.append(None)
+                backend.generate([{"role": "user", "content": "other"}])
+            sent_with.append(request())
+            return ""
+
+        backend._controlled_request = controlled_request
+        backend.generate([{"role": "user", "content": "hi"}])
+        self.assertEqual(sent_with[1:], ["key-2", "key-1"])
+
+
+class TestAsyncGenerate(unittest.TestCase):
+
+    def setUp(self):
+        self.server = StubServer(content='{"action_name": "skip"}', latency=0.05).start()
+
+    def tearDown(self):
+        self.server.stop()
+
+    def test_concurrent_requests_share_one_loop(self):
+        with mock.patch.dict(os.environ, {"GROQ_API_KEY1": "key-1", "GROQ_API_KEY2": "key-2"}):
+            backend = GroqBackend(base_url=self.server.url)
+
+        async def run():
+            try:
+                return await asyncio.gather(*[
+                    backend.agenerate([{"role": "user", "content": f"agent {i}"}]) for i in range(8)
+                ])
+            finally:
+                await Backend.aclose_clients()
+
+        responses = asyncio.run(run())
+
+        self.assertEqual(responses, ['{"action_name": "skip"}'] * 8)
+        self.assertEqual(len(self.server.requests), 8)
+
+    def test_closed_loops_are_forgotten(self):
+        backend = GroqBackend(base_url=self.server.url)
+
+        async def touch():
+            backend._get_async_client("key-1")
+            backend._key_semaphore("key-1")
+
+        for _ in range(4):
+            asyncio.run(touch())
+
+        # Only the entries of the last loop remain, the next access drops them
+        self.assertLessEqual(len(Backend._async_clients), 1)
+        self.assertLessEqual(len(Backend._key_semaphores), 1)
+        asyncio.run(touch())
+        self.assertLessEqual(len(Backend._async_clients), 1)
+
+    def test_default_agenerate_runs_sync_backend(self):
+        backend = FakeBackend(["response"])
+        self.assertEqual(asyncio.run(backend.agenerate([])), "response")
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestRateLimiter(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+
+    def test_requests_per_minute_burst_then_spaced(self):
+        limiter = RateLimiter(requests_per_minute=30, clock=self.clock)
+        waits = [limiter.reserve("key") for _ in range(31)]
+
+        self.assertEqual(waits[:30], [0.0] * 30)
+        self.assertAlmostEqual(waits[30], 2.0)
+
+        # A sliding refill, not a reset: 10 seconds later five requests are available again
+        self.clock.now = 12.0
+        self.assertEqual(limiter.reserve("key"), 0.0)
+
+    def test_tokens_per_minute(self):
+        limiter = RateLimiter(requests_per_minute=None, tokens_per_minute=6000, clock=self.clock)
+
+        self.assertEqual(limiter.reserve("key", estimated_tokens=5000), 0.0)
+        self.assertAlmostEqual(limiter.reserve("key", estimated_tokens=2000), 10.0)
+
+    def test_actual_usage_refunds_estimate(self):
+        limiter = RateLimiter(requests_per_minute=None, tokens_per_minute=6000, clock=self.clock)
+
+        limiter.reserve("key", estimated_tokens=6000)
+        limiter.record_tokens("key", estimated_tokens=6000, actual_tokens=1000)
+        self.assertEqual(limiter.reserve("key", estimated_tokens=5000), 0.0)
+
+    def test_keys_are_independent(self):
+        limiter = RateLimiter(requests_per_minute=1, clock=self.clock)
+
+        self.assertEqual(limiter.reserve("key-1"), 0.0)
+        self.assertEqual(limiter.reserve("key-2"), 0.0)
+        self.assertAlmostEqual(limiter.reserve("key-1"), 60.0)
+
+
+class TestSharedKeyState(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "keys.db")
+        # Two stores on one file behave like two processes
+        self.first = SQLiteKeyStateStore(self.path)
+        self.second = SQLiteKeyStateStore(self.path)
+
+    def tearDown(self):
+        self.first.close()
+        self.second.close()
+        self.directory.cleanup()
+
+    def test_usage_and_timeouts_are_shared(self):
+        until = datetime.now() + timedelta(minutes=5)
+        self.first.record_call("key-1")
+        self.first.set_timeout("key-1", until)
+
+        self.assertEqual(self.second.get_calls("key-1"), 1)
+        self.assertEqual(self.second.get_timeout("key-1").replace(microsecond=0), until.replace(microsecond=0))
+        self.assertEqual(self.second.get_timeout("key-2"), datetime.min)
+
+    def test_timeouts_survive_restart(self):
+        until = datetime.now() + timedelta(minutes=5)
+        self.first.set_timeout("key-1", until)
+        self.first.close()
+
+        self.first = SQLiteKeyStateStore(self.path)
+        self.assertGreater(self.first.get_timeout("key-1"), datetime.now())
+
+    def test_rate_limit_budget_is_shared(self):
+        first_limiter = self.first.create_rate_limiter("groq:model", 2, None)
+        second_limiter = self.second.create_rate_limiter("groq:model", 2, None)
+
+        self.assertEqual(first_limiter.reserve("key-1"), 0.0)
+        self.assertEqual(second_limiter.reserve("key-1"), 0.0)
+        self.assertGreater(first_limiter.reserve("key-1"), 25)
+
+    def test_key_shards_are_disjoint(self):
+        keys = [f"key-{i}" for i in range(7)]
+        shards = [select_key_shard(keys, i, 3) for i in range(3)]
+
+        self.assertEqual(sorted(sum(shards, [])), sorted(keys))
+        self.assertEqual(shards[0], ["key-0", "key-3", "key-6"])
+        with self.assertRaises(ValueError):
+            select_key_shard(keys, 3, 3)
+
+
+class TestStreamedCompletions(unittest.TestCase):
+    ACTION = '{"action_name": "north", "action_parameters": {}, "message": "on my way {now}"}'
+    PROSE = " I decided to move north because the goal is north of me." * 8
+
+    def setUp(self):
+        self.server = StubServer(content=self.ACTION + self.PROSE, chunk_size=8, chunk_delay=0.005).start()
+
+    def tearDown(self):
+        Backend.close_clients()
+        self.server.stop()
+
+    def make_backend(self):
+        with mock.patch.dict(os.environ, {"GROQ_API_KEY1": "key-1"}):
+            return GroqBackend(base_url=self.server.url)
+
+    def test_stream_stops_after_object(self):
+        backend = self.make_backend()
+        self.assertEqual(backend.generate([{"role": "user", "content": "hi"}]), self.ACTION)
+
+        stats = backend.last_call_stats
+        self.assertTrue(stats["streamed"])
+        self.assertLessEqual(stats["wasted_tokens"], 2)
+        # Stopped after ~11 of ~70 chunks
+        self.assertLess(stats["time_to_action"], 0.2)
+
+    def test_async_stream_stops_after_object(self):
+        backend = self.make_backend()
+
+        async def run():
+            try:
+                return await backend.agenerate([{"role": "user", "content": "hi"}])
+            finally:
+                await Backend.aclose_clients()
+
+        self.assertEqual(asyncio.run(run()), self.ACTION)
+
+    def test_action_reported_before_stream_ends(self):
+        backend = self.make_backend()
+        started = time.perf_counter()
+        seen = []
+        with listen_for_action(lambda name: seen.append((name, time.perf_counter() - started))):
+            backend.generate([{"role": "user", "content": "hi"}])
+        total = time.perf_counter() - started
+
+        self.assertEqual([name for name, _ in seen], ["north"])
+        self.assertLess(seen[0][1], total)
+        # Outside the block nobody is notified
+        backend.generate([{"role": "user", "content": "hi"}])
+        self.assertEqual(len(seen), 1)
+
+    def test_unstreamed_reports_wasted_tokens(self):
+        backend = self.make_backend()
+        backend.stream_responses = False
+
+        self.assertEqual(backend.generate([{"role": "user", "content": "hi"}]), self.ACTION + self.PROSE)
+        self.assertFalse(backend.last_call_stats["streamed"])
+        self.assertEqual(backend.last_call_stats["wasted_tokens"], len(self.PROSE) // 4)
+
+
+class DelayedBackend(FakeBackend):
+    """Answers after the scripted delays, remembering which requests were cancelled."""
+
+    def __init__(self, delays, name="fake", model="fake-model"):
+        super().__init__([], name=name, model=model)
+        self.delays = list(delays)
+        self.cancelled = 0
+
+    def generate(self, messages):
+        return asyncio.run(self.agenerate(messages))
+
+    async def agenerate(self, messages):
+        self.calls += 1
+        try:
+            await asyncio.sleep(self.delays.pop(0))
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        return f"{self.name} answer"
+
+
+class TestHedgedBackend(unittest.TestCase):
+
+    def test_slow_request_is_hedged(self):
+        primary = DelayedBackend([0.01] * 10 + [2.0], name="primary", model="hedge-test")
+        fallback = DelayedBackend([0.01], name="fallback", model="hedge-test")
+        backend = HedgedBackend(primary, fallback, budget=0.5, min_samples=10)
+
+        for _ in range(10):
+            self.assertEqual(backend.generate([]), "primary answer")
+
+        start = time.perf_counter()
+        self.assertEqual(backend.generate([]), "fallback answer")
+        self.assertLess(time.perf_counter() - start, 1.0)
+        time.sleep(0.05)
+
+        self.assertEqual(primary.cancelled, 1)
+        stats = backend.get_hedge_stats()
+        self.assertEqual((stats["hedges"], stats["hedge_wins"]), (1, 1))
+        # The cancelled primary does not count towards the latency quantiles
+        self.assertEqual(len(backend.latency_tracker), 10)
+
+    def test_hedges_capped_by_budget(self):
+        primary = DelayedBackend([0.01] * 10 + [0.2], name="primary", model="budget-test")
+        fallback = DelayedBackend([0.01], name="fallback", model="budget-test")
+        backend = HedgedBackend(primary, fallback, budget=0.05, min_samples=10)
+
+        for _ in range(11):
+            self.assertEqual(backend.generate([]), "primary answer")
+        self.assertEqual(backend.get_hedge_stats()["hedges"], 0)
+        self.assertEqual(fallback.calls, 0)
+
+    def test_calls_keep_the_callers_turn(self):
+        primary = DelayedBackend([0.01], name="primary", model="turn-test")
+        primary.agenerate = instrumented(DelayedBackend.agenerate).__get__(primary)
+        backend = HedgedBackend(primary, DelayedBackend([0.01]), budget=0.0)
+
+        with get_collector().collect(("sim", 3, 1)) as calls:
+            backend.generate([])
+        self.assertEqual([record["turn"] for record in calls], [("sim", 3, 1)])
+
+
+class CountingBackend(FakeBackend):
+    def __init__(self, temperature=0.0, delay=0.1, error=None):
+        super().__init__([])
+        self.temperature = temperature
+        self.delay = delay
+        self.error = error
+
+    def generate(self, messages):
+        self.calls += 1
+        time.sleep(self.delay)
+        if self.error:
+            raise self.error
+        return f"answer {self.calls}"
+
+    async def agenerate(self, messages):
+        self.calls += 1
+        call = self.calls
+        await asyncio.sleep(self.delay)
+        return f"answer {call}"
+
+
+class TestSingleFlight(unittest.TestCase):
+
+    def setUp(self):
+        self.messages = [{"role": "user", "content": "same prompt"}]
+
+    def test_concurrent_threads_share_one_call(self):
+        inner = CountingBackend()
+        group = SingleFlight()
+        backends = [SingleFlightBackend(inner, group=group) for _ in range(5)]
+        answers = []
+        threads = [threading.Thread(target=lambda b=b: answers.append(b.generate(self.messages))) for b in backends]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(inner.calls, 1)
+        self.assertEqual(answers, ["answer 1"] * 5)
+        self.assertEqual(group.stats, {"calls": 5, "executions": 1, "coalesced": 4})
+
+        # Nothing is cached once the call has finished
+        backends[0].generate(self.messages)
+        self.assertEqual(inner.calls, 2)
+
+    def test_concurrent_tasks_share_one_call(self):
+        inner = CountingBackend()
+        backend = SingleFlightBackend(inner, group=SingleFlight())
+
+        async def run():
+            return await asyncio.gather(
+                *[backend.agenerate(self.messages) for _ in range(4)],
+                backend.agenerate([{"role": "user", "content": "other prompt"}])
+            )
+
+        self.assertEqual(asyncio.run(run()), ["answer 1"] * 4 + ["answer 2"])
+        self.assertEqual(inner.calls, 2)
+
+    def test_cancelled_leader_hands_over_to_a_waiter(self):
+        inner = CountingBackend()
+        group = SingleFlight()
+        backend = SingleFlightBackend(inner, group=group)
+
+        async def run():
+            leader = asyncio.ensure_future(backend.agenerate(self.messages))
+            await asyncio.sleep(0.01)
+            waiters = [asyncio.ensure_future(backend.agenerate(self.messages)) for _ in range(2)]
+            await asyncio.sleep(0.01)
+            leader.cancel()
+            return await asyncio.gather(*waiters)
+
+        self.assertEqual(asyncio.run(run()), ["answer 2"] * 2)
+        self.assertEqual(group.stats, {"calls": 3, "executions": 2, "coalesced": 1})
+
+    def test_sampled_requests_are_not_coalesced(self):
+        inner = CountingBackend(temperature=0.9, delay=0)
+        backend = SingleFlightBackend(inner, group=SingleFlight())
+        backend.generate(self.messages)
+        backend.generate(self.messages)
+        self.assertEqual(backend.get_coalescing_stats()["calls"], 0)
+        self.assertEqual(inner.calls, 2)
+
+    def test_fingerprint_resolved_through_wrappers(self):
+        sampled = SingleFlightBackend(HedgedBackend(MultiBackend([CountingBackend(temperature=0.9)])))
+        self.assertIsNone(sampled._fingerprint(self.messages))
+
+        inner = CountingBackend()
+        wrapped = SingleFlightBackend(HedgedBackend(MultiBackend([inner])), coalesce_sampled=True)
+        self.assertEqual(wrapped.temperature, 0.0)
+        self.assertEqual(wrapped._fingerprint(self.messages),
+                         request_fingerprint("fake", "fake-model", 0.0, self.messages))
+
+    def test_error_reaches_every_waiter(self):
+        inner = CountingBackend(error=ConnectionError("down"))
+        group = SingleFlight()
+        errors = []
+
+        def call():
+            try:
+                SingleFlightBackend(inner, group=group).generate(self.messages)
+            except ConnectionError as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=call) for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual((inner.calls, len(errors)), (1, 3))
+
+
+class TestAIMDController(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.controller = AIMDController(initial_limit=8, cooldown=1.0, clock=self.clock)
+
+    def test_overload_halves_and_success_grows_additively(self):
+        self.controller.on_overload()
+        self.assertEqual(self.controller.limit, 4)
+
+        # A burst of 429s within the cooldown is a single signal
+        self.controller.on_overload()
+        self.assertEqual(self.controller.limit, 4)
+
+        for _ in range(4):
+            self.controller.on_success()
+        self.assertAlmostEqual(self.controller.limit, 5, delta=0.2)
+
+    def test_in_flight_limit(self):
+        controller = AIMDController(initial_limit=2, clock=self.clock)
+        self.assertEqual(controller.try_acquire(), 0.0)
+        self.assertEqual(controller.try_acquire(), 0.0)
+        self.assertGreater(controller.try_acquire(), 0.0)
+
+        controller.release()
+        self.assertEqual(controller.try_acquire(), 0.0)
+
+    def test_rate_limit_headers_pause_requests(self):
+        self.controller.on_success({"x-ratelimit-remaining-requests": "0", "x-ratelimit-reset-requests": "2.5s"})
+        self.assertAlmostEqual(self.controller.try_acquire(), 2.5)
+
+        self.clock.now = 3.0
+        self.assertEqual(self.controller.try_acquire(), 0.0)
+
+    def test_parse_reset_duration(self):
+        self.assertEqual(parse_reset_duration("1m30.5s"), 90.5)
+        self.assertEqual(parse_reset_duration("450ms"), 0.45)
+        self.assertEqual(parse_reset_duration("12"), 12.0)
+        self.assertIsNone(parse_reset_duration("soon"))
+
+
+class TestAdaptiveConcurrency(unittest.TestCase):
+
+    def setUp(self):
+        self.server = StubServer(latency=0.05, max_concurrent=2, retry_after=0.05).start()
+
+    def tearDown(self):
+        self.server.stop()
+
+    def test_backs_off_to_server_capacity(self):
+        with mock.patch.dict(os.environ, {"GROQ_API_KEY1": "key-1", "GROQ_API_KEY2": "key-2"}), \
+                mock.patch.dict(concurrency._controllers, clear=True):
+            backend = GroqBackend(base_url=self.server.url)
+
+            async def run():
+                try:
+                    return await asyncio.gather(*[
+                        backend.agenerate([{"role": "user", "content": f"agent {i}"}]) for i in range(12)
+                    ])
+                finally:
+                    await Backend.aclose_clients()
+
+            responses = asyncio.run(run())
+            controller = backend.concurrency
+
+        self.assertEqual(len(responses), 12)
+        self.assertGreater(self.server.rejected, 0)
+        self.assertGreater(controller.stats["overloads"], 0)
+        self.assertLess(controller.limit, 8)
+
+
+class TestTelemetry(unittest.TestCase):
+
+    def setUp(self):
+        self.server = StubServer(fail_first=1, retry_after=0.05, chunk_delay=0.001).start()
+        get_collector().reset()
+
+    def tearDown(self):
+        Backend.close_clients()
+        self.server.stop()
+
+    def test_call_record(self):
+        with mock.patch.dict(os.environ, {"GROQ_API_KEY1": "key-1"}):
+            backend = GroqBackend(base_url=self.server.url)
+        backend.generate([{"role": "user", "content": "x" * 400}])
+
+        [record] = get_collector().records
+        self.assertEqual((record["provider"], record["model"]), ("groq", "llama-3.1-8b-instant"))
+        self.assertEqual(record["retries"], 1)
+        self.assertGreater(record["key_wait"], 0)  # the key was in timeout after the 429
+        self.assertTrue(record["streamed"])
+        self.assertLessEqual(record["time_to_first_token"], record["latency"])
+        self.assertEqual(record["prompt_tokens"], 100)
+        self.assertNotIn("key-1", record["key_id"])
+
+        summary = get_collector().summary()["groq:llama-3.1-8b-instant"]
+        self.assertEqual(summary["calls"], 1)
+        self.assertEqual(summary["latency"]["p99"], record["latency"])
+
+    def test_records_linked_to_episode_rows(self):
+        from src.envwrapper.simulator import log_llm_calls
+
+        with tempfile.TemporaryDirectory() as directory:
+            db = DatabaseManager(db_name=os.path.join(directory, "telemetry.db"))
+            row_id = db["episodes"].insert(role="assistant", content="{}")
+            with mock.patch.dict(os.environ, {"GROQ_API_KEY1": "key-1"}):
+                GroqBackend(base_url=self.server.url).generate([{"role": "user", "content": "hi"}])
+
+            env = mock.Mock(db_manager=db, sim_id="sim")
+            log_llm_calls(env, row_id, 0, get_collector().records)
+
+            rows = db.connection.execute("SELECT episode_row_id, provider, retries FROM llm_calls").fetchall()
+            db.close()
+        self.assertEqual(rows, [(row_id, "groq", 1)])
+
+    def test_calls_logged_to_a_database_without_time_to_action(self):
+        from src.envwrapper.simulator import log_llm_calls
+
+        with tempfile.TemporaryDirectory() as directory:
+            db_file = os.path.join(directory, "telemetry.db")
+            old = sqlite3.connect(db_file)
+            old.execute("CREATE TABLE llm_calls (episode_row_id INTEGER, simulation_id TEXT, agent_id INTEGER, "
+                        "provider TEXT, model TEXT, key_id TEXT, queue_wait DOUBLE, key_wait DOUBLE, "
+                        "rate_limit_wait DOUBLE, latency DOUBLE, time_to_first_token DOUBLE, total_time DOUBLE, "
+                        "prompt_tokens INTEGER, completion_tokens INTEGER, retries INTEGER, streamed INTEGER, "
+                        "error TEXT, timestamp DATETIME DEFAULT CURRENT_TIMESTAMP)")
+            old.close()
+
+            db = DatabaseManager(db_name=db_file)
+            with mock.patch.dict(os.environ, {"GROQ_API_KEY1": "key-1"}):
+                GroqBackend(base_url=self.server.url).generate([{"role": "user", "content": "hi"}])
+            log_llm_calls(mock.Mock(db_manager=db, sim_id="sim"), 1, 0, get_collector().records)
+
+            [(time_to_action,)] = db.connection.execute("SELECT time_to_action FROM llm_calls").fetchall()
+            db.close()
+        self.assertGreater(time_to_action, 0)
+
+    def test_concurrent_turns_get_their_own_calls(self):
+        with mock.patch.dict(os.environ, {"GROQ_API_KEY1": "key-1"}):
+            backend = GroqBackend(base_url=self.server.url)
+        turns = {}
+
+        def turn(agent_id, n_calls):
+            with get_collector().collect(("sim", 0, agent_id)) as calls:
+                for _ in range(n_calls):
+                    backend.generate([{"role": "user", "content": "hi"}])
+            turns[agent_id] = calls
+
+        threads = [threading.Thread(target=turn, args=(agent_id, agent_id + 1)) for agent_id in range(3)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual({agent_id: len(calls) for agent_id, calls in turns.items()}, {0: 1, 1: 2, 2: 3})
+        for agent_id, calls in turns.items():
+            self.assertTrue(all(record["turn"] == ("sim", 0, agent_id) for record in calls))
+
+    def test_collector_is_bounded(self):
+        collector = TelemetryCollector(max_records=2)
+        for i in range(3):
+            collector.add({"provider": "groq", "model": str(i)})
+        self.assertEqual([record["model"] for record in collector.records], ["1", "2"])
+
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 99), 99)
+        self.assertIsNone(percentile([], 95))
+
+
+if __name__ == '__main__':
+    unittest.main()
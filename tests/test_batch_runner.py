@@ -0,0 +1,68 @@
+import copy
+import unittest
+from benchmarking.stub_server import StubServer
+from src.agent.backend import GroqModels, Provider
+from src.agent.backend.batch_client import BatchClient
+from src.environments.DEFAULT_CONFIGS import DEFAULT_CONFIGS
+from src.envwrapper.simulator import Simulator
+
+SKIP = '{"action_name": "skip", "action_parameters": {}, "message": "hello"}'
+
+
+class TestBatchClient(unittest.TestCase):
+
+    def setUp(self):
+        self.server = StubServer(content=SKIP, batch_delay=0.05).start()
+        self.client = BatchClient(self.server.url, "key", poll_interval=0.01)
+
+    def tearDown(self):
+        self.client.close()
+        self.server.stop()
+
+    def test_round_trip(self):
+        requests = {
+            f"request-{i}": {"model": "stub", "messages": [{"role": "user", "content": f"agent {i}"}]}
+            for i in range(3)
+        }
+        self.assertEqual(self.client.run(requests), {custom_id: SKIP for custom_id in requests})
+        self.assertEqual(len(self.server.batches), 1)
+        self.assertEqual(self.client.stats["requests"], 3)
+
+
+class TestBatchedSimulations(unittest.TestCase):
+
+    def setUp(self):
+        self.server = StubServer(content=SKIP).start()
+        self.client = BatchClient(self.server.url, "key", poll_interval=0.01)
+
+    def tearDown(self):
+        self.client.close()
+        self.server.stop()
+
+    def test_simulations_advance_in_lockstep(self):
+        simulator = Simulator(
+            use_db=False,
+            use_gui=False,
+            backend_provider=Provider.GROQ,
+            backend_model=GroqModels.LLAMA_8B,
+            configs=copy.deepcopy(DEFAULT_CONFIGS)
+        )
+        scores = simulator.run("multi_agent_navigation", num_simulations=3, batch_client=self.client)
+
+        self.assertEqual(len(scores), 3)
+        envs = list(simulator.env_map["multi_agent_navigation"].values())
+        num_agents = len(envs[0].agents)
+        max_episodes = envs[0].max_episodes
+
+        # One batch per agent turn, each carrying that turn of every simulation
+        self.assertEqual(len(self.server.batches), num_agents * max_episodes)
+        self.assertEqual(len(self.server.requests), 3 * num_agents * max_episodes)
+
+        # Agents still hear from the agents that acted before them in the same episode
+        for env in envs:
+            last_agent = list(env.agents.values())[-1]
+            self.assertIn("hello", last_agent.messages[1]["content"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,157 @@
+import unittest
+from src.agent.actions import Action
+from src.environments.custom_environments.complex_gridworld_environment import ComplexGridworld, Item, Square
+
+
+class StubAgent:
+    def __init__(self, agent_id, name, position, action_names):
+        self.id = agent_id
+        self.name = name
+        self.position = position
+        self.action_space = [Action(name=action_name) for action_name in action_names]
+        self.action_names = frozenset(action_names)
+        self.variables = {}
+        self.item = None
+
+
+class TestComplexGridworldGoto(unittest.TestCase):
+
+    def setUp(self):
+        self.agent = StubAgent(0, "Alice", (0, 0), ["north", "south", "east", "west", "goto", "skip"])
+        self.env = ComplexGridworld(
+            grid_size=(4, 4),
+            agents={0: self.agent},
+            obstacles=[(1, 0), (1, 1)]
+        )
+        self.env.register_termination_callback(lambda env: False)
+
+    def test_plan_path_avoids_obstacles(self):
+        path = self.env.plan_path((0, 0), (2, 0))
+        self.assertEqual(len(path), 6)
+        self.assertEqual(path[-1], (2, 0))
+        self.assertNotIn((1, 0), path)
+        self.assertNotIn((1, 1), path)
+
+    def test_plan_path_unreachable(self):
+        self.assertIsNone(self.env.plan_path((0, 0), (1, 1)))
+        self.assertIsNone(self.env.plan_path((0, 0), (9, 9)))
+
+    def test_goto_advances_one_cell_per_step(self):
+        self.env.step(0, "goto", {"x": 2, "y": 0})
+        self.assertEqual(self.agent.position, (0, 1))
+        self.assertTrue(self.env.has_pending_goto(0))
+
+        while self.env.has_pending_goto(0):
+            observation = self.env.step(0, "goto")
+
+        self.assertEqual(self.agent.position, (2, 0))
+        self.assertIn("arrived", observation)
+
+    def test_other_action_cancels_goto(self):
+        self.env.step(0, "goto", {"x": 3, "y": 3})
+        self.env.step(0, "skip")
+        self.assertFalse(self.env.has_pending_goto(0))
+
+    def test_invalid_goto_parameters(self):
+        observation = self.env.step(0, "goto", {"row": 1})
+        self.assertIn("Invalid goto parameters", observation)
+        self.assertEqual(self.agent.position, (0, 0))
+
+
+class TestGridState(unittest.TestCase):
+
+    def setUp(self):
+        self.alice = StubAgent(0, "Alice", (0, 0), ["north", "east", "pick", "drop"])
+        self.bob = StubAgent(1, "Bob", (0, 0), ["north", "east", "pick", "drop"])
+        self.env = ComplexGridworld(
+            grid_size=(3, 3),
+            agents={0: self.alice, 1: self.bob},
+            items={(1, 0): [Item("item", (200, 0, 0), "triangle", allowed_agent_id=1)]}
+        )
+        self.env.register_termination_callback(lambda env: False)
+
+    def test_movement_updates_arrays(self):
+        self.assertEqual(self.env.occupancy[0, 0], 2)
+        self.env.step(0, "north")
+        self.assertEqual(self.alice.position, (0, 1))
+        self.assertEqual(self.env.agent_positions.tolist(), [[0, 1], [0, 0]])
+        self.assertEqual(self.env.occupancy[0, 0], 1)
+        self.assertEqual(self.env[0, 1].agents, [self.alice])
+        self.assertEqual(self.env.grid[0][0].agents, [self.bob])
+
+    def test_square_agents_read_only(self):
+        with self.assertRaises(AttributeError):
+            self.env[0, 0].agents = [self.alice]
+
+    def test_grid_columns(self):
+        self.assertIs(self.env.grid, self.env.grid)
+        self.assertEqual(len(self.env.grid), self.env.grid_size[0])
+        self.assertEqual(self.env.grid[-1][0].x, self.env.grid_size[0] - 1)
+        self.assertEqual(len(list(self.env.grid)), self.env.grid_size[0])
+        with self.assertRaises(IndexError):
+            self.env.grid[self.env.grid_size[0]]
+
+    def test_square_views_write_through(self):
+        self.env[2, 2].items.append(Item("target", (0, 0, 0), "circle"))
+        self.assertEqual(self.env.item_counts[2, 2], 1)
+        self.env[2, 2] = Square(obstacle=True)
+        self.assertEqual(self.env.item_counts[2, 2], 0)
+        self.assertTrue(self.env.obstacles[2, 2])
+        self.assertIsNone(self.env.plan_path((0, 0), (2, 2)))
+
+    def test_pick_respects_owner(self):
+        self.env.step(0, "east")
+        self.assertIn("not authorized", self.env.step(0, "pick"))
+        self.env.step(1, "east")
+        self.assertEqual(self.env.step(1, "pick"), "You pick up the item")
+        item = self.bob.item
+        self.assertEqual(len(self.env.item_objects), 0)
+        self.env.step(1, "north")
+        self.env.step(1, "drop")
+        self.assertEqual(self.env.items_at(1, 1), [item])
+
+
+class TestObservation(unittest.TestCase):
+
+    def setUp(self):
+        self.item = Item("item", (200, 0, 0), "triangle")
+        self.agent = StubAgent(0, "Alice", (0, 0), ["north", "east", "skip", "pick"])
+        self.env = ComplexGridworld(grid_size=(2, 2), agents={0: self.agent}, items={(0, 1): [self.item]})
+        self.env.register_termination_callback(lambda env: False)
+
+    def test_structured_fields(self):
+        observation = self.env.step(0, "north")
+        self.assertEqual(observation.event, "moved")
+        self.assertEqual((observation.previous_position, observation.position), ((0, 0), (0, 1)))
+        self.assertFalse(observation.blocked)
+        self.assertEqual(observation.items, (self.item,))
+
+        observation = self.env.step(0, "north")
+        self.assertEqual(observation.event, "edge")
+        self.assertTrue(observation.blocked)
+
+    def test_renders_once_on_demand(self):
+        observation = self.env.step(0, "north")
+        self.assertIsNone(observation._text)
+        text = str(observation)
+        self.assertEqual(text, "Agent Alice moved 'north' from (0, 0) to (0, 1).\nYou are in square (0, 1). There are "
+                               "items here: Item(type=item, color=(200, 0, 0), shape=triangle).")
+        self.assertIs(str(observation), text)
+        self.assertEqual(observation, text)
+        self.assertIn("There are items here", observation)
+
+    def test_square_text_cache_follows_changes(self):
+        contents = self.env.square_contents(0, 1)
+        self.assertIs(self.env.square_contents(0, 1), contents)
+        self.item.color = (0, 0, 255)
+        self.assertIn("color=(0, 0, 255)", contents.text())
+
+        self.env.step(0, "north")
+        self.env.step(0, "pick")
+        self.assertEqual(self.env.square_contents(0, 1).items, ())
+        # An earlier observation keeps the items as they were when it was made
+        self.assertEqual(contents.items, (self.item,))
+
+
+if __name__ == '__main__':
+    unittest.main()
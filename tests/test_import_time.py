@@ -0,0 +1,50 @@
+import contextlib
+import io
+import unittest
+from unittest import mock
+from benchmarking.import_time import lazy_modules_imported, measure_import, parse_importtime, total_import_ms
+from src.agent.backend.registry import get_backend_class
+
+REPORT = """import time: self [us] | cumulative | imported package
+import time:       120 |        120 |   _io
+import time:       300 |        420 | io
+import time:        50 |         50 |     groq._types
+import time:       200 |        250 |   groq
+import time:       100 |        350 | src.agent.backend.groq_backend
+"""
+
+
+class TestImportTime(unittest.TestCase):
+
+    def test_parse_importtime(self):
+        report = parse_importtime(REPORT)
+        self.assertEqual(report[0], ("_io", 120, 120, 1))
+        self.assertEqual(report[2], ("groq._types", 50, 50, 2))
+        self.assertAlmostEqual(total_import_ms(report), 0.77)
+        self.assertEqual(lazy_modules_imported(report), ["groq"])
+
+    def test_entry_points_do_not_import_provider_sdks(self):
+        for module in ("run_benchmark", "src.agent.base_agent"):
+            self.assertEqual(lazy_modules_imported(measure_import(module)), [], module)
+
+    def test_registry_loads_backend_on_demand(self):
+        backend_class = get_backend_class("GROQ")
+        self.assertEqual(backend_class.__name__, "GroqBackend")
+        self.assertIs(get_backend_class("GROQ"), backend_class)
+        with self.assertRaises(KeyError):
+            get_backend_class("nope")
+
+    def test_list_does_not_build_a_benchmark(self):
+        import run_benchmark
+
+        output = io.StringIO()
+        with mock.patch.object(run_benchmark, "Benchmark") as benchmark, \
+                mock.patch("sys.argv", ["run_benchmark.py", "--list"]), contextlib.redirect_stdout(output):
+            run_benchmark.main()
+        benchmark.assert_not_called()
+        self.assertIn("  single_agent_navigation\n", output.getvalue())
+        self.assertIn("  groq: ", output.getvalue())
+
+
+if __name__ == "__main__":
+    unittest.main()
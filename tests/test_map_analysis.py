@@ -0,0 +1,133 @@
+import itertools
+import unittest
+from collections import deque
+import numpy as np
+from src.environments.baselines import ScriptedBaseline
+from src.environments.custom_environments.complex_gridworld_environment import ComplexGridworld, Square
+from src.environments.map_analysis import (UNREACHABLE, MapAnalysis, analyze_map, distance_field, min_cost_assignment,
+                                          shortest_path)
+from src.environments.scoring_spec import compile_scoring
+from tests.test_complex_gridworld import StubAgent
+from tests.test_scoring import ACTIONS
+
+
+def bfs_distances(obstacles, source):
+    distances = {tuple(source): 0}
+    frontier = deque([tuple(source)])
+    while frontier:
+        x, y = frontier.popleft()
+        for nxt in ((x, y + 1), (x, y - 1), (x + 1, y), (x - 1, y)):
+            if nxt in distances or not (0 <= nxt[0] < obstacles.shape[0] and 0 <= nxt[1] < obstacles.shape[1]):
+                continue
+            if not obstacles[nxt]:
+                distances[nxt] = distances[(x, y)] + 1
+                frontier.append(nxt)
+    return distances
+
+
+class TestMapAnalysis(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.obstacles = rng.random((12, 9)) < 0.3
+        self.obstacles[0, 0] = False
+
+    def test_distance_field_matches_bfs(self):
+        field = distance_field(self.obstacles, (0, 0))
+        expected = bfs_distances(self.obstacles, (0, 0))
+        for x, y in itertools.product(range(12), range(9)):
+            self.assertEqual(field[x, y], expected.get((x, y), UNREACHABLE))
+
+    def test_paths_are_shortest(self):
+        analysis = analyze_map(self.obstacles)
+        expected = bfs_distances(self.obstacles, (0, 0))
+        for start, distance in expected.items():
+            path = analysis.path(start, (0, 0))
+            self.assertEqual(len(path), distance)
+            self.assertFalse(any(self.obstacles[square] for square in path))
+        blocked = next(zip(*np.nonzero(self.obstacles)))
+        self.assertIsNone(analysis.distance(blocked, (0, 0)))
+
+    def test_cache_is_shared_and_invalidated(self):
+        agents = {0: StubAgent(0, "Alice", (0, 0), ACTIONS)}
+        first = ComplexGridworld(grid_size=(5, 5), agents=agents, obstacles=[(1, 0), (1, 1)])
+        second = ComplexGridworld(grid_size=(5, 5), agents=agents, obstacles=[(1, 0), (1, 1)], sparse=True)
+        self.assertIs(first.map_analysis, second.map_analysis)
+        self.assertEqual(first.map_analysis.distance((0, 0), (2, 0)), 6)
+
+        first[1, 2] = Square(obstacle=True)
+        self.assertIsNot(first.map_analysis, second.map_analysis)
+        self.assertEqual(first.map_analysis.distance((0, 0), (2, 0)), 8)
+
+    def test_fields_only_for_sources_and_bounded(self):
+        analysis = MapAnalysis(self.obstacles, max_fields=2)
+        expected = bfs_distances(self.obstacles, (0, 0))
+        start = max(expected, key=expected.get)
+        self.assertEqual(len(analysis.path(start, (0, 0))), expected[start])
+        self.assertEqual(len(analysis.fields), 0)
+
+        free = [tuple(square) for square in np.argwhere(~self.obstacles).tolist()]
+        for source in free[:3]:
+            analysis.field(source)
+        analysis.field(free[1])
+        analysis.field(free[3])
+        self.assertEqual(list(analysis.fields), [free[1], free[3]])
+        self.assertEqual(analysis.path(start, free[3]), shortest_path(self.obstacles, start, free[3]))
+
+    def test_goto_on_large_sparse_grid_computes_no_field(self):
+        agents = {0: StubAgent(0, "Alice", (500, 500), ACTIONS)}
+        env = ComplexGridworld(grid_size=(1000, 1000), agents=agents, obstacles=[(501, 500)], sparse=True)
+        self.assertEqual(env.plan_path((500, 500), (502, 500)), [(500, 501), (501, 501), (502, 501), (502, 500)])
+        self.assertIsNone(env._map_analysis)
+        self.assertIsNone(env.plan_path((500, 500), (501, 500)))
+
+    def test_min_cost_assignment(self):
+        costs = np.random.default_rng(1).integers(0, 20, size=(4, 5))
+        best = min(sum(costs[row, column] for row, column in enumerate(columns))
+                   for columns in itertools.permutations(range(5), 4))
+        assignment = min_cost_assignment(costs)
+        self.assertEqual(len(set(assignment)), 4)
+        self.assertEqual(sum(costs[row, column] for row, column in enumerate(assignment)), best)
+        self.assertEqual(min_cost_assignment(np.array([[1, 5], [2, 1], [0, 0]])), [0, None, 1])
+
+
+class TestScriptedBaseline(unittest.TestCase):
+
+    def test_delivers_items_in_optimal_steps(self):
+        agents = {0: StubAgent(0, "Alice", (0, 0), ACTIONS), 1: StubAgent(1, "Bob", (4, 4), ACTIONS)}
+        env = ComplexGridworld(grid_size=(5, 5), agents=agents, obstacles=[(2, 0), (2, 1), (2, 2), (2, 3)])
+        env.scoring_spec = compile_scoring(
+            {"deliver_items": {"targets": [[4, 0], [0, 4]], "items": [[0, 2], [3, 4]], "permissions": True}},
+            env.grid_size
+        )
+        env.register_task(env.scoring_spec.build_task())
+        env.max_episodes = 30
+
+        optimal_steps = env.scoring_spec.optimal_steps(env)
+        baseline = ScriptedBaseline(env)
+        self.assertEqual(baseline.run(), 100)
+        self.assertEqual(sum(baseline.steps.values()), optimal_steps)
+
+    def test_efficiency_only_for_completed_simulations(self):
+        from src.benchmarks.benchmark_main import simulation_efficiency
+
+        agents = {0: StubAgent(0, "Alice", (0, 0), ACTIONS), 1: StubAgent(1, "Bob", (4, 4), ACTIONS)}
+        env = ComplexGridworld(grid_size=(5, 5), agents=agents)
+        env.optimal_steps = 8
+        agents[0].variables["steps_taken"], agents[1].variables["steps_taken"] = 6, 4
+        env.register_task(compile_scoring({"occupy_targets": "[(0, 0)]", "ordered_line": {"start": [0, 0]}},
+                                          env.grid_size).build_task())
+        self.assertTrue(np.isnan(simulation_efficiency(env)))
+
+        env.tasks[0].done = True
+        self.assertEqual(simulation_efficiency(env), 0.8)
+
+        # Without tasks the score must reach 100, up to rounding
+        env.tasks = []
+        env.score = 100 - 1e-9
+        self.assertEqual(simulation_efficiency(env), 0.8)
+        env.score = 50
+        self.assertTrue(np.isnan(simulation_efficiency(env)))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,184 @@
+import unittest
+from src.utils.output_parsing import (ActionDecision, JsonObjectScanner, StreamingDecisionParser, TolerantJsonParser,
+                                      extract_json_from_string, parse_json_object)
+
+
+class TestJsonObjectScanner(unittest.TestCase):
+
+    def feed_all(self, chunks):
+        scanner = JsonObjectScanner()
+        for index, chunk in enumerate(chunks):
+            end = scanner.feed(chunk)
+            if end is not None:
+                return index, end
+        return None
+
+    def test_finds_end_across_chunks(self):
+        chunks = ['Sure! {"action_name": "no', 'rth", "action_parameters": {}', '} I moved north.']
+        self.assertEqual(self.feed_all(chunks), (2, 1))
+
+    def test_ignores_braces_in_strings(self):
+        text = '{"message": "use } and { freely", "note": "say \\"}\\""} trailing'
+        index, end = self.feed_all([text])
+        self.assertEqual(text[:end], '{"message": "use } and { freely", "note": "say \\"}\\""}')
+
+    def test_python_style_dict(self):
+        text = "{'action_name': 'skip', 'message': '}'} done"
+        index, end = self.feed_all([text])
+        self.assertEqual(extract_json_from_string(text[:end]), {"action_name": "skip", "message": "}"})
+
+    def test_incomplete_object(self):
+        self.assertIsNone(self.feed_all(['{"action_name": {', '"x": 1}']))
+
+
+class TestParseJsonObject(unittest.TestCase):
+
+    def test_code_fence_and_trailing_text(self):
+        text = 'Here you go:\n```json\n{"action_name": "north", "action_parameters": {}}\n```\nThen {"other": 1}'
+        self.assertEqual(parse_json_object(text), {"action_name": "north", "action_parameters": {}})
+
+    def test_single_quotes_keep_apostrophes(self):
+        text = "{'rationale': 'I'm next to Bob's corner', 'action_name': 'skip',}"
+        self.assertEqual(parse_json_object(text), {"rationale": "I'm next to Bob's corner", "action_name": "skip"})
+
+    def test_python_literals_and_tuples(self):
+        text = '{"add_memory": {"done": True, "target": (0, 3), "note": None}, "action_name": "skip"}'
+        self.assertEqual(parse_json_object(text)["add_memory"], {"done": True, "target": [0, 3], "note": None})
+
+    def test_unquoted_keys_and_missing_commas(self):
+        text = '{action_name: "goto", "action_parameters": {x: 2, y: 3.5} "message": "hi"}'
+        self.assertEqual(parse_json_object(text),
+                         {"action_name": "goto", "action_parameters": {"x": 2, "y": 3.5}, "message": "hi"})
+
+    def test_junk_and_mismatched_quotes(self):
+        text = '{\n "reflection":\u0161"fine",\n "rationale": "move on.\',\n "action_name": "east"\n}'
+        self.assertEqual(parse_json_object(text),
+                         {"reflection": "fine", "rationale": "move on.", "action_name": "east"})
+
+    def test_truncated_object(self):
+        text = '{"action_name": "west", "message": "cut off'
+        self.assertEqual(parse_json_object(text), {"action_name": "west"})
+        with self.assertRaises(ValueError):
+            parse_json_object(text, allow_incomplete=False)
+
+    def test_streaming_keeps_only_complete_values(self):
+        self.assertEqual(TolerantJsonParser('{"action_name": "nor', streaming=True).parse(0)[0], {})
+        self.assertEqual(TolerantJsonParser('{"action_name": "north"', streaming=True).parse(0)[0], {})
+        self.assertEqual(TolerantJsonParser('{"action_name": "north",', streaming=True).parse(0)[0],
+                         {"action_name": "north"})
+
+    def test_no_object(self):
+        with self.assertRaises(ValueError):
+            parse_json_object("I will move north.")
+        with self.assertRaises(ValueError):
+            extract_json_from_string("I will move north.")
+
+    def test_action_decision(self):
+        decision = ActionDecision.from_response('{"action_name": "goto", "action_parameters": {"x": 1, "y": 2}}')
+        self.assertEqual(decision.action_name, "goto")
+        self.assertEqual(decision.action_parameters, {"x": 1, "y": 2})
+        self.assertEqual(decision.message, "")
+        self.assertEqual(ActionDecision.from_response("no json here").action_name, "invalid")
+
+
+class TestStreamingDecisionParser(unittest.TestCase):
+
+    def stream(self, text, size=3):
+        actions = []
+        parser = StreamingDecisionParser(on_action=actions.append)
+        received_at = None
+        for i in range(0, len(text), size):
+            if parser.feed(text[i:i + size]) and received_at is None:
+                received_at = i + size
+        return parser, actions, received_at
+
+    def test_action_before_rest_of_response(self):
+        text = '{"action_name": "north", "message": "' + "going north " * 20 + '"}'
+        parser, actions, received_at = self.stream(text)
+        self.assertEqual(actions, ["north"])
+        self.assertLess(received_at, 30)
+        self.assertTrue(parser.complete)
+
+    def test_keys_in_any_order(self):
+        text = "{'reflection': 'I\'m close', 'message': 'hi', 'action_parameters': {'x': 2, 'y': 1}, 'action_name': 'goto'}"
+        parser, actions, _ = self.stream(text, size=5)
+        self.assertEqual(actions, ["goto"])
+        self.assertEqual(parser.action_parameters, {"x": 2, "y": 1})
+
+    def test_value_not_emitted_until_complete(self):
+        parser = StreamingDecisionParser()
+        self.assertIsNone(parser.feed('{"action_na'))
+        self.assertIsNone(parser.feed('me": "nor'))
+        self.assertIsNone(parser.feed('th"'))
+        self.assertEqual(parser.feed(', "message"'), "north")
+
+    def test_ignores_key_quoted_in_message(self):
+        text = '{"message": "I wrote \\"action_name\\": \\"east\\"", "action_name": "west"}'
+        _, actions, _ = self.stream(text)
+        self.assertEqual(actions, ["west"])
+
+    def test_ignores_key_in_value_with_unescaped_quotes(self):
+        text = '{"reflection": "Last turn my "action_name": "east" failed", "action_name": "west"}'
+        for size in (1, 3, len(text)):
+            parser, actions, _ = self.stream(text, size=size)
+            self.assertEqual(actions, ["west"])
+            self.assertEqual(parser.action_name, "west")
+
+    def test_object_end(self):
+        parser = StreamingDecisionParser()
+        parser.feed('{"action_name": "skip"')
+        self.assertIsNone(parser.object_end)
+        parser.feed('} trailing prose')
+        self.assertEqual(parser.object_end, 1)
+        self.assertEqual(parser.action_name, "skip")
+
+
+class TestActionDecision(unittest.TestCase):
+
+    def make_agent(self):
+        from src.agent.actions import Action
+        from src.agent.base_agent import Agent
+        return Agent(agent_id=0, name="Alice", action_space=[Action(name="north"), Action(name="skip")],
+                     variables={"memory": ""}, start_position=(0, 0))
+
+    def test_slotted(self):
+        decision = ActionDecision(action_name="north")
+        with self.assertRaises(AttributeError):
+            decision.extra = 1
+        self.assertEqual(decision.to_dict()["action_name"], "north")
+
+    def test_validate(self):
+        decision = ActionDecision(action_name="goto")
+        self.assertIsNone(decision.valid)
+        self.assertFalse(decision.validate(frozenset(["north", "skip"])))
+        self.assertFalse(decision.valid)
+
+    def test_finish_step_reuses_validated_decision(self):
+        agent = self.make_agent()
+        response = '{"action_name": "north", "message": "hi", "add_memory": "went north"}'
+        self.assertIsNone(agent.validate_response(response))
+        validated = agent._validated_decision
+
+        decision = agent._finish_step(response)
+        self.assertIs(decision, validated)
+        self.assertTrue(decision.valid)
+        self.assertIs(agent.last_decision, decision)
+        self.assertIn("went north", agent.variables["memory"])
+
+    def test_finish_step_parses_other_response(self):
+        agent = self.make_agent()
+        agent.validate_response('{"action_name": "north"}')
+        decision = agent._finish_step('{"action_name": "fly"}')
+        self.assertEqual(decision.action_name, "fly")
+        self.assertFalse(decision.valid)
+
+    def test_streamed_actions_outside_action_space_not_reported(self):
+        actions = []
+        listener = self.make_agent()._valid_action_listener(actions.append)
+        listener("fly")
+        listener("north")
+        self.assertEqual(actions, ["north"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+import unittest
+from src.agent.base_agent import Agent, DEFAULT_SYSTEM_PROMPT, GOAL_REFERENCE
+from src.agent.prompts import PromptTemplate, minify_prompt, section_token_counts, variable_token_counts
+
+GOAL = """Reach the **North-East Corner** of the grid.
+
+  ***IMPORTANT***:
+  - **Verification**:   check the score after every move.
+"""
+
+
+def make_agent(minify_prompts: bool) -> Agent:
+    agent = Agent(
+        agent_id=0,
+        name="Alice",
+        action_space=[],
+        variables={"name": "Alice", "goal": GOAL, "grid_size": (5, 5), "n_agents": 1, "agent_names": ["Alice"],
+                   "actions": "actions:\n- north", "memory": "", "current_episode": 0, "max_episodes": 10},
+        start_position=(0, 0),
+        minify_prompts=minify_prompts,
+    )
+    agent.use_output_instructions_prompt()
+    agent.use_default_system_prompt()
+    agent.use_default_user_prompt()
+    agent._prepare_step()
+    return agent
+
+
+class TestMinifyPrompt(unittest.TestCase):
+
+    def test_strips_markdown_and_whitespace(self):
+        self.assertEqual(
+            minify_prompt(GOAL),
+            "Reach the North-East Corner of the grid.\n\n IMPORTANT:\n - Verification: check the score after every move."
+        )
+
+    def test_headers_and_duplicate_lines(self):
+        text = "[ Rules ]\nAlways verify the score before you stop moving.\n\n\n\nAlways verify the score before you stop moving.\n}\n}"
+        self.assertEqual(minify_prompt(text), "[Rules]\nAlways verify the score before you stop moving.\n\n}\n}")
+
+    def test_variables_survive(self):
+        self.assertIn("<<goal>>", minify_prompt("**Goal** : <<goal>>"))
+
+
+class TestPromptAccounting(unittest.TestCase):
+
+    def test_section_and_variable_counts(self):
+        template = PromptTemplate(initial_data=DEFAULT_SYSTEM_PROMPT)
+        template.set_variables({"goal": "x" * 400})
+        self.assertEqual(set(section_token_counts(template)), set(template.get_sections()))
+        self.assertEqual(variable_token_counts(template)["goal"], 100)
+
+    def test_minified_agent_sends_goal_once(self):
+        full = make_agent(minify_prompts=False)
+        minified = make_agent(minify_prompts=True)
+
+        self.assertIn("**", full.messages[0]["content"])
+        self.assertNotIn("**", minified.messages[0]["content"])
+        self.assertIn("Reach the North-East Corner", minified.messages[0]["content"])
+        self.assertIn(GOAL_REFERENCE, minified.messages[1]["content"])
+        self.assertNotIn("Reach the North-East Corner", minified.messages[1]["content"])
+        self.assertLess(len(minified.messages[1]["content"]), len(full.messages[1]["content"]))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,154 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+from src.environments.custom_environments.complex_gridworld_environment import ComplexGridworld
+from src.environments.scoring import CompositeTask, DeliverItemsTask, OccupyTargetsTask, OrderedLineTask
+from src.environments.scoring_spec import Trajectory, compile_scoring, load_trajectories
+from src.storage.database import DatabaseManager
+from tests.test_complex_gridworld import StubAgent
+
+ACTIONS = ["north", "south", "east", "west", "pick", "drop"]
+
+
+def make_env(*positions, grid_size=(3, 3)):
+    agents = {i: StubAgent(i, name, position, ACTIONS) for i, (name, position) in enumerate(positions)}
+    return ComplexGridworld(grid_size=grid_size, agents=agents)
+
+
+class TestScoringTasks(unittest.TestCase):
+
+    def test_occupy_targets_counts_events(self):
+        env = make_env(("Alice", (0, 0)), ("Bob", (1, 1)))
+        task = OccupyTargetsTask([(0, 0), (2, 2)])
+        env.register_task(task)
+        self.assertEqual(env.score, 50)
+        self.assertEqual(env.item_type_counts("target").sum(), 2)
+
+        env.step(0, "north")
+        self.assertEqual(env.score, 0)
+        env.step(1, "east")
+        env.step(1, "north")
+        env.step(0, "south")
+        self.assertTrue(task.done)
+        self.assertEqual(env.score, 100)
+        self.assertIn("termination condition", env.step(0, "north"))
+
+    def test_ordered_line(self):
+        env = make_env(("Bob", (0, 0)), ("Alice", (0, 1)))
+        task = OrderedLineTask()
+        env.register_task(task)
+        self.assertEqual(task.correct, 0)
+        env.step(1, "south")
+        env.step(0, "east")
+        self.assertTrue(task.done)
+
+    def test_deliver_items_follows_pick_and_drop(self):
+        env = make_env(("Alice", (0, 0)))
+        task = DeliverItemsTask(targets=[(0, 1), (2, 2)], item_positions=[(0, 0), (1, 0)])
+        env.register_task(task)
+        self.assertEqual(env.score, 0)
+
+        env.step(0, "pick")
+        env.step(0, "north")
+        env.step(0, "drop")
+        self.assertEqual(env.score, 50)
+
+        env.step(0, "pick")
+        self.assertEqual(env.score, 0)
+        # The target marker is back once the item is taken away
+        self.assertEqual(env.item_type_counts("target")[0, 1], 1)
+        self.assertFalse(task.done)
+
+    def test_deliver_items_of_another_type(self):
+        env = make_env(("Alice", (0, 0)))
+        env.register_task(DeliverItemsTask(targets=[(0, 1)], item_positions=[(0, 0)], item_type="coin"))
+        self.assertEqual(env.step(0, "pick").event, "picked")
+        env.step(0, "north")
+        env.step(0, "drop")
+        self.assertEqual(env.score, 100)
+        self.assertTrue(env.check_termination())
+
+    def test_requires_task_or_callback(self):
+        env = make_env(("Alice", (0, 0)))
+        with self.assertRaises(ValueError):
+            env.step(0, "north")
+
+
+class TestScoringSpec(unittest.TestCase):
+
+    def test_compile(self):
+        spec = compile_scoring({"occupy_targets": "corners", "ordered_line": {"axis": "y"}}, grid_size=(4, 3))
+        self.assertEqual(spec.rules[0].targets.tolist(), [[0, 0], [0, 2], [3, 0], [3, 2]])
+        self.assertEqual(spec.weights, [0.5, 0.5])
+        self.assertIsInstance(spec.build_task(), CompositeTask)
+
+        spec = compile_scoring({"deliver_items": {"targets": "[(1, 1), (2, 2)]", "items": "[(0, 0)]"}}, (3, 3))
+        self.assertEqual(spec.rules[0].items.tolist(), [[0, 0]])
+        self.assertIsInstance(spec.build_task(), DeliverItemsTask)
+
+        with self.assertRaises(ValueError):
+            compile_scoring({"collect_coins": 3}, (3, 3))
+
+    def test_bulk_evaluation_matches_live_scores(self):
+        env = make_env(("Bob", (0, 1)), ("Alice", (2, 2)))
+        spec = compile_scoring({"occupy_targets": "[(0, 0), (2, 2)]", "ordered_line": {"start": [0, 0]}}, (3, 3))
+        env.register_task(spec.build_task())
+
+        snapshots, live = [], []
+        for agent_id, action in [(0, "south"), (1, "south"), (1, "west"), (0, "east"), (1, "south")]:
+            snapshots.append(env.state_snapshot())
+            live.append(env.score)
+            env.step(agent_id, action)
+
+        scores, done = spec.evaluate(Trajectory.from_snapshots(snapshots))
+        self.assertEqual(scores.tolist(), live)
+        self.assertFalse(done.any())
+
+    def test_load_trajectories(self):
+        env = make_env(("Alice", (0, 0)))
+        spec = compile_scoring({"deliver_items": {"targets": "[(0, 1)]", "items": "[(0, 0)]"}}, (3, 3))
+        env.register_task(spec.build_task())
+
+        with tempfile.TemporaryDirectory() as directory:
+            db_file = os.path.join(directory, "episodes.db")
+            db = DatabaseManager(db_file)
+            for action in ["pick", "north", "drop"]:
+                db["episodes"].insert(simulation_id="sim", role="assistant", content="", action=action,
+                                      score=env.score, state=env.state_snapshot())
+                env.step(0, action)
+            db["episodes"].insert(simulation_id="sim", role="assistant", content="", action="skip",
+                                  score=env.score, state=env.state_snapshot())
+            db.connection.close()
+
+            trajectory = load_trajectories(db_file)["sim"]
+
+        self.assertEqual(len(trajectory), 4)
+        scores, done = spec.evaluate(trajectory)
+        self.assertEqual(scores.tolist(), [0, 0, 0, 100])
+        self.assertEqual(done.tolist(), [False, False, False, True])
+
+    def test_state_stored_in_database_without_state_column(self):
+        env = make_env(("Alice", (0, 0)))
+        with tempfile.TemporaryDirectory() as directory:
+            db_file = os.path.join(directory, "episodes.db")
+            old = sqlite3.connect(db_file)
+            old.execute("CREATE TABLE episodes (environment_name TEXT, simulation_id INTEGER, episode_number INTEGER, "
+                        "agent_id INTEGER, role TEXT NOT NULL, content TEXT NOT NULL, action TEXT, "
+                        "timestamp DATETIME DEFAULT CURRENT_TIMESTAMP, score DOUBLE)")
+            old.execute("INSERT INTO episodes (role, content) VALUES ('user', 'hi')")
+            old.commit()
+            old.close()
+
+            db = DatabaseManager(db_file)
+            db["episodes"].insert(simulation_id="sim", role="assistant", content="", action="skip",
+                                  score=env.score, state=env.state_snapshot())
+            states = [row[0] for row in db.connection.execute("SELECT state FROM episodes")]
+            db.close()
+
+        self.assertIsNone(states[0])
+        self.assertIsNotNone(states[1])
+
+
+if __name__ == "__main__":
+    unittest.main()
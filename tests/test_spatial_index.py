@@ -0,0 +1,124 @@
+import unittest
+import numpy as np
+from src.environments.custom_environments.complex_gridworld_environment import ComplexGridworld, Item
+from src.environments.spatial_index import SparseCells, SpatialIndex
+from tests.test_complex_gridworld import StubAgent
+
+
+class TestSpatialIndex(unittest.TestCase):
+
+    def test_query_move_remove(self):
+        index = SpatialIndex(bucket_size=4)
+        index.insert("a", (0, 0))
+        index.insert("b", (5, 5))
+        index.insert("c", (100, 100))
+        self.assertEqual(index.query(2, 2, 3), ["a", "b"])
+        self.assertEqual(index.query(2, 2, 2), ["a"])
+
+        index.move("c", (3, 3))
+        self.assertEqual(sorted(index.query(2, 2, 1)), ["c"])
+        index.remove("a")
+        self.assertEqual(sorted(index.query(0, 0, 1000)), ["b", "c"])
+        self.assertEqual(len(index.buckets), 2)
+
+    def test_query_many_matches_query(self):
+        index = SpatialIndex(bucket_size=4)
+        rng = np.random.default_rng(1)
+        for key, position in enumerate(rng.integers(0, 30, size=(80, 2)).tolist()):
+            index.insert(key, position)
+        points = [tuple(point) for point in rng.integers(0, 30, size=(40, 2)).tolist()]
+        for found, point in zip(index.query_many(points, 3), points):
+            self.assertEqual(sorted(found), sorted(index.query(*point, 3)))
+
+
+class TestSparseCells(unittest.TestCase):
+
+    def test_indexing_like_an_array(self):
+        cells = SparseCells((1000, 1000), np.int32)
+        cells[3, 4] += 2
+        cells[[1, 2], [1, 2]] = 1
+        self.assertEqual(cells[3, 4], 2)
+        self.assertEqual(cells[[3, 0], [4, 0]].tolist(), [2, 0])
+        self.assertEqual(cells.sum(), 4)
+
+        cells[3, 4] -= 2
+        self.assertEqual(sorted(cells.nonzero()), [(1, 1), (2, 2)])
+        cells[:] = 0
+        self.assertEqual(cells.cells, {})
+
+
+class TestSparseGridworld(unittest.TestCase):
+
+    def setUp(self):
+        self.agents = {i: StubAgent(i, f"Agent{i}", (10 * i, 10 * i), ["north", "east", "pick"]) for i in range(50)}
+        self.env = ComplexGridworld(
+            grid_size=(1000, 1000),
+            agents=self.agents,
+            items={(10 * i, 10 * i + 1): [Item("item", (200, 0, 0), "triangle")] for i in range(50)},
+            obstacles=[(999, 999)],
+            sparse=True
+        )
+        self.env.register_termination_callback(lambda env: False)
+
+    def test_memory_follows_occupied_squares(self):
+        self.assertEqual(len(self.env.occupancy.cells), 50)
+        self.assertEqual(len(self.env.item_counts.cells), 50)
+        self.assertEqual(len(self.env.obstacles.cells), 1)
+
+    def test_step_and_queries(self):
+        self.env.step(3, "north")
+        self.assertEqual(self.env.step(3, "pick"), "You pick up the item")
+        self.assertEqual(self.env.occupancy[30, 31], 1)
+        self.assertEqual(self.env.item_counts[30, 31], 0)
+
+        self.assertEqual([agent.id for agent in self.env.agents_within(30, 30, 10)], [2, 3, 4])
+        self.assertEqual([position for position, item in self.env.items_within(30, 30, 11)], [(20, 21), (40, 41)])
+        self.assertTrue(self.env.has_item_type([(40, 41)], "item")[0])
+
+
+class TestFieldOfView(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        positions = rng.integers(0, 40, size=(60, 2)).tolist()
+        self.agents = {i: StubAgent(i, f"Agent{i}", tuple(position), ["north"]) for i, position in enumerate(positions)}
+        item_positions = {tuple(position) for position in rng.integers(0, 40, size=(30, 2)).tolist()}
+        self.items = {position: [Item("item", (200, 0, 0), "triangle")] for position in item_positions}
+
+    def test_observe_all_matches_brute_force(self):
+        for sparse in (False, True):
+            env = ComplexGridworld(grid_size=(40, 40), agents=self.agents, items=self.items, sparse=sparse,
+                                   bucket_size=4)
+            views = env.observe_all(5)
+            self.assertEqual(set(views), set(self.agents))
+            for agent_id, agent in self.agents.items():
+                x, y = agent.position
+                expected_agents = sorted((other.position, other.name) for other in self.agents.values()
+                                         if other is not agent and max(abs(other.position[0] - x),
+                                                                       abs(other.position[1] - y)) <= 5)
+                self.assertEqual(sorted((position, name) for name, position in views[agent_id].agents),
+                                 expected_agents)
+                expected_items = sorted(position for position in self.items
+                                        if max(abs(position[0] - x), abs(position[1] - y)) <= 5)
+                self.assertEqual([position for position, item in views[agent_id].items], expected_items)
+                self.assertEqual(str(views[agent_id]), str(env.observe(agent_id, 5)))
+
+    def test_obstacles_block_line_of_sight(self):
+        agents = {0: StubAgent(0, "Alice", (0, 2), ["north"]), 1: StubAgent(1, "Bob", (4, 2), ["north"]),
+                  2: StubAgent(2, "Carol", (0, 4), ["north"])}
+        env = ComplexGridworld(grid_size=(5, 5), agents=agents, obstacles=[(2, 1), (2, 2), (2, 3)],
+                               items={(4, 4): [Item("item", (200, 0, 0), "triangle")]})
+
+        self.assertFalse(env.line_of_sight((0, 2), (4, 2)))
+        self.assertTrue(env.line_of_sight((0, 2), (0, 4)))
+        self.assertEqual(env.line_of_sight((0, 4), (4, 0)), env.line_of_sight((4, 0), (0, 4)))
+
+        view = env.observe_all(4, line_of_sight=True)[0]
+        self.assertEqual(view.agents, [("Carol", (0, 4))])
+        self.assertEqual(view.items, [])
+        self.assertEqual([name for name, position in env.observe(0, 4).agents], ["Carol", "Bob"])
+        self.assertEqual(str(env.observe(1, 1)), "Within 1 squares of (4, 2) you see no other agents and no items.")
+
+
+if __name__ == "__main__":
+    unittest.main()